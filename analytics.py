@@ -0,0 +1,132 @@
+"""Сводки продаж по дням, категориям и товарам для экрана аналитики.
+
+Сводные таблицы (миграция 4) дополняются только новыми заказами и позициями:
+в rollup_state хранятся последние учтённые order_id и order_item_id, и
+refresh() обрабатывает строки после них. Позиция, добавленная к старому
+заказу, попадает в день этого заказа. Сводки отражают оформленные продажи:
+последующие изменения и удаления заказов учитываются только rebuild().
+Перенесённые в архив заказы (archive.py) rebuild() читает из архива.
+"""
+import os
+
+import archive
+import db
+
+# Периоды экрана аналитики (дней)
+PERIODS = (7, 30, 90, 365)
+
+ORDERS_SQL = """
+    INSERT INTO sales_daily (day, order_count)
+    SELECT date(order_date), COUNT(*) FROM {orders}
+    WHERE order_id > ? AND order_id <= ? AND date(order_date) IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET order_count = order_count + excluded.order_count
+"""
+
+ITEMS_SQL = {
+    "sales_daily": """
+        INSERT INTO sales_daily (day, items_sold, revenue)
+        SELECT date(o.order_date), SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+        FROM {order_items} oi JOIN {orders} o ON o.order_id = oi.order_id
+        WHERE oi.order_item_id > ? AND oi.order_item_id <= ? AND date(o.order_date) IS NOT NULL
+        GROUP BY 1
+        ON CONFLICT (day) DO UPDATE SET items_sold = items_sold + excluded.items_sold,
+                                        revenue = revenue + excluded.revenue
+    """,
+    "sales_daily_category": """
+        INSERT INTO sales_daily_category (day, category_id, items_sold, revenue)
+        SELECT date(o.order_date), p.category_id, SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+        FROM {order_items} oi
+        JOIN {orders} o ON o.order_id = oi.order_id
+        JOIN products p ON p.product_id = oi.product_id
+        WHERE oi.order_item_id > ? AND oi.order_item_id <= ? AND date(o.order_date) IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (day, category_id) DO UPDATE SET items_sold = items_sold + excluded.items_sold,
+                                                     revenue = revenue + excluded.revenue
+    """,
+    "sales_daily_product": """
+        INSERT INTO sales_daily_product (day, product_id, items_sold, revenue)
+        SELECT date(o.order_date), oi.product_id, SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+        FROM {order_items} oi JOIN {orders} o ON o.order_id = oi.order_id
+        WHERE oi.order_item_id > ? AND oi.order_item_id <= ? AND date(o.order_date) IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (day, product_id) DO UPDATE SET items_sold = items_sold + excluded.items_sold,
+                                                    revenue = revenue + excluded.revenue
+    """,
+}
+
+ROLLUP_TABLES = ("sales_daily", "sales_daily_category", "sales_daily_product")
+
+# Начало периода: последние days дней, считая от последнего дня с продажами
+PERIOD_START = "date((SELECT MAX(day) FROM sales_daily), ?)"
+
+
+def refresh(conn, sources=None):
+    """Учёт заказов и позиций, появившихся после прошлого обновления.
+
+    sources - {таблица: источник строк} вместо таблиц orders и order_items
+    (например, представления archive.ARCHIVED_TABLES). Возвращает (число
+    новых заказов, число новых позиций).
+    """
+    sources = dict({"orders": "orders", "order_items": "order_items"}, **(sources or {}))
+    db.require_no_transaction(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        marks = dict(conn.execute("SELECT name, last_id FROM rollup_state").fetchall())
+        last_order = conn.execute(f"SELECT IFNULL(MAX(order_id), 0) FROM {sources['orders']}").fetchone()[0]
+        last_item = conn.execute(f"SELECT IFNULL(MAX(order_item_id), 0) FROM {sources['order_items']}").fetchone()[0]
+
+        if last_order > marks["orders"]:
+            conn.execute(ORDERS_SQL.format(**sources), (marks["orders"], last_order))
+        if last_item > marks["order_items"]:
+            for query in ITEMS_SQL.values():
+                conn.execute(query.format(**sources), (marks["order_items"], last_item))
+
+        conn.executemany("UPDATE rollup_state SET last_id = ? WHERE name = ?",
+                         [(max(last_order, marks["orders"]), "orders"),
+                          (max(last_item, marks["order_items"]), "order_items")])
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return max(last_order - marks["orders"], 0), max(last_item - marks["order_items"], 0)
+
+
+def rebuild(conn):
+    """Пересчёт сводок по всей истории заказов, включая архив, если он есть"""
+    # Проверка до ATTACH: attach() фиксирует открытую транзакцию
+    db.require_no_transaction(conn)
+    sources = None
+    if archive.is_attached(conn) or os.path.exists(archive.settings["path"]):
+        archive.attach(conn)
+        sources = archive.ARCHIVED_TABLES
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table_name in ROLLUP_TABLES:
+            conn.execute(f"DELETE FROM {table_name}")
+        conn.execute("UPDATE rollup_state SET last_id = 0")
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return refresh(conn, sources)
+
+
+def daily_sales(conn, days=30):
+    """Продажи по дням за период: [(день, заказов, единиц товара, выручка)]"""
+    return conn.execute(f"SELECT day, order_count, items_sold, ROUND(revenue, 2) FROM sales_daily "
+                        f"WHERE day > {PERIOD_START} ORDER BY day DESC", (f"-{days} days",)).fetchall()
+
+
+def category_sales(conn, days=30):
+    """Продажи по категориям за период: [(category_id, единиц товара, выручка)]"""
+    return conn.execute(f"SELECT category_id, SUM(items_sold), ROUND(SUM(revenue), 2) FROM sales_daily_category "
+                        f"WHERE day > {PERIOD_START} GROUP BY category_id ORDER BY 3 DESC",
+                        (f"-{days} days",)).fetchall()
+
+
+def top_products(conn, days=30, limit=10):
+    """Самые продаваемые по выручке товары за период: [(product_id, единиц товара, выручка)]"""
+    return conn.execute(f"SELECT product_id, SUM(items_sold), ROUND(SUM(revenue), 2) FROM sales_daily_product "
+                        f"WHERE day > {PERIOD_START} GROUP BY product_id ORDER BY 3 DESC LIMIT ?",
+                        (f"-{days} days", limit)).fetchall()
@@ -0,0 +1,505 @@
+"""HTTP/JSON API данных магазина без графического интерфейса (asyncio, только стандартная библиотека).
+
+    python manage.py serve --port 8080
+
+Маршруты (таблица - любая из schema.TABLE_COLUMNS, ключ - значения
+первичного ключа через "/", например /api/product_tags/5/7):
+
+    GET    /api/<таблица>           страница строк: q, sort, limit, cursor, фильтры, archive
+    GET    /api/<таблица>/<ключ>    одна запись
+    POST   /api/<таблица>           добавление записи (заказ с ключом items - через order_service)
+    PATCH  /api/<таблица>/<ключ>    изменение переданных полей (PUT - то же)
+    DELETE /api/<таблица>/<ключ>    удаление записи
+
+Запросы на чтение выполняются в пуле потоков со своими соединениями, все
+записи - в единственном потоке-писателе, поэтому записи сервера идут строго
+по очереди и не ждут друг друга на блокировке SQLite. Страницы читаются по
+ключу (KeysetPager), а следующая страница задаётся непрозрачным курсором из
+ответа. GET возвращает ETag: повторный запрос с If-None-Match получает 304
+без тела, а PATCH и DELETE с If-Match выполняются, только если запись не
+изменилась с момента чтения.
+"""
+import asyncio
+import base64
+import configparser
+import hashlib
+import http
+import json
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import credentials
+import db
+import order_service
+import schema
+from repository import Store
+
+CONFIG_PATH = "store.ini"
+
+# Ограничения запроса: размер тела и число заголовков
+MAX_BODY = 2 ** 20
+MAX_HEADERS = 100
+
+settings = {
+    "host": "127.0.0.1",
+    "port": 8080,
+    "readers": 4,
+    "page_size": 100,
+    "max_page_size": 1000,
+}
+
+log = logging.getLogger("store.api")
+
+
+def load_config(config_path=CONFIG_PATH):
+    """Чтение секции [api] из ini-файла: host, port, readers, page_size, max_page_size"""
+    parser = configparser.ConfigParser()
+    if not parser.read(config_path, encoding="utf-8") or not parser.has_section("api"):
+        return {}
+    section = parser["api"]
+    config = {name: section.getint(name) for name in ("port", "readers", "page_size", "max_page_size")
+              if name in section}
+    if "host" in section:
+        config["host"] = section["host"]
+    return config
+
+
+def configure(host=None, port=None, readers=None, page_size=None, max_page_size=None):
+    for name, value in (("host", host), ("port", port), ("readers", readers), ("page_size", page_size),
+                        ("max_page_size", max_page_size)):
+        if value is not None:
+            settings[name] = value
+
+
+class HttpError(Exception):
+    """Ответ с кодом ошибки и сообщением"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ConnectionPool:
+    """Потоки, у каждого из которых своё соединение с базой.
+
+    Функция func(conn, ...) выполняется в потоке пула на его соединении;
+    незавершённая транзакция после неё откатывается. Пул из одного потока -
+    единственный писатель сервера.
+    """
+
+    def __init__(self, size, name):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+        self.executor = ThreadPoolExecutor(size, thread_name_prefix=name)
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            # Соединение закрывается из основного потока в close()
+            conn = self.local.conn = db.connect(check_same_thread=False)
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def call(self, func, args):
+        conn = self.connection()
+        try:
+            return func(conn, *args)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.call, func, args)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+
+
+def to_json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(header, etag):
+    """Совпадает ли etag с одним из значений If-None-Match / If-Match (слабое сравнение)"""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def row_dict(names, values):
+    """Запись для ответа; хеш пароля наружу не отдаётся"""
+    return {name: value for name, value in zip(names, values) if name != "password_hash"}
+
+
+def pager_fingerprint(pager):
+    """Отпечаток запроса источника: курсор действует только для того же поиска, фильтров и сортировки"""
+    text = json.dumps([pager.source, pager.key_columns, pager.where, pager.params, pager.descending], default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def encode_cursor(pager, key):
+    payload = json.dumps([pager_fingerprint(pager), list(key)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(pager, cursor):
+    """Ключ последней строки предыдущей страницы из курсора"""
+    try:
+        fingerprint, key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HttpError(400, "Неверный курсор") from None
+    if fingerprint != pager_fingerprint(pager) or len(key) != len(pager.key_columns):
+        raise HttpError(400, "Курсор относится к другому запросу")
+    return tuple(key)
+
+
+def parse_query(table_name, query):
+    """Параметры страницы из строки запроса: {term, filters, sort, limit, cursor, archive}.
+
+    Фильтры - столбцы schema.FILTERS: для диапазонов <столбец>_from и
+    <столбец>_to, для остальных <столбец>=значение; sort=столбец или
+    sort=-столбец (по убыванию).
+    """
+    params = dict(parse_qsl(query, keep_blank_values=True))
+    result = {"term": params.pop("q", "").strip(), "cursor": params.pop("cursor", None),
+              "archive": params.pop("archive", "0") in ("1", "true"), "sort": None, "filters": {}}
+
+    sort = params.pop("sort", "")
+    if sort:
+        column = sort.lstrip("-")
+        if column not in schema.TABLE_COLUMNS[table_name]:
+            raise HttpError(400, f"Неизвестный столбец сортировки {column}")
+        result["sort"] = (column, sort.startswith("-"))
+
+    try:
+        limit = int(params.pop("limit", settings["page_size"]))
+    except ValueError:
+        raise HttpError(400, "limit должен быть целым числом") from None
+    if not 0 < limit <= settings["max_page_size"]:
+        raise HttpError(400, f"limit должен быть от 1 до {settings['max_page_size']}")
+    result["limit"] = limit
+
+    for column, kind in schema.FILTERS.get(table_name, {}).items():
+        if kind in schema.RANGE_FILTERS:
+            bounds = (params.pop(f"{column}_from", None), params.pop(f"{column}_to", None))
+            if bounds != (None, None):
+                result["filters"][column] = bounds
+        elif column in params:
+            value = params.pop(column)
+            if kind in schema.FILTER_CHOICES and value not in schema.FILTER_CHOICES[kind]:
+                raise HttpError(400, f"{column}: допустимые значения - {', '.join(schema.FILTER_CHOICES[kind])}")
+            result["filters"][column] = value
+
+    if params:
+        raise HttpError(400, f"Неизвестные параметры: {', '.join(sorted(params))}")
+    return result
+
+
+def parse_key(table_name, parts):
+    """Значения первичного ключа из сегментов пути"""
+    if len(parts) != len(schema.key_columns(table_name)):
+        raise HttpError(404, "Не найдено")
+    try:
+        return tuple(int(part) for part in parts)
+    except ValueError:
+        raise HttpError(404, "Не найдено") from None
+
+
+def parse_record(table_name, body, partial):
+    """Поля записи из тела запроса; пароль передаётся в поле password открытым текстом"""
+    try:
+        record = json.loads(body or b"null")
+    except ValueError:
+        raise HttpError(400, "Тело запроса должно быть JSON") from None
+    if not isinstance(record, dict):
+        raise HttpError(400, "Тело запроса должно быть объектом JSON")
+
+    allowed = set((schema.EDIT_FIELDS if partial else schema.FORM_FIELDS)[table_name])
+    if "password_hash" in allowed:
+        allowed = (allowed - {"password_hash"}) | {"password"}
+    if table_name == "orders" and not partial:
+        allowed.add("items")
+    unknown = sorted(set(record) - allowed)
+    if unknown:
+        raise HttpError(400, f"Неизвестные поля: {', '.join(unknown)}")
+    for col, value in record.items():
+        if col == "items":
+            record[col] = parse_items(value)
+        elif col == "password":
+            if not isinstance(value, str) or not value:
+                raise HttpError(400, "password должен быть непустой строкой")
+        elif value is not None and not isinstance(value, (str, int, float)):
+            raise HttpError(400, f"Поле {col}: ожидается строка, число или null")
+    if "password" in record:
+        record["password_hash"] = record.pop("password")
+    if not record:
+        raise HttpError(400, "Нет полей для сохранения")
+
+    # При изменении проверяются только переданные поля, заказ с позициями проверяет order_service
+    required = record if partial else () if "items" in record else schema.REQUIRED_FIELDS.get(table_name, ())
+    for col in required:
+        error = schema.check_required(table_name, col, record.get(col))
+        if error:
+            raise HttpError(400, error)
+    return record
+
+
+def parse_items(items):
+    """Позиции заказа [(product_id, количество)] из списка объектов или пар"""
+    if not isinstance(items, list):
+        raise HttpError(400, "items должен быть списком позиций")
+    result = []
+    for item in items:
+        if isinstance(item, dict) and set(item) == {"product_id", "quantity"}:
+            item = (item["product_id"], item["quantity"])
+        elif not (isinstance(item, list) and len(item) == 2):
+            raise HttpError(400, 'Позиция заказа: ожидается {"product_id": ..., "quantity": ...}')
+        if not all(isinstance(value, (int, str)) and not isinstance(value, bool) for value in item):
+            raise HttpError(400, "product_id и quantity позиции заказа должны быть целыми числами")
+        result.append(tuple(item))
+    return result
+
+
+def read_page(conn, table_name, query, use_fts):
+    """Страница строк и курсор следующей страницы (None - строк больше нет)"""
+    repository = Store(conn)[table_name]
+    pager = repository.view_pager(query["term"], use_fts, query["filters"], query["sort"], query["limit"],
+                                  include_archive=query["archive"])
+    if query["cursor"]:
+        pager.last_key = decode_cursor(pager, query["cursor"])
+        pager.at_start = False
+        rows = pager.fetch_next(conn)
+    else:
+        rows = pager.fetch_first(conn)
+
+    names = repository.view_names()
+    return {
+        "items": [row_dict(names, values) for _, values in rows],
+        "next_cursor": None if pager.at_end else encode_cursor(pager, pager.last_key),
+    }
+
+
+def read_row(conn, table_name, key):
+    repository = Store(conn)[table_name]
+    row = repository.view_row(*key)
+    if row is None:
+        raise HttpError(404, "Запись не найдена")
+    return row_dict(repository.view_names(), row)
+
+
+def check_version(repository, key, if_match):
+    """Проверка If-Match по текущему состоянию записи (внутри транзакции писателя)"""
+    row = repository.view_row(*key)
+    if row is None:
+        raise HttpError(404, "Запись не найдена")
+    if if_match and not etag_matches(if_match, make_etag(to_json(row_dict(repository.view_names(), row)))):
+        raise HttpError(412, "Запись изменилась после чтения")
+
+
+def insert_record(conn, table_name, record):
+    """Добавление записи (или оформление заказа); возвращает (ключ, запись)"""
+    repository = Store(conn)[table_name]
+    if table_name == "orders" and "items" in record:
+        key = (order_service.place_order(conn, record),)
+    else:
+        row_id = repository.insert(record)
+        conn.commit()
+        # У таблиц с составным ключом lastrowid - это rowid, а не первичный ключ
+        key = tuple(record.get(col) for col in repository.key_columns) if len(repository.key_columns) > 1 \
+            else (row_id,)
+    return key, read_row(conn, table_name, key)
+
+
+def update_record(conn, table_name, key, record, if_match):
+    repository = Store(conn)[table_name]
+    conn.execute("BEGIN IMMEDIATE")
+    check_version(repository, key, if_match)
+    repository.update(key, record)
+    conn.commit()
+    return read_row(conn, table_name, key)
+
+
+def delete_record(conn, table_name, key, if_match):
+    repository = Store(conn)[table_name]
+    conn.execute("BEGIN IMMEDIATE")
+    check_version(repository, key, if_match)
+    repository.delete(*key)
+    conn.commit()
+
+
+async def read_request(reader):
+    """(метод, путь, версия, заголовки, тело) или None, если клиент закрыл соединение"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        # Путь может прийти и без процентного кодирования - как UTF-8
+        method, target, version = line.decode("utf-8").split()
+    except ValueError:
+        raise HttpError(400, "Неверная строка запроса") from None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(431, "Слишком много заголовков")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "Неверный Content-Length") from None
+    if length > MAX_BODY:
+        raise HttpError(413, "Слишком большое тело запроса")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version, headers, body
+
+
+def render_response(status, headers, body, keep_alive):
+    lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}"]
+    if body or status not in (204, 304):
+        lines.append("Content-Type: application/json; charset=utf-8")
+        lines.append(f"Content-Length: {len(body)}")
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+class ApiServer:
+    """Обработчик соединений HTTP/1.1 с постоянными соединениями (keep-alive)"""
+
+    def __init__(self, readers=None, use_fts=True):
+        self.readers = ConnectionPool(readers or settings["readers"], "api-read")
+        self.writer = ConnectionPool(1, "api-write")
+        self.use_fts = use_fts
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    writer.write(render_response(e.status, {}, to_json({"error": e.message}), False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                status, response_headers, response_body = await self.dispatch(method, target, headers, body)
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+                writer.write(render_response(status, response_headers, response_body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body):
+        """(код, заголовки, тело) ответа на запрос"""
+        try:
+            url = urlsplit(target)
+            parts = [unquote(part) for part in url.path.strip("/").split("/")]
+            if len(parts) < 2 or parts[0] != "api" or parts[1] not in schema.TABLE_COLUMNS:
+                raise HttpError(404, "Не найдено")
+            table_name, key = parts[1], parts[2:]
+
+            if not key:
+                if method == "GET":
+                    query = parse_query(table_name, url.query)
+                    return self.conditional(headers, await self.readers.run(read_page, table_name, query,
+                                                                              self.use_fts))
+                if method == "POST":
+                    return await self.create(table_name, body)
+                raise HttpError(405, "Метод не поддерживается")
+
+            key = parse_key(table_name, key)
+            if method == "GET":
+                return self.conditional(headers, await self.readers.run(read_row, table_name, key))
+            if method in ("PATCH", "PUT"):
+                record = await self.hash_password(parse_record(table_name, body, partial=True))
+                row = await self.writer.run(update_record, table_name, key, record, headers.get("if-match"))
+                response = to_json(row)
+                return 200, {"ETag": make_etag(response)}, response
+            if method == "DELETE":
+                await self.writer.run(delete_record, table_name, key, headers.get("if-match"))
+                return 204, {}, b""
+            raise HttpError(405, "Метод не поддерживается")
+        except HttpError as e:
+            return e.status, {}, to_json({"error": e.message})
+        except order_service.OutOfStock as e:
+            return 409, {}, to_json({"error": str(e)})
+        except ValueError as e:
+            return 400, {}, to_json({"error": str(e)})
+        except sqlite3.IntegrityError as e:
+            return 409, {}, to_json({"error": str(e)})
+        except sqlite3.Error as e:
+            log.exception("Ошибка базы данных: %s %s", method, target)
+            return 500, {}, to_json({"error": f"Ошибка базы данных: {e}"})
+        except Exception:
+            # Клиент получает ответ при любой ошибке, а соединение остаётся открытым
+            log.exception("Ошибка обработки запроса: %s %s", method, target)
+            return 500, {}, to_json({"error": "Внутренняя ошибка сервера"})
+
+    async def create(self, table_name, body):
+        record = await self.hash_password(parse_record(table_name, body, partial=False))
+        key, row = await self.writer.run(insert_record, table_name, record)
+        response = to_json(row)
+        location = f"/api/{table_name}/" + "/".join(str(value) for value in key)
+        return 201, {"ETag": make_etag(response), "Location": location}, response
+
+    async def hash_password(self, record):
+        # Хеш пароля занимает сотни миллисекунд - вне потока-писателя, чтобы не задерживать другие записи
+        if record.get("password_hash"):
+            record["password_hash"] = await asyncio.get_running_loop().run_in_executor(
+                None, credentials.hash_password, record["password_hash"])
+        return record
+
+    @staticmethod
+    def conditional(headers, data):
+        """Ответ на GET с ETag; 304 без тела, если у клиента та же версия"""
+        body = to_json(data)
+        etag = make_etag(body)
+        # Клиент может кэшировать ответ, но должен проверять его при каждом запросе
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(headers.get("if-none-match"), etag):
+            return 304, response_headers, b""
+        return 200, response_headers, body
+
+    def close(self):
+        self.readers.close()
+        self.writer.close()
+
+
+async def serve(host=None, port=None, readers=None, use_fts=True, on_ready=None):
+    """Запуск сервера до отмены задачи; on_ready(адреса) вызывается после открытия порта"""
+    api = ApiServer(readers, use_fts)
+    server = await asyncio.start_server(api.handle_connection, host or settings["host"],
+                                        settings["port"] if port is None else port)
+    try:
+        async with server:
+            if on_ready:
+                on_ready([sock.getsockname() for sock in server.sockets])
+            await server.serve_forever()
+    finally:
+        api.close()
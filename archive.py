@@ -0,0 +1,168 @@
+"""Архив старых заказов в отдельном файле SQLite.
+
+Доставленные и отменённые заказы старше age_days переносятся вместе с
+позициями в базу архива (archive_orders), и экраны по умолчанию читают
+только оперативные таблицы. Архив подключается к соединению через ATTACH
+только по требованию (attach); тогда же создаются временные представления
+orders_all и order_items_all - UNION ALL оперативных и архивных строк.
+
+Перед переносом сводки продаж (analytics) дополняются ещё не учтёнными
+заказами, а analytics.rebuild() читает и архивные заказы.
+"""
+import configparser
+import json
+
+import analytics
+import db
+import schema
+
+CONFIG_PATH = "store.ini"
+
+SCHEMA_NAME = "archive"
+
+# Заказы в этих статусах больше не меняются и могут уйти в архив
+ARCHIVED_STATUSES = ("delivered", "cancelled")
+
+settings = {
+    "path": "online_store_archive.db",
+    "age_days": 365,
+    "batch_size": 500,
+}
+
+# Таблицы архива - копии оперативных без внешних ключей (товары и пользователи остаются в основной базе)
+ARCHIVE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.orders (
+        order_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        order_date DATETIME,
+        status TEXT,
+        total_amount REAL NOT NULL,
+        shipping_address TEXT NOT NULL,
+        payment_method TEXT,
+        payment_status TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.order_items (
+        order_item_id INTEGER PRIMARY KEY,
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price REAL NOT NULL
+    );
+
+    CREATE INDEX IF NOT EXISTS {SCHEMA_NAME}.idx_orders_date ON orders(order_date);
+    CREATE INDEX IF NOT EXISTS {SCHEMA_NAME}.idx_orders_total ON orders(total_amount);
+    CREATE INDEX IF NOT EXISTS {SCHEMA_NAME}.idx_orders_status_date ON orders(status, order_date);
+    CREATE INDEX IF NOT EXISTS {SCHEMA_NAME}.idx_orders_user_date ON orders(user_id, order_date);
+    CREATE INDEX IF NOT EXISTS {SCHEMA_NAME}.idx_order_items_order
+        ON order_items(order_id, product_id, quantity, unit_price);
+"""
+
+# Представления "оперативные + архивные строки" для таблиц с архивом
+ARCHIVED_TABLES = {"orders": "orders_all", "order_items": "order_items_all"}
+
+
+def load_config(config_path=CONFIG_PATH):
+    """Чтение секции [archive] из ini-файла: path, age_days, batch_size"""
+    parser = configparser.ConfigParser()
+    if not parser.read(config_path, encoding="utf-8") or not parser.has_section("archive"):
+        return {}
+    section = parser["archive"]
+    config = {name: section.getint(name) for name in ("age_days", "batch_size") if name in section}
+    if "path" in section:
+        config["path"] = section["path"]
+    return config
+
+
+def configure(path=None, age_days=None, batch_size=None):
+    for name, value in (("path", path), ("age_days", age_days), ("batch_size", batch_size)):
+        if value is not None:
+            settings[name] = value
+
+
+def is_attached(conn):
+    return any(row[1] == SCHEMA_NAME for row in conn.execute("PRAGMA database_list"))
+
+
+def attach(conn, path=None):
+    """Подключение архива к соединению (если ещё не подключён) и создание представлений"""
+    if is_attached(conn):
+        return
+    # ATTACH нельзя выполнить внутри транзакции
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute(f"ATTACH DATABASE ? AS {SCHEMA_NAME}", (path or settings["path"],))
+    conn.executescript(ARCHIVE_SQL)
+
+    # Представления над двумя базами могут быть только временными (TEMP) - они живут до закрытия соединения
+    for table_name, view in ARCHIVED_TABLES.items():
+        columns = ", ".join(schema.TABLE_COLUMNS[table_name])
+        conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS {view} AS "
+                     f"SELECT {columns} FROM main.{table_name} "
+                     f"UNION ALL SELECT {columns} FROM {SCHEMA_NAME}.{table_name}")
+
+
+def detach(conn):
+    if is_attached(conn):
+        for view in ARCHIVED_TABLES.values():
+            conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+        conn.execute(f"DETACH DATABASE {SCHEMA_NAME}")
+
+
+def archive_orders(conn, age_days=None, batch_size=None, progress=None):
+    """Перенос старых доставленных и отменённых заказов с позициями в архив.
+
+    Каждая порция из batch_size заказов переносится одной транзакцией:
+    строки копируются в архив и удаляются из оперативных таблиц. Копирование
+    идёт через INSERT OR REPLACE, поэтому повторный запуск после сбоя
+    (в режиме WAL транзакция над двумя файлами атомарна только в каждом
+    файле отдельно) лишь доводит перенос до конца. progress(заказов,
+    позиций) вызывается после каждой порции.
+
+    Возвращает (перенесено заказов, перенесено позиций).
+    """
+    age_days = settings["age_days"] if age_days is None else age_days
+    batch_size = batch_size or settings["batch_size"]
+    db.require_no_transaction(conn)
+    attach(conn)
+    # Заказы, ещё не попавшие в сводки продаж, после переноса refresh() уже не увидит
+    analytics.refresh(conn)
+
+    order_columns = ", ".join(schema.TABLE_COLUMNS["orders"])
+    item_columns = ", ".join(schema.TABLE_COLUMNS["order_items"])
+    statuses = ", ".join("?" * len(ARCHIVED_STATUSES))
+    # Заказы порции передаются одним параметром JSON
+    batch_ids = "SELECT value FROM json_each(?)"
+
+    total_orders = total_items = 0
+    last_id = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [row[0] for row in conn.execute(
+                f"SELECT order_id FROM main.orders WHERE status IN ({statuses}) "
+                f"AND order_date < datetime('now', ?) AND order_id > ? ORDER BY order_id LIMIT ?",
+                ARCHIVED_STATUSES + (f"-{age_days} days", last_id, batch_size))]
+            if not ids:
+                conn.rollback()
+                break
+            batch = json.dumps(ids)
+
+            conn.execute(f"INSERT OR REPLACE INTO {SCHEMA_NAME}.orders ({order_columns}) "
+                         f"SELECT {order_columns} FROM main.orders WHERE order_id IN ({batch_ids})", (batch,))
+            items = conn.execute(f"INSERT OR REPLACE INTO {SCHEMA_NAME}.order_items ({item_columns}) "
+                                 f"SELECT {item_columns} FROM main.order_items WHERE order_id IN ({batch_ids})",
+                                 (batch,)).rowcount
+            conn.execute(f"DELETE FROM main.order_items WHERE order_id IN ({batch_ids})", (batch,))
+            conn.execute(f"DELETE FROM main.orders WHERE order_id IN ({batch_ids})", (batch,))
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+        last_id = ids[-1]
+        total_orders += len(ids)
+        total_items += items
+        if progress:
+            progress(total_orders, total_items)
+    return total_orders, total_items
@@ -0,0 +1,351 @@
+"""Горячее резервное копирование базы магазина без остановки приложения.
+
+Снимок делается через sqlite3.Connection.backup порциями по pages страниц:
+на время каждой порции источник держит только блокировку чтения (в режиме
+WAL она не мешает записи), между порциями - пауза sleep_ms. Если другое
+соединение меняет базу во время копирования, SQLite начинает копирование
+заново, поэтому снимок всегда согласован на момент окончания.
+
+Снимки сжимаются gzip, называются по времени (store-ГГГГММДД-ЧЧММСС-мкс.db.gz)
+и хранятся в каталоге directory, старые сверх keep удаляются.
+"""
+import configparser
+import datetime
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+import db
+import schema
+
+CONFIG_PATH = "store.ini"
+
+SNAPSHOT_PREFIX = "store-"
+SNAPSHOT_SUFFIX = ".db.gz"
+
+# Уровень gzip: 9 почти не уменьшает файл базы, но сжимает в несколько раз дольше
+COMPRESS_LEVEL = 6
+
+settings = {
+    "directory": "backups",
+    # Период снимков по расписанию в минутах; 0 - только вручную
+    "interval_minutes": 0,
+    "keep": 7,
+    "pages": 1024,
+    "sleep_ms": 10.0,
+    # Перезапусков из-за записи в источник, после которых база копируется одной порцией
+    "max_restarts": 3,
+}
+
+
+def load_config(config_path=CONFIG_PATH):
+    """Чтение секции [backup] из ini-файла: directory, interval_minutes, keep, pages, sleep_ms, max_restarts"""
+    parser = configparser.ConfigParser()
+    if not parser.read(config_path, encoding="utf-8") or not parser.has_section("backup"):
+        return {}
+    section = parser["backup"]
+    config = {name: section.getint(name) for name in ("interval_minutes", "keep", "pages", "max_restarts")
+              if name in section}
+    if "sleep_ms" in section:
+        config["sleep_ms"] = section.getfloat("sleep_ms")
+    if "directory" in section:
+        config["directory"] = section["directory"]
+    return config
+
+
+def configure(directory=None, interval_minutes=None, keep=None, pages=None, sleep_ms=None, max_restarts=None):
+    for name, value in (("directory", directory), ("interval_minutes", interval_minutes), ("keep", keep),
+                        ("pages", pages), ("sleep_ms", sleep_ms), ("max_restarts", max_restarts)):
+        if value is not None:
+            settings[name] = value
+
+
+class BackupResult:
+    """Итог копирования: объём, скорость и время удержания блокировки источника"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = 0
+        self.page_size = 0
+        self.steps = 0
+        self.restarts = 0
+        # Копирование порциями прервано из-за частых перезапусков и выполнено одной порцией
+        self.single_step = False
+        self.copy_seconds = 0.0
+        self.compress_seconds = 0.0
+        self.max_step_ms = 0.0
+        self.total_step_ms = 0.0
+        self.size = 0
+        # Предупреждения проверки снимка при восстановлении (нарушения внешних ключей)
+        self.warnings = []
+
+    @property
+    def throughput(self):
+        """Скорость копирования страниц, МБ/с"""
+        return self.pages * self.page_size / 2 ** 20 / self.copy_seconds if self.copy_seconds else 0.0
+
+    def __str__(self):
+        average = self.total_step_ms / self.steps if self.steps else 0.0
+        text = (f"{self.path}: страниц {self.pages} по {self.page_size} байт за {self.copy_seconds:.2f} с "
+                f"({self.throughput:.1f} МБ/с), порций {self.steps}, перезапусков {self.restarts}, "
+                f"блокировка на порцию: средняя {average:.1f} мс, максимальная {self.max_step_ms:.1f} мс")
+        if self.single_step:
+            text += ", база часто менялась - скопирована одной порцией"
+        if self.size:
+            text += f", сжатие {self.compress_seconds:.2f} с, файл {self.size / 2 ** 20:.1f} МБ"
+        if self.warnings:
+            text += f", предупреждений {len(self.warnings)}"
+        return text
+
+
+class TooManyRestarts(Exception):
+    """Источник меняется чаще, чем успевает скопироваться порциями"""
+
+
+def copy_database(source, target, result, pages=None, sleep_ms=None, max_restarts=None):
+    """Копирование source в target порциями с замером времени каждой порции.
+
+    Каждая запись в источник другим соединением начинает копирование
+    порциями заново. После max_restarts перезапусков база копируется одной
+    порцией: в режиме WAL она держит только снимок для чтения и запись не
+    блокирует (в режиме DELETE запись ждёт окончания копирования).
+    """
+    pages = pages or settings["pages"]
+    sleep = (settings["sleep_ms"] if sleep_ms is None else sleep_ms) / 1000
+    max_restarts = settings["max_restarts"] if max_restarts is None else max_restarts
+    state = {"step_start": time.perf_counter(), "remaining": None}
+
+    def progress(status, remaining, total):
+        now = time.perf_counter()
+        step_ms = (now - state["step_start"]) * 1000
+        result.steps += 1
+        result.total_step_ms += step_ms
+        result.max_step_ms = max(result.max_step_ms, step_ms)
+        # Рост числа оставшихся страниц - копирование началось заново после записи в источник
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            result.restarts += 1
+            if result.restarts > max_restarts:
+                raise TooManyRestarts()
+        state["remaining"] = remaining
+        result.pages = total
+        # Между порциями блокировка источника снята - даём поработать записывающим соединениям
+        if remaining and sleep:
+            time.sleep(sleep)
+        state["step_start"] = time.perf_counter()
+
+    start = time.perf_counter()
+    # sleep в backup() - только пауза перед повтором занятой порции (SQLITE_BUSY)
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=max(sleep, 0.01))
+    except TooManyRestarts:
+        result.single_step = True
+        state["remaining"] = None
+        state["step_start"] = time.perf_counter()
+        source.backup(target, pages=-1, progress=progress, sleep=max(sleep, 0.01))
+    result.copy_seconds = time.perf_counter() - start
+    result.page_size = source.execute("PRAGMA page_size").fetchone()[0]
+
+
+def snapshot_name(moment=None):
+    return f"{SNAPSHOT_PREFIX}{(moment or datetime.datetime.now()):%Y%m%d-%H%M%S-%f}{SNAPSHOT_SUFFIX}"
+
+
+def reserve_snapshot_path(directory):
+    """Путь нового снимка; файл создаётся сразу (эксклюзивно), чтобы другой снимок его не перезаписал"""
+    while True:
+        path = os.path.join(directory, snapshot_name())
+        try:
+            open(path, "xb").close()
+            return path
+        except FileExistsError:
+            continue
+
+
+def create_snapshot(source_path=None, directory=None, pages=None, sleep_ms=None):
+    """Сжатый снимок базы в каталоге directory; возвращает BackupResult"""
+    directory = directory or settings["directory"]
+    os.makedirs(directory, exist_ok=True)
+    path = reserve_snapshot_path(directory)
+    result = BackupResult(path)
+
+    fd, temp_path = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    completed = False
+    try:
+        source = db.connect(source_path)
+        target = sqlite3.connect(temp_path)
+        try:
+            copy_database(source, target, result, pages, sleep_ms)
+            # Снимок - самостоятельный файл без журнала WAL
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+            source.close()
+
+        start = time.perf_counter()
+        with open(temp_path, "rb") as raw, gzip.open(path + ".part", "wb", COMPRESS_LEVEL) as packed:
+            shutil.copyfileobj(raw, packed, 2 ** 20)
+        os.replace(path + ".part", path)
+        result.compress_seconds = time.perf_counter() - start
+        result.size = os.path.getsize(path)
+        completed = True
+    finally:
+        os.remove(temp_path)
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+        # Зарезервированный пустой файл неудавшегося снимка
+        if not completed:
+            os.remove(path)
+    return result
+
+
+def list_snapshots(directory=None):
+    """Снимки каталога от старых к новым"""
+    directory = directory or settings["directory"]
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX))
+
+
+def rotate(directory=None, keep=None):
+    """Удаление старых снимков сверх keep; возвращает удалённые файлы"""
+    keep = settings["keep"] if keep is None else keep
+    snapshots = list_snapshots(directory)
+    removed = snapshots[:max(len(snapshots) - keep, 0)]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def unpack(path, directory=None):
+    """Распаковка снимка во временный файл; удалить его должен вызывающий"""
+    fd, temp_path = tempfile.mkstemp(suffix=".db", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(path, "rb") as packed:
+            shutil.copyfileobj(packed, raw, 2 ** 20)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+
+def verify(path):
+    """Проверка снимка: (исправен ли, [ошибки], [предупреждения], {таблица: число строк}).
+
+    Снимок повреждён, если integrity_check находит ошибки или нет таблиц
+    схемы. Нарушения внешних ключей есть и в действующей базе (SQLite их
+    не проверяет, пока foreign_keys выключен), поэтому они только
+    предупреждения и восстановлению не мешают.
+    """
+    try:
+        temp_path = unpack(path, os.path.dirname(path) or None)
+    except (OSError, EOFError, zlib.error) as e:
+        return False, [f"не удалось распаковать: {e}"], [], {}
+    try:
+        conn = sqlite3.connect(temp_path)
+        try:
+            problems = [row[0] for row in conn.execute("PRAGMA integrity_check") if row[0] != "ok"]
+            warnings = [f"нарушен внешний ключ: {row[0]} rowid {row[1]} -> {row[2]}"
+                        for row in conn.execute("PRAGMA foreign_key_check")]
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            missing = [table for table in schema.TABLE_COLUMNS if table not in tables]
+            problems += [f"нет таблицы {table}" for table in missing]
+            counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in schema.TABLE_COLUMNS if table in tables}
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return False, [str(e)], [], {}
+    finally:
+        os.remove(temp_path)
+    return not problems, problems, warnings, counts
+
+
+def restore(path, target_path=None, pages=None):
+    """Восстановление базы из снимка (после проверки); возвращает BackupResult.
+
+    Страницы записываются в действующую базу через backup API одной
+    транзакцией, поэтому открытые соединения после восстановления видят
+    данные снимка, а при сбое база остаётся прежней.
+    """
+    ok, problems, warnings, _ = verify(path)
+    if not ok:
+        raise sqlite3.DatabaseError(f"Снимок {path} повреждён: {'; '.join(problems)}")
+
+    result = BackupResult(target_path or db.settings["path"])
+    result.warnings = warnings
+    temp_path = unpack(path, os.path.dirname(path) or None)
+    try:
+        source = sqlite3.connect(temp_path)
+        target = db.connect(target_path)
+        try:
+            # Восстановление выполняется одной порцией, чтобы не смешать старые и новые страницы
+            copy_database(source, target, result, pages=pages or -1, sleep_ms=0)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(temp_path)
+    return result
+
+
+class BackupScheduler:
+    """Фоновый поток, делающий снимки раз в interval_minutes (и по запросу) и удаляющий старые.
+
+    on_result(result) и on_error(error) вызываются в потоке планировщика;
+    последний итог доступен в last_result.
+    """
+
+    def __init__(self, interval_minutes=None, on_result=None, on_error=None):
+        interval_minutes = settings["interval_minutes"] if interval_minutes is None else interval_minutes
+        self.interval = interval_minutes * 60
+        self.on_result = on_result
+        self.on_error = on_error
+        self.last_result = None
+        self.last_error = None
+        self.running = False
+        self.requested = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="backup-scheduler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def request(self):
+        """Внеочередной снимок"""
+        self.requested.set()
+
+    def run(self):
+        while True:
+            # Без расписания поток ждёт только запросов
+            self.requested.wait(self.interval or None)
+            self.requested.clear()
+            if self.stopped.is_set():
+                break
+            self.running = True
+            try:
+                self.last_result = create_snapshot()
+                self.last_error = None
+                rotate()
+            except (sqlite3.Error, OSError) as e:
+                self.last_error = e
+                if self.on_error:
+                    self.on_error(e)
+                continue
+            finally:
+                self.running = False
+            if self.on_result:
+                self.on_result(self.last_result)
+
+    def stop(self):
+        self.stopped.set()
+        self.requested.set()
+        if self.thread.is_alive():
+            self.thread.join()
@@ -0,0 +1 @@
+"""Нагрузочные измерения: генерация синтетического магазина и замер операций приложения"""
@@ -0,0 +1,175 @@
+"""Генерация синтетического магазина заданного размера.
+
+Распределения неравномерные, как в живых данных: число заказов на
+пользователя и отзывов на товар подчиняется закону Парето (немногие
+пользователи и товары дают большую часть строк), число позиций в заказе -
+геометрическое, категории образуют дерево заданной глубины.
+
+    python -m bench.generate bench.db --orders 100000
+"""
+import argparse
+import datetime
+import itertools
+import random
+import time
+
+import db
+import schema
+from repository import Store
+
+BATCH_SIZE = 10000
+WORDS = ["смартфон", "ноутбук", "телевизор", "холодильник", "куртка", "платье", "кроссовки", "чайник",
+         "пылесос", "наушники", "планшет", "часы", "сумка", "рюкзак", "камера", "монитор", "клавиатура",
+         "мышь", "колонка", "принтер", "утюг", "фен", "блендер", "плита", "диван", "стол", "лампа"]
+ADJECTIVES = ["новый", "компактный", "мощный", "лёгкий", "премиальный", "бюджетный", "умный", "тихий"]
+STATUSES_WEIGHTS = [("delivered", 60), ("shipped", 10), ("processing", 8), ("pending", 12), ("cancelled", 10)]
+
+
+def skewed(rng, mean, alpha=1.5):
+    """Целое с распределением Парето и заданным средним"""
+    return int(rng.paretovariate(alpha) * mean * (alpha - 1) / alpha)
+
+
+def batched(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_all(conn, table_name, columns, rows):
+    repository = Store(conn)[table_name]
+    count = 0
+    for batch in batched(rows):
+        repository.insert_many(columns, batch)
+        conn.commit()
+        count += len(batch)
+    return count
+
+
+def category_rows(depth, branching):
+    """Дерево категорий: (category_id, name, description, parent_category_id)"""
+    next_id = itertools.count(1)
+    level = [None]
+    for d in range(depth):
+        new_level = []
+        for parent in level:
+            for _ in range(branching if parent is not None else branching * 2):
+                category_id = next(next_id)
+                new_level.append(category_id)
+                yield category_id, f"Категория {category_id}", f"Уровень {d + 1}", parent
+        level = new_level
+
+
+def generate(conn, orders=10000, seed=1, category_depth=3, category_branching=4, report=print):
+    """Заполнение пустой базы; размер остальных таблиц выводится из числа заказов"""
+    rng = random.Random(seed)
+    users = max(100, orders // 5)
+    products = max(100, orders // 10)
+    tags = 50
+    start = datetime.datetime(2020, 1, 1)
+    counts = {}
+
+    def timed(table_name, columns, rows):
+        t = time.perf_counter()
+        counts[table_name] = insert_all(conn, table_name, columns, rows)
+        report(f"{table_name}: {counts[table_name]} строк за {time.perf_counter() - t:.1f} с")
+
+    timed("users", schema.TABLE_COLUMNS["users"][1:7] + ("is_active",), (
+        (f"user{i}", f"user{i}@example.com", "0" * 64, f"Имя{i % 997}", f"Фамилия{i % 1499}",
+         f"+7916{i:07d}", int(rng.random() > 0.05))
+        for i in range(1, users + 1)))
+
+    categories = list(category_rows(category_depth, category_branching))
+    timed("categories", schema.TABLE_COLUMNS["categories"], categories)
+    parents = {row[3] for row in categories}
+    leaf_categories = [row[0] for row in categories if row[0] not in parents]
+
+    prices = {}
+
+    def product_rows():
+        for product_id in range(1, products + 1):
+            price = round(rng.lognormvariate(8, 1.2), 2)
+            prices[product_id] = price
+            name = f"{rng.choice(WORDS).capitalize()} {rng.choice(ADJECTIVES)} {product_id}"
+            yield (product_id, rng.choice(leaf_categories), name, f"{rng.choice(ADJECTIVES)} {rng.choice(WORDS)}",
+                   price, rng.randint(0, 500), int(rng.random() > 0.1))
+
+    timed("products", ("product_id", "category_id", "name", "description", "price", "stock_quantity",
+                       "is_active"), product_rows())
+
+    timed("tags", ("tag_id", "name", "description"), ((i, f"тег{i}", None) for i in range(1, tags + 1)))
+    timed("product_tags", ("product_id", "tag_id"), (
+        (product_id, tag_id)
+        for product_id in range(1, products + 1)
+        for tag_id in sorted(set(min(tags, 1 + skewed(rng, 4)) for _ in range(rng.randint(0, 5))))))
+
+    # Популярность товаров и активность пользователей - по Парето
+    product_weights = list(itertools.accumulate(rng.paretovariate(1.2) for _ in range(products)))
+    product_ids = list(range(1, products + 1))
+    user_ids = list(range(1, users + 1))
+    user_weights = [rng.paretovariate(1.3) for _ in range(users)]
+    statuses, status_weights = zip(*STATUSES_WEIGHTS)
+    span = 5 * 365 * 24 * 3600
+
+    items = []
+
+    def order_rows():
+        order_ids = range(1, orders + 1)
+        buyers = rng.choices(user_ids, user_weights, k=orders)
+        for order_id, user_id in zip(order_ids, buyers):
+            total = 0
+            for product_id in rng.choices(product_ids, cum_weights=product_weights, k=min(20, 1 + int(rng.expovariate(0.6)))):
+                quantity = 1 + int(rng.expovariate(1.5))
+                items.append((order_id, product_id, quantity, prices[product_id]))
+                total += quantity * prices[product_id]
+            date = start + datetime.timedelta(seconds=span * order_id / orders)
+            yield (order_id, user_id, date.strftime("%Y-%m-%d %H:%M:%S"), rng.choices(statuses, status_weights)[0],
+                   round(total, 2), f"г. Москва, ул. Тестовая, д. {user_id % 200}", "card", "paid")
+
+    # Позиции пишутся вслед за каждым пакетом заказов, чтобы не держать их все в памяти
+    order_columns = schema.TABLE_COLUMNS["orders"]
+    item_columns = ("order_id", "product_id", "quantity", "unit_price")
+    t = time.perf_counter()
+    counts["orders"] = counts["order_items"] = 0
+    for batch in batched(order_rows()):
+        Store(conn).orders.insert_many(order_columns, batch)
+        Store(conn).order_items.insert_many(item_columns, items)
+        conn.commit()
+        counts["orders"] += len(batch)
+        counts["order_items"] += len(items)
+        items.clear()
+    report(f"orders: {counts['orders']}, order_items: {counts['order_items']} строк "
+           f"за {time.perf_counter() - t:.1f} с")
+
+    timed("product_reviews", ("product_id", "user_id", "rating", "review_text"), (
+        (product_id, rng.choice(user_ids), rng.choices([1, 2, 3, 4, 5], [5, 5, 10, 30, 50])[0],
+         f"{rng.choice(ADJECTIVES)} {rng.choice(WORDS)}, рекомендую")
+        for product_id in product_ids
+        for _ in range(min(200, skewed(rng, 2 * orders / products / 4)))))
+
+    conn.execute("ANALYZE")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетической базы магазина")
+    parser.add_argument("path", help="файл новой базы")
+    parser.add_argument("--orders", type=int, default=10000, help="число заказов (остальное - пропорционально)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--category-depth", type=int, default=3)
+    parser.add_argument("--category-branching", type=int, default=4)
+    parser.add_argument("--profile", choices=sorted(db.PROFILES), default=db.DEFAULT_PROFILE)
+    args = parser.parse_args()
+
+    conn = db.connect(args.path, args.profile)
+    if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+        parser.error(f"{args.path} уже существует и не пуст")
+    schema.ensure_schema(conn)
+    generate(conn, args.orders, args.seed, args.category_depth, args.category_branching)
+
+
+if __name__ == "__main__":
+    main()
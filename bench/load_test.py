@@ -0,0 +1,205 @@
+"""Нагрузочный тест HTTP API (api_server) на локальной машине.
+
+    python manage.py serve --db bench.db
+    python -m bench.load_test --url http://127.0.0.1:8080 --clients 50 --duration 30 --out load.json
+
+Каждый клиент держит одно постоянное соединение и в цикле выполняет
+случайные операции в заданных долях: листание страниц товаров по курсору,
+поиск, фильтр заказов, чтение записи, повторное чтение с If-None-Match
+(ожидается 304) и изменение записи. Изменение записывает в stock_quantity
+прежнее значение, поэтому данные базы не меняются. В отчёт попадают число
+запросов в секунду, коды ответов и p50/p95/p99 задержки по операциям.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import quote, urlsplit
+
+from query_profiler import percentile
+
+# Доли операций в нагрузке
+OPERATIONS = {
+    "list_pages": 20,
+    "search": 15,
+    "filter_orders": 10,
+    "get": 30,
+    "revalidate": 20,
+    "update": 5,
+}
+
+
+class Client:
+    """Минимальный асинхронный клиент HTTP/1.1 с постоянным соединением"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        """(код, заголовки, тело JSON или None)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = b"" if body is None else json.dumps(body).encode("utf-8")
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(data)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        length = int(response_headers.get("content-length", 0))
+        payload = await self.reader.readexactly(length) if length else b""
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, json.loads(payload) if payload else None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class LoadTest:
+    def __init__(self, host, port, seed=1, pages=5):
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.pages = pages
+        self.timings = {name: [] for name in OPERATIONS}
+        self.statuses = {}
+        self.requests = 0
+        self.product_ids = []
+        self.terms = []
+
+    async def prepare(self):
+        """Идентификаторы товаров и слова для поиска из первой страницы товаров"""
+        client = Client(self.host, self.port)
+        try:
+            status, _, page = await client.request("GET", "/api/products?limit=1000")
+        finally:
+            await client.close()
+        if status != 200 or not page["items"]:
+            raise SystemExit(f"GET /api/products: код {status}, нужна база с товарами")
+        self.product_ids = [item["product_id"] for item in page["items"]]
+        self.terms = sorted({word[:5].lower() for item in page["items"] for word in item["name"].split()})
+
+    async def call(self, client, method, path, body=None, headers=None):
+        status, response_headers, data = await client.request(method, path, body, headers)
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        return status, response_headers, data
+
+    async def list_pages(self, client, etags):
+        path = "/api/products?limit=50"
+        for _ in range(self.pages):
+            status, _, page = await self.call(client, "GET", path)
+            if status != 200 or not page["next_cursor"]:
+                break
+            path = f"/api/products?limit=50&cursor={page['next_cursor']}"
+
+    async def search(self, client, etags):
+        await self.call(client, "GET", f"/api/products?q={quote(self.rng.choice(self.terms))}&limit=20")
+
+    async def filter_orders(self, client, etags):
+        status = self.rng.choice(["pending", "processing", "shipped"])
+        await self.call(client, "GET", f"/api/orders?status={status}&sort=-order_date&limit=50")
+
+    async def get(self, client, etags):
+        product_id = self.rng.choice(self.product_ids)
+        status, headers, _ = await self.call(client, "GET", f"/api/products/{product_id}")
+        if status == 200:
+            etags[product_id] = headers["etag"]
+
+    async def revalidate(self, client, etags):
+        if not etags:
+            return await self.get(client, etags)
+        product_id = self.rng.choice(list(etags))
+        status, headers, _ = await self.call(client, "GET", f"/api/products/{product_id}",
+                                             headers={"If-None-Match": etags[product_id]})
+        if status == 200:
+            etags[product_id] = headers["etag"]
+
+    async def update(self, client, etags):
+        product_id = self.rng.choice(self.product_ids)
+        status, headers, row = await self.call(client, "GET", f"/api/products/{product_id}")
+        if status == 200:
+            status, headers, _ = await self.call(client, "PATCH", f"/api/products/{product_id}",
+                                                 {"stock_quantity": row["stock_quantity"]},
+                                                 {"If-Match": headers["etag"]})
+            if status == 200:
+                etags[product_id] = headers["etag"]
+
+    async def run_client(self, deadline):
+        client = Client(self.host, self.port)
+        names = list(OPERATIONS)
+        weights = list(OPERATIONS.values())
+        etags = {}
+        try:
+            while time.perf_counter() < deadline:
+                name = self.rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                await getattr(self, name)(client, etags)
+                self.timings[name].append((time.perf_counter() - start) * 1000)
+        finally:
+            await client.close()
+
+    async def run(self, clients, duration):
+        await self.prepare()
+        start = time.perf_counter()
+        await asyncio.gather(*(self.run_client(start + duration) for _ in range(clients)))
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        operations = {}
+        for name, timings in self.timings.items():
+            if timings:
+                timings.sort()
+                operations[name] = {
+                    "count": len(timings),
+                    "p50_ms": round(percentile(timings, 50), 2),
+                    "p95_ms": round(percentile(timings, 95), 2),
+                    "p99_ms": round(percentile(timings, 99), 2),
+                    "max_ms": round(timings[-1], 2),
+                }
+        return {
+            "seconds": round(elapsed, 2),
+            "requests": self.requests,
+            "requests_per_second": round(self.requests / elapsed, 1),
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "operations": operations,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP API магазина")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="адрес сервера manage.py serve")
+    parser.add_argument("--clients", type=int, default=20, help="одновременных соединений")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность в секундах")
+    parser.add_argument("--pages", type=int, default=5, help="страниц за одно листание")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="файл отчёта JSON (по умолчанию - stdout)")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    test = LoadTest(url.hostname, url.port or 80, args.seed, args.pages)
+    elapsed = asyncio.run(test.run(args.clients, args.duration))
+
+    text = json.dumps(test.report(elapsed), ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
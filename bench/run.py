@@ -0,0 +1,162 @@
+"""Замер операций приложения на базе из bench.generate и запись отчёта JSON.
+
+    python -m bench.run bench.db --out report.json [--baseline old.json]
+
+Замеряются те же пути, что у экранов: первая страница таблицы
+(display_table) и прокрутка, поиск по таблице и по пользователям, загрузка
+формы редактирования, добавление, изменение и удаление записи с commit.
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import time
+
+import db
+import schema
+import search_index
+from paging import PAGE_SIZE, PREFETCH_ROWS
+from repository import Store
+
+
+def measure(operation, repeat):
+    """Время выполнения operation(i) в миллисекундах"""
+    timings = []
+    for i in range(repeat):
+        t = time.perf_counter()
+        operation(i)
+        timings.append((time.perf_counter() - t) * 1000)
+    timings.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def search_terms(conn, rng, count):
+    """Слова из названий товаров - чтобы поиск что-то находил"""
+    names = [row[0] for row in conn.execute("SELECT name FROM products ORDER BY random() LIMIT ?", (count,))]
+    return [rng.choice(name.split())[:5].lower() for name in names] or ["товар"]
+
+
+def run(conn, repeat=20, seed=1, use_fts=True):
+    rng = random.Random(seed)
+    store = Store(conn)
+    results = {}
+    first_page = PAGE_SIZE + PREFETCH_ROWS
+
+    for table_name in ("orders", "order_items", "products", "users"):
+        results[f"display_table:{table_name}"] = measure(
+            lambda i: store[table_name].pager(PAGE_SIZE).fetch_first(conn, first_page), repeat)
+
+        def scroll(i):
+            pager = store[table_name].pager(PAGE_SIZE)
+            pager.fetch_first(conn, first_page)
+            for _ in range(10):
+                pager.fetch_next(conn)
+        results[f"scroll_10_pages:{table_name}"] = measure(scroll, repeat)
+
+    terms = search_terms(conn, rng, repeat)
+    for table_name in ("products", "product_reviews", "categories"):
+        for mode, fts in (("fts", True), ("like", False)):
+            if fts and not (use_fts and search_index.fts_table_exists(conn, table_name)):
+                continue
+            results[f"search_table:{table_name}:{mode}"] = measure(
+                lambda i: store[table_name].search_pager(terms[i % len(terms)], fts, PAGE_SIZE)
+                .fetch_first(conn, first_page), repeat)
+
+    user_count = conn.execute("SELECT MAX(user_id) FROM users").fetchone()[0] or 1
+    for mode, fts in (("fts", use_fts and search_index.fts_table_exists(conn, "users")), ("like", False)):
+        results[f"search_users:{mode}"] = measure(
+            lambda i: store.users.search_pager(f"user{rng.randint(1, user_count)}", fts, PAGE_SIZE)
+            .fetch_first(conn, first_page), repeat)
+
+    product_count = conn.execute("SELECT MAX(product_id) FROM products").fetchone()[0] or 1
+    results["edit_form_load:products"] = measure(
+        lambda i: (store.products.get(rng.randint(1, product_count)), store.categories.choices()), repeat)
+
+    category_id = conn.execute("SELECT MIN(category_id) FROM categories").fetchone()[0]
+    inserted = []
+
+    def insert(i):
+        inserted.append(store.products.insert({"category_id": category_id, "name": f"bench {i}",
+                                               "description": "замер", "price": 1.0, "stock_quantity": 1}))
+        conn.commit()
+
+    def update(i):
+        store.products.update(inserted[i], {"name": f"bench updated {i}", "price": 2.0})
+        conn.commit()
+
+    def delete(i):
+        store.products.delete(inserted[i])
+        conn.commit()
+
+    results["insert:products"] = measure(insert, repeat)
+    results["update:products"] = measure(update, repeat)
+    results["delete:products"] = measure(delete, repeat)
+    return results
+
+
+def table_sizes(conn):
+    return {table_name: conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            for table_name in schema.TABLE_COLUMNS}
+
+
+def compare(baseline, report):
+    """Сравнение медиан с прежним отчётом: строки 'операция: было -> стало (xN)'"""
+    lines = []
+    for name, result in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            lines.append(f"{name}: {result['median_ms']} мс (новая)")
+        else:
+            ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+            lines.append(f"{name}: {old['median_ms']} -> {result['median_ms']} мс (x{ratio:.2f})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер операций интернет-магазина")
+    parser.add_argument("path", help="база, созданная bench.generate")
+    parser.add_argument("--out", help="файл отчёта JSON (по умолчанию - stdout)")
+    parser.add_argument("--baseline", help="прежний отчёт для сравнения")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-fts", action="store_true", help="не использовать FTS5")
+    parser.add_argument("--profile", choices=sorted(db.PROFILES), default=db.DEFAULT_PROFILE)
+    args = parser.parse_args()
+
+    conn = db.connect(args.path, args.profile)
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "profile": args.profile,
+            "settings": db.applied_settings(conn),
+            "repeat": args.repeat,
+            "table_sizes": table_sizes(conn),
+        },
+        "results": run(conn, args.repeat, args.seed, not args.no_fts),
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Дерево категорий на таблице замыкания category_closure.
+
+Таблица создаётся миграцией 5 и поддерживается триггерами categories:
+добавление, перенос поддерева (смена parent_category_id) и удаление.
+Триггеры отклоняют циклы (sqlite3.IntegrityError), поэтому поддерево и
+предки категории читаются одним индексным запросом без рекурсии.
+"""
+import db
+
+# Условие "столбец - категория из поддерева": поиск по индексам closure и idx_products_category
+SUBTREE_CONDITION = "{column} IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = ?)"
+
+
+def subtree_ids(conn, category_id):
+    """Категория и все её потомки"""
+    return [row[0] for row in conn.execute(
+        "SELECT descendant_id FROM category_closure WHERE ancestor_id = ? ORDER BY depth, descendant_id",
+        (category_id,))]
+
+
+def ancestors(conn, category_id):
+    """Путь от корня до категории: [(category_id, name)]"""
+    return conn.execute("SELECT c.category_id, c.name FROM category_closure cc "
+                        "JOIN categories c ON c.category_id = cc.ancestor_id "
+                        "WHERE cc.descendant_id = ? ORDER BY cc.depth DESC", (category_id,)).fetchall()
+
+
+def children(conn, category_id=None):
+    """Непосредственные потомки категории (для None - корневые категории)"""
+    if category_id is None:
+        return conn.execute("SELECT category_id, name FROM categories WHERE parent_category_id IS NULL "
+                            "ORDER BY category_id").fetchall()
+    return conn.execute("SELECT category_id, name FROM categories WHERE parent_category_id = ? "
+                        "ORDER BY category_id", (category_id,)).fetchall()
+
+
+def subtree_products(conn, category_id, limit=None):
+    """Товары категории и всех её потомков"""
+    query = f"SELECT * FROM products WHERE {SUBTREE_CONDITION.format(column='category_id')} ORDER BY product_id"
+    if limit is not None:
+        return conn.execute(query + " LIMIT ?", (category_id, limit)).fetchall()
+    return conn.execute(query, (category_id,)).fetchall()
+
+
+def rebuild(conn):
+    """Пересчёт таблицы замыкания по parent_category_id; возвращает число пар"""
+    db.require_no_transaction(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM category_closure")
+        count = conn.execute("""
+            INSERT OR IGNORE INTO category_closure (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+                SELECT category_id, category_id, 0 FROM categories
+                UNION ALL
+                SELECT tree.ancestor_id, c.category_id, tree.depth + 1
+                FROM tree JOIN categories c ON c.parent_category_id = tree.descendant_id
+                WHERE tree.depth < 64
+            )
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM tree GROUP BY ancestor_id, descendant_id
+        """).rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return count
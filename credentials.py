@@ -0,0 +1,192 @@
+"""Хеширование и проверка паролей пользователей.
+
+Хеш хранится в самоописывающем формате "алгоритм$параметры$соль$хеш":
+
+    pbkdf2_sha256$600000$<соль base64>$<хеш base64>
+    scrypt$16384$8$1$<соль base64>$<хеш base64>
+
+Старые значения без соли (hex SHA-256 из прежней версии приложения и hex
+MD5 из data_to_db.txt) по-прежнему проверяются, а при успешном входе
+authenticate() заменяет их хешем с текущими параметрами.
+"""
+import base64
+import configparser
+import hashlib
+import hmac
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+CONFIG_PATH = "store.ini"
+
+SALT_BYTES = 16
+
+# Параметры по умолчанию; рабочий фактор под конкретный сервер подбирает benchmark()
+settings = {
+    "algorithm": "pbkdf2_sha256",
+    "iterations": 600000,
+    "scrypt_n": 2 ** 14,
+    "scrypt_r": 8,
+    "scrypt_p": 1,
+}
+
+ALGORITHMS = ("pbkdf2_sha256", "scrypt")
+
+LEGACY_FORMATS = {
+    64: hashlib.sha256,
+    32: hashlib.md5,
+}
+
+
+def load_config(config_path=CONFIG_PATH):
+    """Чтение секции [credentials] из ini-файла: algorithm, iterations, scrypt_n, scrypt_r, scrypt_p"""
+    parser = configparser.ConfigParser()
+    if not parser.read(config_path, encoding="utf-8") or not parser.has_section("credentials"):
+        return {}
+    section = parser["credentials"]
+    config = {name: section.getint(name) for name in ("iterations", "scrypt_n", "scrypt_r", "scrypt_p")
+              if name in section}
+    if "algorithm" in section:
+        config["algorithm"] = section["algorithm"]
+    return config
+
+
+def configure(**values):
+    """Изменение алгоритма и рабочего фактора для новых хешей"""
+    algorithm = values.get("algorithm")
+    if algorithm is not None and algorithm not in ALGORITHMS:
+        raise ValueError(f"Неизвестный алгоритм '{algorithm}', доступны: {', '.join(ALGORITHMS)}")
+    for name, value in values.items():
+        if name not in settings:
+            raise ValueError(f"Настройка '{name}' не поддерживается")
+        if value is not None:
+            settings[name] = value
+
+
+def b64(data):
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password, salt=None, **params):
+    """Хеш пароля в самоописывающем формате с текущими (или явно заданными) параметрами"""
+    params = dict(settings, **params)
+    salt = salt or os.urandom(SALT_BYTES)
+    if params["algorithm"] == "scrypt":
+        n, r, p = params["scrypt_n"], params["scrypt_r"], params["scrypt_p"]
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n + 2 ** 20)
+        return f"scrypt${n}${r}${p}${b64(salt)}${b64(digest)}"
+
+    iterations = params["iterations"]
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${b64(salt)}${b64(digest)}"
+
+
+def is_legacy(stored):
+    """Хеш без соли из прежних версий (hex SHA-256 или MD5)"""
+    return bool(stored) and len(stored) in LEGACY_FORMATS and re.fullmatch(r"[0-9a-fA-F]+", stored) is not None
+
+
+def verify_password(password, stored):
+    """Проверка пароля по сохранённому значению любого поддерживаемого формата"""
+    if not stored:
+        return False
+    if is_legacy(stored):
+        digest = LEGACY_FORMATS[len(stored)](password.encode()).hexdigest()
+        return hmac.compare_digest(digest, stored.lower())
+
+    parts = stored.split("$")
+    try:
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            salt = unb64(parts[2])
+            expected = hash_password(password, salt, algorithm="pbkdf2_sha256", iterations=int(parts[1]))
+        elif parts[0] == "scrypt" and len(parts) == 6:
+            salt = unb64(parts[4])
+            expected = hash_password(password, salt, algorithm="scrypt", scrypt_n=int(parts[1]),
+                                     scrypt_r=int(parts[2]), scrypt_p=int(parts[3]))
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(expected, stored)
+
+
+def needs_upgrade(stored):
+    """Хеш старого формата или с параметрами слабее текущих"""
+    if is_legacy(stored):
+        return True
+    parts = stored.split("$")
+    if parts[0] != settings["algorithm"]:
+        return True
+    if parts[0] == "pbkdf2_sha256":
+        return int(parts[1]) < settings["iterations"]
+    return [int(value) for value in parts[1:4]] < [settings["scrypt_n"], settings["scrypt_r"], settings["scrypt_p"]]
+
+
+def authenticate(conn, username, password):
+    """Проверка пароля пользователя; при успехе устаревший хеш заменяется новым.
+
+    Возвращает user_id или None.
+    """
+    row = conn.execute("SELECT user_id, password_hash FROM users WHERE username = ? AND is_active",
+                       (username,)).fetchone()
+    if row is None or not verify_password(password, row[1]):
+        return None
+    if needs_upgrade(row[1]):
+        conn.execute("UPDATE users SET password_hash = ? WHERE user_id = ? AND password_hash = ?",
+                     (hash_password(password), row[0], row[1]))
+        conn.commit()
+    return row[0]
+
+
+def _hash_with(args):
+    password, params = args
+    return hash_password(password, **params)
+
+
+def process_pool(workers=None):
+    """Пул процессов для массового хеширования (хеш занимает сотни миллисекунд CPU)"""
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def hash_many(passwords, pool=None):
+    """Хеши для списка паролей; с пулом процессов - параллельно на всех ядрах.
+
+    Параметры передаются в процессы явно, поэтому настройки из store.ini
+    действуют и в дочерних процессах.
+    """
+    params = dict(settings)
+    jobs = [(password, params) for password in passwords]
+    if pool is None or len(jobs) < 2:
+        return [_hash_with(job) for job in jobs]
+    return list(pool.map(_hash_with, jobs, chunksize=max(1, len(jobs) // (4 * (os.cpu_count() or 1)))))
+
+
+def benchmark(target_ms=250.0, algorithm="pbkdf2_sha256"):
+    """Подбор рабочего фактора, при котором один хеш занимает около target_ms.
+
+    Возвращает (параметры для configure/store.ini, фактическое время хеша в мс).
+    """
+    if algorithm == "scrypt":
+        n = 2 ** 12
+        while True:
+            start = time.perf_counter()
+            hash_password("benchmark", algorithm="scrypt", scrypt_n=n)
+            elapsed = (time.perf_counter() - start) * 1000
+            if elapsed * 2 > target_ms or n >= 2 ** 20:
+                return {"algorithm": "scrypt", "scrypt_n": n}, elapsed
+            n *= 2
+
+    probe = 50000
+    start = time.perf_counter()
+    hash_password("benchmark", algorithm="pbkdf2_sha256", iterations=probe)
+    per_iteration = (time.perf_counter() - start) / probe
+    iterations = max(100000, int(target_ms / 1000 / per_iteration) // 10000 * 10000)
+
+    start = time.perf_counter()
+    hash_password("benchmark", algorithm="pbkdf2_sha256", iterations=iterations)
+    return {"algorithm": "pbkdf2_sha256", "iterations": iterations}, (time.perf_counter() - start) * 1000
@@ -0,0 +1,118 @@
+"""Открытие соединений с базой магазина и профили настроек SQLite"""
+import configparser
+import sqlite3
+
+import query_profiler
+
+DB_PATH = 'online_store.db'
+CONFIG_PATH = 'store.ini'
+
+# Профили производительности: PRAGMA, выполняемые при открытии соединения.
+# Порядок важен: journal_mode задаётся до любых транзакций.
+PROFILES = {
+    # Настройки SQLite по умолчанию (журнал отката, полный fsync)
+    "default": {
+        "journal_mode": "DELETE",
+        "busy_timeout": 5000,
+    },
+    # WAL с полным fsync на каждом commit: читатели не блокируют писателя
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    # WAL, fsync только на контрольных точках, большой кэш и mmap
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+DEFAULT_PROFILE = "fast"
+
+# PRAGMA, которые можно переопределить в конфигурации
+TUNABLE_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+
+# Текущие настройки, общие для всех соединений приложения
+settings = {
+    "path": DB_PATH,
+    "profile": DEFAULT_PROFILE,
+    "pragmas": {},
+}
+
+
+def load_config(config_path=CONFIG_PATH):
+    """Чтение секции [database] из ini-файла (если файл есть).
+
+    Ключи path и profile выбирают файл базы и профиль, остальные ключи
+    переопределяют отдельные PRAGMA профиля, например cache_size = -131072.
+    """
+    parser = configparser.ConfigParser()
+    if not parser.read(config_path, encoding="utf-8") or not parser.has_section("database"):
+        return {}
+
+    section = dict(parser["database"])
+    config = {"path": section.pop("path", None), "profile": section.pop("profile", None)}
+    config["pragmas"] = {name: int(value) if value.lstrip("-").isdigit() else value
+                         for name, value in section.items()}
+    return config
+
+
+def configure(path=None, profile=None, pragmas=None):
+    """Выбор базы и профиля для всех последующих вызовов connect()"""
+    if profile is not None and profile not in PROFILES:
+        raise ValueError(f"Неизвестный профиль '{profile}', доступны: {', '.join(PROFILES)}")
+    for name in pragmas or {}:
+        if name not in TUNABLE_PRAGMAS:
+            raise ValueError(f"Настройка '{name}' не поддерживается")
+    if path:
+        settings["path"] = path
+    if profile:
+        settings["profile"] = profile
+    if pragmas:
+        settings["pragmas"].update(pragmas)
+
+
+def profile_pragmas(profile=None):
+    """PRAGMA выбранного профиля с учётом переопределений из конфигурации"""
+    pragmas = dict(PROFILES[profile or settings["profile"]])
+    pragmas.update(settings["pragmas"])
+    return pragmas
+
+
+def connect(path=None, profile=None, **kwargs):
+    """Соединение с включённой проверкой внешних ключей и настройками профиля.
+
+    В SQLite PRAGMA foreign_keys действует только на своё соединение, поэтому
+    все соединения приложения должны открываться через эту функцию, иначе
+    каскадные удаления (ON DELETE CASCADE / SET NULL) не выполняются.
+    """
+    kwargs.setdefault("cached_statements", 256)
+    if query_profiler.settings["enabled"]:
+        kwargs.setdefault("factory", query_profiler.ProfiledConnection)
+    conn = sqlite3.connect(path or settings["path"], **kwargs)
+    for name, value in profile_pragmas(profile).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def require_no_transaction(conn):
+    """Проверка перед функцией, которая сама открывает и фиксирует транзакции.
+
+    Незавершённую транзакцию вызывающего такая функция не фиксирует молча,
+    а отказывается работать: вызывающий должен сам зафиксировать или
+    откатить свои изменения.
+    """
+    if conn.in_transaction:
+        raise sqlite3.ProgrammingError("У соединения есть незавершённая транзакция - "
+                                       "зафиксируйте или откатите её перед вызовом")
+
+
+def applied_settings(conn):
+    """Фактические значения настроек соединения (для проверки в эксплуатации)"""
+    names = TUNABLE_PRAGMAS + ("foreign_keys",)
+    return {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in names}
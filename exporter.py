@@ -0,0 +1,168 @@
+"""Потоковый экспорт таблиц и результатов поиска в CSV, JSON Lines и колоночный файл"""
+import array
+import copy
+import csv
+import json
+import os
+import struct
+
+import schema
+
+CHUNK_SIZE = 5000
+
+# Колоночный формат (.scol):
+#   MAGIC, u32 длина заголовка, заголовок JSON {"columns": [...]},
+#   далее группы строк: u32 число строк (0 - конец файла) и для каждого столбца
+#   u8 тип, u32 длина данных, битовая маска NULL (по биту на строку), данные.
+# Числа хранятся массивами int64/float64, текст - длинами (u32) и байтами UTF-8.
+MAGIC = b"SCOL\x01"
+TYPE_INT, TYPE_FLOAT, TYPE_TEXT = 1, 2, 3
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".scol": "columnar"}
+
+
+def detect_format(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def iter_chunks(cursor, chunk_size=CHUNK_SIZE):
+    """Строки курсора порциями fetchmany (весь результат в память не читается)"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def write_csv(f, columns, chunks):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def write_jsonl(f, columns, chunks):
+    count = 0
+    for rows in chunks:
+        f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+        count += len(rows)
+    return count
+
+
+def encode_column(values):
+    """Тип и байты одного столбца группы строк"""
+    nulls = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is None:
+            nulls[i // 8] |= 1 << (i % 8)
+    present = [value for value in values if value is not None]
+
+    if all(type(value) is int for value in present):
+        return TYPE_INT, bytes(nulls) + array.array("q", present).tobytes()
+    if all(type(value) in (int, float) for value in present):
+        return TYPE_FLOAT, bytes(nulls) + array.array("d", present).tobytes()
+
+    encoded = [str(value).encode("utf-8") for value in present]
+    lengths = array.array("I", [len(data) for data in encoded])
+    return TYPE_TEXT, bytes(nulls) + lengths.tobytes() + b"".join(encoded)
+
+
+def write_columnar(f, columns, chunks):
+    header = json.dumps({"columns": list(columns)}).encode("utf-8")
+    f.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    count = 0
+    for rows in chunks:
+        f.write(struct.pack("<I", len(rows)))
+        for values in zip(*rows):
+            column_type, data = encode_column(values)
+            f.write(struct.pack("<BI", column_type, len(data)))
+            f.write(data)
+        count += len(rows)
+    f.write(struct.pack("<I", 0))
+    return count
+
+
+def read_columnar(path):
+    """Чтение колоночного файла: (столбцы, генератор строк)"""
+    f = open(path, "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path} не является колоночным файлом экспорта")
+    header_size, = struct.unpack("<I", f.read(4))
+    columns = json.loads(f.read(header_size))["columns"]
+
+    def rows():
+        with f:
+            while True:
+                count, = struct.unpack("<I", f.read(4))
+                if count == 0:
+                    break
+                yield from zip(*[decode_column(f, count) for _ in columns])
+
+    return columns, rows()
+
+
+def decode_column(f, count):
+    column_type, size = struct.unpack("<BI", f.read(5))
+    data = f.read(size)
+    mask_size = (count + 7) // 8
+    nulls, data = data[:mask_size], data[mask_size:]
+    is_null = [bool(nulls[i // 8] & (1 << (i % 8))) for i in range(count)]
+    present = count - sum(is_null)
+
+    if column_type == TYPE_INT:
+        values = iter(array.array("q", data))
+    elif column_type == TYPE_FLOAT:
+        values = iter(array.array("d", data))
+    else:
+        lengths = array.array("I", data[:present * 4])
+        offset = present * 4
+        texts = []
+        for length in lengths:
+            texts.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        values = iter(texts)
+    return [None if null else next(values) for null in is_null]
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "columnar": write_columnar}
+
+
+def export_query(conn, query, params, path, file_format=None, chunk_size=CHUNK_SIZE):
+    """Выполнение запроса и запись результата в файл; возвращает число строк"""
+    file_format = file_format or detect_format(path)
+    cursor = conn.execute(query, params)
+    columns = [col[0] for col in cursor.description]
+
+    if file_format == "columnar":
+        f = open(path, "wb")
+    else:
+        f = open(path, "w", encoding="utf-8", newline="")
+    with f:
+        return WRITERS[file_format](f, columns, iter_chunks(cursor, chunk_size))
+
+
+def export_columns(pager):
+    """Столбцы выгрузки источника: все, кроме schema.SECRET_COLUMNS (хешей паролей)"""
+    table = pager.table_name
+    secret = schema.SECRET_COLUMNS.get(table)
+    if not secret:
+        return pager.columns
+    listed = ", ".join(f"{table}.{col}" for col in schema.TABLE_COLUMNS[table] if col not in secret)
+    if pager.columns == "*":
+        return listed
+    return pager.columns.replace(f"{table}.*", listed)
+
+
+def export_pager(conn, pager, path, file_format=None, chunk_size=CHUNK_SIZE):
+    """Экспорт всех строк источника данных таблицы (таблица целиком или результат поиска)"""
+    if pager.prepare:
+        pager.prepare(conn)
+    pager = copy.copy(pager)
+    pager.columns = export_columns(pager)
+    query, params = pager.full_query()
+    return export_query(conn, query, params, path, file_format, chunk_size)
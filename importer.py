@@ -0,0 +1,156 @@
+"""Потоковый импорт строк из CSV / JSON Lines пакетами executemany"""
+import csv
+import itertools
+import json
+import os
+import sqlite3
+
+import credentials
+import db
+import schema
+from repository import Store
+
+BATCH_SIZE = 5000
+
+
+class RowError(ValueError):
+    """Строка файла, которую не удалось разобрать"""
+
+
+class ImportResult:
+    """Итог импорта: число добавленных и отклонённых строк"""
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+
+    def __str__(self):
+        return f"добавлено {self.imported}, отклонено {self.rejected}"
+
+
+def detect_format(path):
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".json", ".ndjson") else "csv"
+
+
+def read_rows(path, file_format=None):
+    """Генератор строк файла в виде словарей (файл целиком не читается)"""
+    file_format = file_format or detect_format(path)
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if file_format == "csv":
+            for row in csv.DictReader(f):
+                # Пустая ячейка CSV - это NULL, а не пустая строка
+                yield {key: (value if value != "" else None) for key, value in row.items()}
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield RowError(f"некорректный JSON: {e}")
+                    continue
+                yield row if isinstance(row, dict) else RowError("строка JSON не является объектом")
+
+
+def prepare_row(table_name, columns, row, hash_passwords=False):
+    """Значения строки в порядке columns; ValueError, если строка не проходит проверку"""
+    values = []
+    for col in columns:
+        value = row.get(col)
+        error = schema.check_required(table_name, col, value)
+        if error:
+            raise ValueError(error)
+        # Пароль хешируется до записи пакета - значение не строки отклонило бы весь импорт
+        if hash_passwords and col == "password_hash" and value is not None and not isinstance(value, str):
+            raise ValueError("Пароль в password_hash должен быть строкой")
+        values.append(value)
+    return values
+
+
+def import_rows(conn, table_name, rows, batch_size=BATCH_SIZE, progress=None, on_reject=None,
+                hash_passwords=False, pool=None):
+    """Запись строк в таблицу пакетами, каждый пакет - одна транзакция.
+
+    Столбцы берутся из первой строки. Строки, не прошедшие проверку
+    обязательных полей, и строки, нарушившие ограничения базы, отклоняются
+    через on_reject(номер строки, строка, причина), остальные записываются.
+    progress(result) вызывается после каждого пакета.
+
+    При hash_passwords столбец password_hash содержит пароли в открытом виде:
+    они хешируются пакетами через credentials.hash_many (в пуле процессов pool).
+    """
+    db.require_no_transaction(conn)
+    result = ImportResult()
+
+    def reject(line_no, row, reason):
+        result.rejected += 1
+        if on_reject:
+            on_reject(line_no, row, reason)
+
+    rows = enumerate(rows, start=1)
+    line_no, first = next(rows, (0, None))
+    while isinstance(first, RowError):
+        reject(line_no, None, str(first))
+        line_no, first = next(rows, (0, None))
+    if first is None:
+        return result
+
+    allowed = schema.TABLE_COLUMNS[table_name]
+    unknown = [col for col in first if col not in allowed]
+    if unknown:
+        raise ValueError(f"Неизвестные столбцы для {table_name}: {', '.join(unknown)}")
+    columns = list(first)
+    query = Store(conn)[table_name].sql("insert", columns)
+    password_index = columns.index("password_hash") if hash_passwords and "password_hash" in columns else None
+
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        if password_index is not None:
+            hashes = credentials.hash_many([values[password_index] for _, _, values in batch], pool)
+            for (_, _, values), password_hash in zip(batch, hashes):
+                values[password_index] = password_hash
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(query, [values for _, _, values in batch])
+            conn.commit()
+            result.imported += len(batch)
+        except sqlite3.Error:
+            # Пакет отклонён целиком - повторяем по одной строке, чтобы найти виноватые
+            conn.rollback()
+            conn.execute("BEGIN")
+            for line_no, row, values in batch:
+                try:
+                    conn.execute(query, values)
+                    result.imported += 1
+                except sqlite3.Error as e:
+                    reject(line_no, row, str(e))
+            conn.commit()
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for line_no, row in itertools.chain([(line_no, first)], rows):
+        if isinstance(row, RowError):
+            reject(line_no, None, str(row))
+            continue
+        try:
+            batch.append((line_no, row, prepare_row(table_name, columns, row, password_index is not None)))
+        except ValueError as e:
+            reject(line_no, row, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return result
+
+
+def import_file(conn, table_name, path, file_format=None, batch_size=BATCH_SIZE, progress=None, on_reject=None,
+                hash_passwords=False, pool=None):
+    """Импорт файла CSV или JSON Lines в таблицу"""
+    if table_name not in schema.TABLE_COLUMNS:
+        raise ValueError(f"Неизвестная таблица {table_name}")
+    return import_rows(conn, table_name, read_rows(path, file_format), batch_size, progress, on_reject,
+                       hash_passwords, pool)
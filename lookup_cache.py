@@ -0,0 +1,104 @@
+"""Кэш названий справочных записей (категории, теги, пользователи, товары)"""
+import threading
+from collections import OrderedDict
+
+import schema
+
+# Маленькие справочники загружаются целиком, большие - по мере надобности в LRU
+SMALL_TABLES = ("categories", "tags")
+LRU_SIZE = 10000
+IN_CHUNK = 500
+
+
+class LookupCache:
+    """Названия записей по первичному ключу.
+
+    Кэш наполняется только в фоновом потоке (resolve, choices), а поток Tk
+    лишь читает уже загруженные названия через name(), не обращаясь к базе.
+    Записи, изменённые через приложение, сбрасываются вызовом invalidate(),
+    а после записи другим процессом (например, api_server) - вызовом clear().
+    """
+
+    def __init__(self, lru_size=LRU_SIZE):
+        self.lru_size = lru_size
+        self.lock = threading.Lock()
+        self.tables = {table_name: OrderedDict() for table_name in schema.NAME_COLUMNS}
+        self.complete = set()
+
+    def load_table(self, conn, table_name):
+        """Загрузка маленького справочника целиком"""
+        id_column = schema.key_columns(table_name)[0]
+        rows = conn.execute(f"SELECT {id_column}, {schema.NAME_COLUMNS[table_name]} FROM {table_name} "
+                            f"ORDER BY {id_column}").fetchall()
+        with self.lock:
+            self.tables[table_name] = OrderedDict(rows)
+            self.complete.add(table_name)
+
+    def choices(self, conn, table_name):
+        """Пары (id, название) для выпадающих списков; запрос - только при первом вызове"""
+        with self.lock:
+            loaded = table_name in self.complete
+        if not loaded:
+            self.load_table(conn, table_name)
+        with self.lock:
+            return list(self.tables[table_name].items())
+
+    def resolve(self, conn, table_name, ids):
+        """Догрузка в кэш названий для ids (одним запросом IN на порцию)"""
+        if table_name in SMALL_TABLES:
+            self.choices(conn, table_name)
+            return
+
+        with self.lock:
+            cache = self.tables[table_name]
+            missing = list({i for i in ids if i is not None and i not in cache})
+        if not missing:
+            return
+
+        id_column = schema.key_columns(table_name)[0]
+        name_column = schema.NAME_COLUMNS[table_name]
+        found = []
+        for start in range(0, len(missing), IN_CHUNK):
+            chunk = missing[start:start + IN_CHUNK]
+            found += conn.execute(f"SELECT {id_column}, {name_column} FROM {table_name} "
+                                  f"WHERE {id_column} IN ({', '.join(['?'] * len(chunk))})", chunk).fetchall()
+
+        with self.lock:
+            for key, name in found:
+                cache[key] = name
+            while len(cache) > self.lru_size:
+                cache.popitem(last=False)
+
+    def resolve_rows(self, conn, table_name, rows):
+        """Догрузка названий для всех внешних ключей строк таблицы table_name"""
+        columns = schema.TABLE_COLUMNS[table_name]
+        for col, ref_table in schema.FOREIGN_KEYS.get(table_name, {}).items():
+            index = columns.index(col)
+            self.resolve(conn, ref_table, [row[index] for row in rows])
+        return rows
+
+    def name(self, table_name, key):
+        """Название из кэша или None (без обращения к базе)"""
+        with self.lock:
+            cache = self.tables[table_name]
+            name = cache.get(key)
+            if name is not None and table_name not in SMALL_TABLES:
+                cache.move_to_end(key)
+            return name
+
+    def clear(self):
+        """Сброс всех справочников (база изменена другим соединением)"""
+        with self.lock:
+            self.tables = {table_name: OrderedDict() for table_name in schema.NAME_COLUMNS}
+            self.complete.clear()
+
+    def invalidate(self, table_name, key=None):
+        """Сброс кэша после изменения справочника"""
+        if table_name not in self.tables:
+            return
+        with self.lock:
+            if table_name in SMALL_TABLES or key is None:
+                self.tables[table_name] = OrderedDict()
+                self.complete.discard(table_name)
+            else:
+                self.tables[table_name].pop(key, None)
@@ -1,8 +1,67 @@
+import argparse
+import bisect
+import queue
 import sqlite3
+import time
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
 import datetime
-import hashlib
+
+import analytics
+import archive
+import backup
+import credentials
+import db
+import exporter
+import importer
+import order_service
+import query_profiler
+import schema
+from lookup_cache import LookupCache
+from paging import PAGE_SIZE, PREFETCH_ROWS
+from query_worker import QueryWorker
+from repository import Store
+from tag_index import TagIndex, product_ids
+
+# Максимум строк, одновременно находящихся в Treeview
+MAX_LOADED_ROWS = 500
+
+# Полнотекстовый поиск FTS5 (если выключен или недоступен - поиск через LIKE)
+USE_FTS = True
+
+# Поля форм, значение которых выбирается из списка категорий
+CATEGORY_FIELDS = ("category_id", "parent_category_id")
+
+# Товаров на странице подбора по тегам
+FACET_PAGE_SIZE = 200
+
+# Пауза после нажатия клавиши, после которой запускается поиск (мс)
+SEARCH_DELAY_MS = 300
+
+# Через сколько секунд данные скрытого экрана считаются устаревшими (их могли изменить другие программы)
+STALE_AFTER_S = 60
+
+# Период проверки итогов резервного копирования из потока планировщика (мс)
+BACKUP_POLL_MS = 500
+
+# Состояние экрана таблицы, которое сохраняется при уходе с экрана и восстанавливается при возврате
+SCREEN_STATE = ("tree", "pager", "row_keys", "search_entry", "filter_inputs", "headings", "sort",
+                "include_archive", "scheduled_term", "shown_view")
+
+
+class Screen:
+    """Построенный экран: фрейм с виджетами, сохранённое состояние и обновление данных"""
+
+    def __init__(self, name, frame):
+        self.name = name
+        self.frame = frame
+        self.state = {}
+        # Перечитывание данных экрана; None - экран без данных из базы
+        self.refresh = None
+        self.max_age = STALE_AFTER_S
+        # Версия данных приложения и время последнего обновления экрана
+        self.data_version = None
+        self.refreshed_at = 0.0
 
 
 class OnlineStoreApp:
@@ -12,115 +71,108 @@ class OnlineStoreApp:
         self.root.geometry("1200x800")
 
         # Подключение к базе данных SQLite
-        self.conn = sqlite3.connect('online_store.db')
-        self.cursor = self.conn.cursor()
+        self.conn = db.connect()
+        # Фактические настройки соединения показываются на панели производительности
+        self.connection_settings = db.applied_settings(self.conn)
+
+        # Источник данных для текущей таблицы
+        self.pager = None
+        self.row_keys = {}
+        self.page_loading = False
+
+        # Строка поиска, фильтры и сортировка текущей таблицы
+        self.search_entry = None
+        self.filter_inputs = {}
+        self.headings = []
+        self.sort = None
+
+        # Флажок «Включая архив» экранов заказов (None на остальных экранах)
+        self.include_archive = None
+
+        # Отложенный поиск при вводе и условия показанного результата
+        self.search_job = None
+        self.scheduled_term = ""
+        self.shown_view = None
+
+        # Построенные экраны (скрываются при переходе, а не уничтожаются) и текущий экран
+        self.screens = {}
+        self.current_screen = None
+        # Номер изменения данных через приложение: экраны, показанные до него, обновляются при возврате
+        self.data_version = 0
 
         # Создание таблиц, если они не существуют
         self.create_tables()
 
+        # Все запросы экранов выполняются в фоновом потоке; записи других процессов (API)
+        # сбрасывают кэши названий и индекс тегов
+        self.worker = QueryWorker(self.root, db.connect, on_external_write=self.drop_caches)
+
+        # Импорт и экспорт файлов идут в своём потоке и соединении: долгие задания не задерживают
+        # страницы и поиск экранов, а переход между экранами их не отменяет
+        self.file_worker = QueryWorker(self.root, db.connect)
+
+        # Названия категорий, тегов, пользователей и товаров для форм и таблиц
+        self.lookups = LookupCache()
+
+        # Битовые карты товаров по тегам для подбора по нескольким тегам
+        self.tag_index = TagIndex()
+
+        # Снимки базы по расписанию из store.ini (секция [backup]) и по кнопке на панели производительности.
+        # Итоги приходят из потока планировщика через очередь и показываются в потоке Tk
+        self.backup_events = queue.Queue()
+        self.backups = backup.BackupScheduler(on_result=lambda result: self.backup_events.put((result, None)),
+                                              on_error=lambda e: self.backup_events.put((None, e)))
+        self.backups.start()
+        self.root.after(BACKUP_POLL_MS, self.poll_backups)
+
         # Основные цвета
         self.bg_color = "#F0F0F0"
         self.button_color = "#4CAF50"
         self.button_color_alt = "#45a049"
         self.text_color = "#333333"
 
+        # Строка состояния внизу окна (итоги резервного копирования)
+        self.status_bar = tk.Label(self.root, text="", anchor=tk.W, relief=tk.SUNKEN, bd=1)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Отображение главного меню
         self.show_main_menu()
 
+    def poll_backups(self):
+        """Показ итогов снимков: успех - в строке состояния, ошибка - ещё и сообщением"""
+        while True:
+            try:
+                result, error = self.backup_events.get_nowait()
+            except queue.Empty:
+                break
+            if error is None:
+                self.status_bar.config(text=f"Резервная копия: {result}")
+            else:
+                self.status_bar.config(text=f"Ошибка резервного копирования: {error}")
+                messagebox.showerror("Резервное копирование", f"Не удалось сделать резервную копию: {error}")
+        self.root.after(BACKUP_POLL_MS, self.poll_backups)
+
+    def drop_caches(self):
+        """Сброс кэшей, которые обновляются только записями самого приложения"""
+        self.lookups.clear()
+        self.tag_index.invalidate()
+
     def create_tables(self):
-        """Создание таблиц, если они не существуют"""
-        self.cursor.executescript("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                email TEXT NOT NULL UNIQUE,
-                password_hash TEXT NOT NULL,
-                first_name TEXT,
-                last_name TEXT,
-                phone TEXT,
-                registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE
-            );
-
-            CREATE TABLE IF NOT EXISTS categories (
-                category_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                parent_category_id INTEGER,
-                FOREIGN KEY (parent_category_id) REFERENCES categories(category_id) ON DELETE SET NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS products (
-                product_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                description TEXT,
-                price REAL NOT NULL,
-                stock_quantity INTEGER NOT NULL DEFAULT 0,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE,
-                FOREIGN KEY (category_id) REFERENCES categories(category_id)
-            );
-
-            CREATE TABLE IF NOT EXISTS orders (
-                order_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                order_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'pending',
-                total_amount REAL NOT NULL,
-                shipping_address TEXT NOT NULL,
-                payment_method TEXT,
-                payment_status TEXT DEFAULT 'pending',
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            );
-
-            CREATE TABLE IF NOT EXISTS order_items (
-                order_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                order_id INTEGER NOT NULL,
-                product_id INTEGER NOT NULL,
-                quantity INTEGER NOT NULL,
-                unit_price REAL NOT NULL,
-                FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE,
-                FOREIGN KEY (product_id) REFERENCES products(product_id)
-            );
-
-            CREATE TABLE IF NOT EXISTS tags (
-                tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS product_tags (
-                product_id INTEGER NOT NULL,
-                tag_id INTEGER NOT NULL,
-                PRIMARY KEY (product_id, tag_id),
-                FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE,
-                FOREIGN KEY (tag_id) REFERENCES tags(tag_id) ON DELETE CASCADE
-            );
-
-            CREATE TABLE IF NOT EXISTS product_reviews (
-                review_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 5),
-                review_text TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-            );
-        """)
-        self.conn.commit()
+        """Создание таблиц, если они не существуют, и обновление схемы"""
+        self.fts_enabled = schema.ensure_schema(self.conn, USE_FTS)
 
     def show_main_menu(self):
         """Отображение главного меню с кнопками для таблиц"""
-        self.clear_window()
+        screen = self.open_screen("menu")
+        if screen is None:
+            return
 
-        title_label = tk.Label(self.root, text="Администрирование интернет-магазина",
+        title_label = tk.Label(screen, text="Администрирование интернет-магазина",
                                font=("Arial", 20, "bold"), fg=self.text_color)
         title_label.pack(pady=20)
 
         # Создаем фрейм для кнопок
-        button_frame = tk.Frame(self.root, bg=self.bg_color)
+        button_frame = tk.Frame(screen, bg=self.bg_color)
         button_frame.pack(expand=True)
 
         # Кнопки для каждой таблицы
@@ -132,7 +184,10 @@ class OnlineStoreApp:
             ("Элементы заказов", self.show_order_items),
             ("Теги", self.show_tags),
             ("Теги товаров", self.show_product_tags),
-            ("Отзывы", self.show_reviews)
+            ("Отзывы", self.show_reviews),
+            ("Импорт данных", self.show_import_dialog),
+            ("Аналитика продаж", self.show_analytics),
+            ("Производительность", self.show_performance)
         ]
 
         for i, (text, command) in enumerate(buttons):
@@ -142,31 +197,389 @@ class OnlineStoreApp:
             btn.grid(row=i // 2, column=i % 2, padx=10, pady=10)
 
         # Кнопка выхода
-        exit_btn = tk.Button(self.root, text="Выход", command=self.root.quit,
+        exit_btn = tk.Button(screen, text="Выход", command=self.root.quit,
                              bg="#f44336", fg="white", font=("Arial", 12),
                              width=15, height=1, bd=0)
         exit_btn.pack(pady=20)
 
-    def clear_window(self):
-        """Очистка окна"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
+    def show_analytics(self):
+        """Экран аналитики: продажи по дням, категориям и самые продаваемые товары.
+
+        Данные читаются из дневных сводок, которые перед показом дополняются
+        только новыми заказами, поэтому экран не зависит от объёма истории.
+        """
+        screen = self.open_screen("analytics")
+        if screen is None:
+            return
+
+        tk.Label(screen, text="Аналитика продаж", font=("Arial", 16, "bold"),
+                 fg=self.text_color).pack(pady=10)
+
+        control_frame = tk.Frame(screen, bg=self.bg_color)
+        control_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(control_frame, text="Период, дней:", bg=self.bg_color).pack(side=tk.LEFT, padx=5)
+        period = ttk.Combobox(control_frame, values=analytics.PERIODS, state="readonly", width=6)
+        period.set(30)
+        period.pack(side=tk.LEFT, padx=5)
+        status_label = tk.Label(control_frame, text="", bg=self.bg_color)
+        status_label.pack(side=tk.LEFT, padx=10)
+
+        report_frame = tk.Frame(screen)
+        report_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        sections = [
+            ("По дням", ("День", "Заказов", "Продано, шт", "Выручка")),
+            ("По категориям", ("Категория", "Продано, шт", "Выручка")),
+            ("Лучшие товары", ("Товар", "Продано, шт", "Выручка")),
+        ]
+        trees = []
+        for i, (title, columns) in enumerate(sections):
+            frame = tk.LabelFrame(report_frame, text=title)
+            frame.grid(row=0, column=i, sticky=tk.NSEW, padx=5)
+            report_frame.columnconfigure(i, weight=1)
+            tree = ttk.Treeview(frame, columns=columns, show='headings')
+            for col in columns:
+                tree.heading(col, text=col)
+                tree.column(col, width=110, anchor=tk.CENTER)
+            tree.pack(fill=tk.BOTH, expand=True)
+            trees.append(tree)
+        report_frame.rowconfigure(0, weight=1)
+
+        def load(conn, days):
+            new_orders, new_items = analytics.refresh(conn)
+            categories = analytics.category_sales(conn, days)
+            products = analytics.top_products(conn, days)
+            self.lookups.resolve(conn, "categories", [row[0] for row in categories])
+            self.lookups.resolve(conn, "products", [row[0] for row in products])
+            return new_orders, new_items, analytics.daily_sales(conn, days), categories, products
+
+        def show(result):
+            if not status_label.winfo_exists():
+                return
+            new_orders, new_items, daily, categories, products = result
+            status_label.config(text=f"Учтено новых заказов: {new_orders}, позиций: {new_items}")
+            for tree, rows, table_name in zip(trees, (daily, categories, products), (None, "categories", "products")):
+                tree.delete(*tree.get_children())
+                for row in rows:
+                    if table_name:
+                        row = (f"{row[0]} - {self.lookups.name(table_name, row[0]) or ''}",) + tuple(row[1:])
+                    tree.insert("", tk.END, values=row)
+
+        def refresh():
+            status_label.config(text="Обновление...")
+            days = int(period.get())
+            self.worker.submit(lambda conn: load(conn, days), on_done=show,
+                               on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось построить отчёт: {e}"),
+                               tag="view")
+
+        period.bind("<<ComboboxSelected>>", lambda event: refresh())
+
+        button_frame = tk.Frame(screen, bg=self.bg_color)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        tk.Button(button_frame, text="Обновить", command=refresh,
+                  bg=self.button_color, fg="white").pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Назад", command=self.show_main_menu,
+                  bg="#607d8b", fg="white").pack(side=tk.RIGHT, padx=5)
+
+        self.set_screen_refresh(refresh)
+
+    def show_performance(self):
+        """Панель производительности: p50/p95 по каждому запросу и последние медленные запросы"""
+        screen = self.open_screen("performance")
+        if screen is None:
+            return
+
+        tk.Label(screen, text="Производительность запросов", font=("Arial", 16, "bold"),
+                 fg=self.text_color).pack(pady=10)
+        settings = query_profiler.settings
+        status = (f"Порог медленного запроса: {settings['slow_ms']:g} мс, журнал: {settings['log'] or 'нет'}"
+                  if settings["enabled"] else "Профилирование выключено (store.ini, секция [profiling])")
+        tk.Label(screen, text=status, fg=self.text_color).pack()
+        pragmas = ", ".join(f"{name}={value}" for name, value in self.connection_settings.items())
+        tk.Label(screen, text=f"База данных: {db.settings['path']}, профиль '{db.settings['profile']}': {pragmas}",
+                 fg=self.text_color, wraplength=1100).pack()
+        backup_label = tk.Label(screen, text="", fg=self.text_color, wraplength=1100)
+        backup_label.pack()
+
+        stats_frame = tk.LabelFrame(screen, text="Запросы (по суммарному времени)")
+        stats_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        columns = ("SQL", "Экраны", "Вызовов", "Ошибок", "p50, мс", "p95, мс", "max, мс", "Строк")
+        stats_tree = ttk.Treeview(stats_frame, columns=columns, show='headings')
+        for col in columns:
+            stats_tree.heading(col, text=col)
+            stats_tree.column(col, width=80, anchor=tk.CENTER)
+        stats_tree.column("SQL", width=500, anchor=tk.W)
+        stats_tree.column("Экраны", width=150)
+        stats_tree.pack(fill=tk.BOTH, expand=True)
+
+        slow_frame = tk.LabelFrame(screen, text="Медленные запросы")
+        slow_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        columns = ("Время", "мс", "Строк", "Экран", "Параметры", "SQL")
+        slow_tree = ttk.Treeview(slow_frame, columns=columns, show='headings', height=6)
+        for col in columns:
+            slow_tree.heading(col, text=col)
+            slow_tree.column(col, width=90, anchor=tk.CENTER)
+        slow_tree.column("SQL", width=500, anchor=tk.W)
+        slow_tree.pack(fill=tk.BOTH, expand=True)
+        plan_label = tk.Label(slow_frame, text="", anchor=tk.W, justify=tk.LEFT)
+        plan_label.pack(fill=tk.X)
+
+        slow_records = []
+
+        def show_plan(event):
+            selected = slow_tree.selection()
+            if selected:
+                record = slow_records[int(selected[0])]
+                plan_label.config(text="План: " + "; ".join(record.plan) if record.plan else "План не снимался")
+
+        slow_tree.bind("<<TreeviewSelect>>", show_plan)
+
+        def refresh():
+            backups = self.backups
+            if backups.running:
+                text = "Резервная копия: выполняется"
+            elif backups.last_error is not None:
+                text = f"Резервная копия: ошибка {backups.last_error}"
+            elif backups.last_result is not None:
+                text = f"Последняя резервная копия: {backups.last_result}"
+            else:
+                text = "Резервных копий в этом сеансе не было"
+            if backups.interval:
+                text += f" (по расписанию раз в {backups.interval // 60:g} мин)"
+            backup_label.config(text=text)
+
+            stats_tree.delete(*stats_tree.get_children())
+            for sql, screens, calls, errors, p50, p95, longest, rows in query_profiler.profiler.report():
+                stats_tree.insert("", tk.END, values=(sql, screens, calls, errors, f"{p50:.2f}", f"{p95:.2f}",
+                                                      f"{longest:.2f}", f"{rows:.0f}"))
+            slow_tree.delete(*slow_tree.get_children())
+            slow_records[:] = reversed(query_profiler.profiler.slow_queries())
+            for i, record in enumerate(slow_records):
+                started = datetime.datetime.fromtimestamp(record.started).strftime("%H:%M:%S")
+                slow_tree.insert("", tk.END, iid=str(i), values=(started, f"{record.duration * 1000:.1f}", record.rows,
+                                                                 record.screen or "-", record.shape, record.sql))
+
+        def reset():
+            query_profiler.profiler.reset()
+            refresh()
+
+        def take_backup():
+            # Снимок делает поток планировщика; итог появится в строке состояния
+            self.backups.request()
+            backup_label.config(text="Резервная копия: выполняется")
+
+        button_frame = tk.Frame(screen, bg=self.bg_color)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        tk.Button(button_frame, text="Обновить", command=refresh,
+                  bg=self.button_color, fg="white").pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Сбросить", command=reset,
+                  bg=self.button_color_alt, fg="white").pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Резервная копия", command=take_backup,
+                  bg=self.button_color_alt, fg="white").pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Назад", command=self.show_main_menu,
+                  bg="#607d8b", fg="white").pack(side=tk.RIGHT, padx=5)
+
+        # Статистика запросов в памяти - обновляется при каждом показе экрана
+        self.set_screen_refresh(refresh, max_age=0)
 
-    def show_table_view(self, title, table_name, columns, id_column, search_columns=None):
-        """Общий метод для отображения таблицы"""
-        self.clear_window()
+    def show_import_dialog(self):
+        """Окно импорта CSV / JSON Lines в выбранную таблицу"""
+        form = tk.Toplevel(self.root)
+        form.title("Импорт данных")
+        form.geometry("600x430")
+
+        tk.Label(form, text="Таблица:").grid(row=0, column=0, padx=10, pady=5, sticky=tk.E)
+        table_var = tk.StringVar(form)
+        table_box = ttk.Combobox(form, textvariable=table_var, values=list(schema.TABLE_COLUMNS),
+                                 state="readonly")
+        table_box.grid(row=0, column=1, padx=10, pady=5, sticky=tk.W)
+
+        tk.Label(form, text="Файл:").grid(row=1, column=0, padx=10, pady=5, sticky=tk.E)
+        path_var = tk.StringVar(form)
+        tk.Entry(form, textvariable=path_var, width=40).grid(row=1, column=1, padx=10, pady=5, sticky=tk.W)
+        tk.Button(form, text="Обзор...",
+                  command=lambda: path_var.set(filedialog.askopenfilename(
+                      parent=form, filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Все файлы", "*.*")])
+                      or path_var.get())).grid(row=1, column=2, padx=5, pady=5)
+
+        # В файле пользователей столбец password_hash содержит пароли - в базу пишутся их хеши
+        hash_var = tk.BooleanVar(form, value=True)
+        hash_check = tk.Checkbutton(form, text="Пароли в файле в открытом виде - захешировать",
+                                    variable=hash_var, state=tk.DISABLED)
+        hash_check.grid(row=2, column=1, columnspan=2, padx=10, pady=5, sticky=tk.W)
+        table_box.bind("<<ComboboxSelected>>", lambda event: hash_check.config(
+            state=tk.NORMAL if table_var.get() == "users" else tk.DISABLED))
+
+        status_label = tk.Label(form, text="")
+        status_label.grid(row=3, column=0, columnspan=3, padx=10, pady=5, sticky=tk.W)
+
+        rejects_text = tk.Text(form, height=12, width=70)
+        rejects_text.grid(row=4, column=0, columnspan=3, padx=10, pady=5)
+
+        # Ход импорта передаётся из фонового потока через этот словарь
+        state = {"result": None, "rejects": [], "running": False}
+
+        def refresh():
+            if not form.winfo_exists():
+                return
+            if state["result"] is not None:
+                status_label.config(text=f"Импорт: {state['result']}")
+            while state["rejects"]:
+                rejects_text.insert(tk.END, state["rejects"].pop(0) + "\n")
+            if state["running"]:
+                form.after(200, refresh)
+
+        def on_reject(line_no, row, reason):
+            state["rejects"].append(f"строка {line_no}: {reason}")
+
+        def done(result):
+            state["running"] = False
+            state["result"] = result
+            # Импорт мог затронуть и таблицу текущего экрана
+            self.data_changed()
+            refresh()
+            messagebox.showinfo("Импорт", f"Импорт завершён: {result}", parent=form)
+
+        def failed(e):
+            state["running"] = False
+            # Пакеты до ошибки уже записаны
+            self.data_changed()
+            refresh()
+            messagebox.showerror("Ошибка", f"Не удалось импортировать данные: {e}", parent=form)
+
+        def start():
+            table_name, path = table_var.get(), path_var.get()
+            if not table_name or not path or state["running"]:
+                return
+            state["running"] = True
+            rejects_text.delete("1.0", tk.END)
+            status_label.config(text="Импорт...")
+            hash_passwords = table_name == "users" and hash_var.get()
+
+            def run_import(conn):
+                # Хеши паролей считаются в пуле процессов, пул живёт только на время импорта
+                pool = credentials.process_pool() if hash_passwords else None
+                try:
+                    result = importer.import_file(conn, table_name, path,
+                                                  progress=lambda result: state.update(result=result),
+                                                  on_reject=on_reject, hash_passwords=hash_passwords, pool=pool)
+                finally:
+                    if pool:
+                        pool.shutdown()
+                self.lookups.invalidate(table_name)
+                if table_name in ("products", "tags", "product_tags"):
+                    self.tag_index.invalidate()
+                return result
+
+            self.file_worker.submit(run_import, on_done=done, on_error=failed, tag="import")
+            refresh()
+
+        button_frame = tk.Frame(form)
+        button_frame.grid(row=5, column=0, columnspan=3, pady=10)
+        tk.Button(button_frame, text="Импортировать", command=start).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Закрыть", command=form.destroy).pack(side=tk.LEFT, padx=5)
+
+    def open_screen(self, name):
+        """Переход на экран name.
+
+        Уже построенный экран показывается снова с прежними строкой поиска,
+        фильтрами и сортировкой (данные перечитываются, только если устарели),
+        и возвращается None. Для нового экрана возвращается пустой фрейм,
+        который вызывающий заполняет виджетами.
+        """
+        self.leave_screen()
+        query_profiler.set_screen(name)
+
+        screen = self.screens.get(name)
+        if screen is not None:
+            self.current_screen = screen
+            for attr, value in screen.state.items():
+                setattr(self, attr, value)
+            screen.frame.pack(fill=tk.BOTH, expand=True)
+            if screen.refresh and self.is_stale(screen):
+                self.refresh_screen(screen)
+            return None
+
+        self.reset_screen_state()
+        frame = tk.Frame(self.root)
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.current_screen = self.screens[name] = Screen(name, frame)
+        return frame
+
+    def leave_screen(self):
+        """Скрытие текущего экрана с сохранением его состояния"""
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = None
+
+        screen = self.current_screen
+        if screen is not None:
+            # Загрузка, которая сейчас отменится, не успела показать данные - при возврате экран их перечитает
+            if self.worker.busy("view"):
+                screen.data_version = None
+            screen.state = {attr: getattr(self, attr) for attr in SCREEN_STATE}
+            screen.frame.pack_forget()
+        self.worker.cancel("view")
+        self.worker.cancel("form")
+        self.page_loading = False
+
+    def reset_screen_state(self):
+        """Состояние нового экрана"""
+        self.tree = None
+        self.pager = None
+        self.row_keys = {}
+        self.search_entry = None
+        self.filter_inputs = {}
+        self.headings = []
+        self.sort = None
+        self.include_archive = None
+        self.scheduled_term = ""
+        self.shown_view = None
+
+    def set_screen_refresh(self, refresh, max_age=STALE_AFTER_S):
+        """Обновление данных текущего экрана: выполняется сразу и при возврате на устаревший экран"""
+        screen = self.current_screen
+        screen.refresh = refresh
+        screen.max_age = max_age
+        self.refresh_screen(screen)
+
+    def refresh_screen(self, screen):
+        screen.data_version = self.data_version
+        screen.refreshed_at = time.monotonic()
+        screen.refresh()
+
+    def is_stale(self, screen):
+        return (screen.data_version != self.data_version
+                or time.monotonic() - screen.refreshed_at >= screen.max_age)
+
+    def data_changed(self, table_name=None):
+        """Отметка об изменении данных через приложение: скрытые экраны обновятся при возврате.
+
+        Если открыт экран изменённой таблицы table_name, он уже показывает
+        изменение (строка перерисована или таблица перечитывается) и не устарел.
+        """
+        self.data_version += 1
+        if table_name is not None and self.shows_table(table_name) and self.current_screen.data_version is not None:
+            self.current_screen.data_version = self.data_version
+
+    def show_table_view(self, title, table_name, columns, id_column, search_columns=None, extra_buttons=()):
+        """Общий метод для отображения таблицы; extra_buttons - [(текст, команда)]"""
+        screen = self.open_screen(table_name)
+        if screen is None:
+            return
 
         # Заголовок
-        tk.Label(self.root, text=title, font=("Arial", 16, "bold"),
+        tk.Label(screen, text=title, font=("Arial", 16, "bold"),
                  fg=self.text_color).pack(pady=10)
 
         # Фрейм для поиска
-        search_frame = tk.Frame(self.root, bg=self.bg_color)
+        search_frame = tk.Frame(screen, bg=self.bg_color)
         search_frame.pack(fill=tk.X, padx=10, pady=5)
 
         if search_columns:
             self.search_entry = tk.Entry(search_frame, font=("Arial", 12))
             self.search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+            self.bind_live_search(table_name)
 
             search_btn = tk.Button(search_frame, text="Поиск",
                                    command=lambda: self.search_table(table_name, columns, id_column, search_columns),
@@ -178,8 +591,16 @@ class OnlineStoreApp:
                                   bg=self.button_color_alt, fg="white")
             reset_btn.pack(side=tk.LEFT, padx=5)
 
+        if table_name in archive.ARCHIVED_TABLES:
+            # По умолчанию читаются только оперативные заказы; архив подключается по требованию
+            self.include_archive = tk.BooleanVar(value=False)
+            tk.Checkbutton(search_frame, text="Включая архив", variable=self.include_archive,
+                           command=lambda: self.reload_view(table_name), bg=self.bg_color).pack(side=tk.LEFT, padx=5)
+
+        self.build_filter_bar(screen, table_name)
+
         # Таблица с данными
-        table_frame = tk.Frame(self.root)
+        table_frame = tk.Frame(screen)
         table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
         scroll_y = tk.Scrollbar(table_frame)
@@ -189,18 +610,17 @@ class OnlineStoreApp:
         scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
 
         self.tree = ttk.Treeview(table_frame, columns=columns, show='headings',
-                                 yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set)
+                                 yscrollcommand=lambda first, last: self.on_tree_scroll(scroll_y, first, last),
+                                 xscrollcommand=scroll_x.set)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
         scroll_y.config(command=self.tree.yview)
         scroll_x.config(command=self.tree.xview)
 
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100, anchor=tk.CENTER)
+        self.setup_headings(table_name, columns)
 
         # Кнопки CRUD
-        button_frame = tk.Frame(self.root, bg=self.bg_color)
+        button_frame = tk.Frame(screen, bg=self.bg_color)
         button_frame.pack(fill=tk.X, padx=10, pady=10)
 
         add_btn = tk.Button(button_frame, text="Добавить",
@@ -218,57 +638,366 @@ class OnlineStoreApp:
                                bg="#f44336", fg="white")
         delete_btn.pack(side=tk.LEFT, padx=5)
 
+        export_btn = tk.Button(button_frame, text="Экспорт",
+                               command=self.export_current_view,
+                               bg=self.button_color_alt, fg="white")
+        export_btn.pack(side=tk.LEFT, padx=5)
+
+        bulk_btn = tk.Button(button_frame, text="Массовые действия",
+                             command=lambda: self.show_bulk_dialog(table_name),
+                             bg=self.button_color_alt, fg="white")
+        bulk_btn.pack(side=tk.LEFT, padx=5)
+
+        for text, command in extra_buttons:
+            tk.Button(button_frame, text=text, command=command,
+                      bg=self.button_color, fg="white").pack(side=tk.LEFT, padx=5)
+
         back_btn = tk.Button(button_frame, text="Назад",
                              command=self.show_main_menu,
                              bg="#607d8b", fg="white")
         back_btn.pack(side=tk.RIGHT, padx=5)
 
-        # Отображение данных
-        self.display_table(table_name, columns, id_column)
+        # Отображение данных (при возврате на экран - только если они устарели)
+        self.set_screen_refresh(lambda: self.reload_view(table_name))
 
     def display_table(self, table_name, columns, id_column):
-        """Отображение данных таблицы"""
+        """Отображение данных таблицы без поиска и фильтров (первая страница, остальное - при прокрутке)"""
+        if self.search_entry:
+            self.search_entry.delete(0, tk.END)
+        for widget in self.filter_inputs.values():
+            if isinstance(widget, tuple):
+                for entry in widget:
+                    entry.delete(0, tk.END)
+            else:
+                widget.set("")
+        self.reload_view(table_name)
+
+    def search_table(self, table_name, columns, id_column, search_columns):
+        """Поиск по таблице"""
+        self.reload_view(table_name)
+
+    def reload_view(self, table_name):
+        """Загрузка таблицы с учётом строки поиска, фильтров и сортировки"""
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+        search_term = self.search_entry.get() if self.search_entry else ""
+        self.scheduled_term = search_term
+        filters = self.current_filters()
+        include_archive = self.include_archive is not None and self.include_archive.get()
+        view = (table_name, search_term, filters, self.sort, include_archive)
         try:
-            # Очистка таблицы
-            for item in self.tree.get_children():
-                self.tree.delete(item)
+            pager = Store(self.conn)[table_name].view_pager(search_term, self.fts_enabled, filters, self.sort,
+                                                            PAGE_SIZE, self.narrowed_keys(view), include_archive)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        self.load_pager(pager, "Ошибка поиска" if search_term else "Не удалось загрузить данные", view)
 
-            # Получение данных
-            self.cursor.execute(f"SELECT * FROM {table_name}")
-            rows = self.cursor.fetchall()
+    def bind_live_search(self, table_name):
+        """Поиск при вводе: запрос уходит после паузы SEARCH_DELAY_MS, Enter - сразу"""
+        self.search_entry.bind("<KeyRelease>", lambda event: self.schedule_search(table_name))
+        self.search_entry.bind("<Return>", lambda event: self.reload_view(table_name))
 
-            # Заполнение таблицы
-            for row in rows:
-                self.tree.insert('', tk.END, values=row)
-        except sqlite3.Error as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить данные: {e}")
+    def schedule_search(self, table_name):
+        """Перезапуск таймера поиска после изменения строки поиска"""
+        if self.search_entry.get() == self.scheduled_term:
+            return
+        self.scheduled_term = self.search_entry.get()
+
+        # Выполняющийся запрос по прежней строке больше не нужен - прерываем его
+        self.worker.cancel("view")
+        self.page_loading = False
+
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, lambda: self.reload_view(table_name))
+
+    def narrowed_keys(self, view):
+        """Ключи строк показанного результата, если новый поиск только уточняет его.
+
+        Если прежний результат целиком загружен в таблицу, а новая строка поиска
+        продолжает прежнюю при тех же фильтрах и сортировке, новые строки - его
+        подмножество, и запрос проверяет только эти записи вместо всей таблицы.
+        """
+        shown, pager = self.shown_view, self.pager
+        if shown is None or pager is None or not (pager.at_start and pager.at_end):
+            return None
+        table_name, search_term, filters, sort, include_archive = view
+        if ((shown[0], shown[2], shown[3], shown[4]) != (table_name, filters, sort, include_archive)
+                or len(schema.key_columns(table_name)) > 1):
+            return None
+        if not shown[1] or search_term == shown[1] or not search_term.startswith(shown[1]):
+            return None
+        return [int(item) for item in self.tree.get_children()]
+
+    def build_filter_bar(self, parent, table_name):
+        """Поля фильтров таблицы: диапазоны (от/до) и выбор значения"""
+        filters = schema.FILTERS.get(table_name)
+        if not filters:
+            return
 
-    def search_table(self, table_name, columns, id_column, search_columns):
-        """Поиск по таблице"""
-        search_term = self.search_entry.get()
-        if not search_term:
-            self.display_table(table_name, columns, id_column)
+        filter_frame = tk.Frame(parent, bg=self.bg_color)
+        filter_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        for column, kind in filters.items():
+            tk.Label(filter_frame, text=column, bg=self.bg_color).pack(side=tk.LEFT, padx=(10, 2))
+            if kind in schema.RANGE_FILTERS:
+                low = tk.Entry(filter_frame, width=10)
+                low.pack(side=tk.LEFT)
+                tk.Label(filter_frame, text="-", bg=self.bg_color).pack(side=tk.LEFT)
+                high = tk.Entry(filter_frame, width=10)
+                high.pack(side=tk.LEFT)
+                self.filter_inputs[column] = (low, high)
+            elif kind == "category":
+                # Категория вместе с подкатегориями; список заполняется после загрузки
+                choice = ttk.Combobox(filter_frame, state="readonly", width=20)
+                choice.pack(side=tk.LEFT)
+                self.filter_inputs[column] = choice
+                self.worker.submit(lambda conn: self.lookups.choices(conn, "categories"),
+                                   on_done=lambda categories, c=choice: self.fill_category_dropdown(
+                                       c, categories, allow_empty=True),
+                                   tag="form")
+            else:
+                choice = ttk.Combobox(filter_frame, values=[""] + schema.FILTER_CHOICES[kind],
+                                      state="readonly", width=10)
+                choice.pack(side=tk.LEFT)
+                self.filter_inputs[column] = choice
+
+        tk.Button(filter_frame, text="Фильтр", command=lambda: self.reload_view(table_name),
+                  bg=self.button_color, fg="white").pack(side=tk.LEFT, padx=10)
+
+    def current_filters(self):
+        """Значения полей фильтров: {столбец: (от, до)} или {столбец: значение}"""
+        return {column: tuple(entry.get() for entry in widget) if isinstance(widget, tuple) else widget.get()
+                for column, widget in self.filter_inputs.items()}
+
+    def setup_headings(self, table_name, columns):
+        """Заголовки столбцов; щелчок по заголовку меняет сортировку"""
+        self.headings = list(columns)
+        sortable = len(schema.TABLE_COLUMNS[table_name])
+        for index, col in enumerate(columns):
+            # Дополнительные столбцы экрана (например, оценки товаров) не сортируются
+            if index < sortable:
+                self.tree.heading(col, text=col, command=lambda i=index: self.sort_by(table_name, i))
+            else:
+                self.tree.heading(col, text=col)
+            self.tree.column(col, width=100, anchor=tk.CENTER)
+
+    def sort_by(self, table_name, index):
+        """Сортировка по столбцу: по возрастанию, по убыванию, снова по умолчанию"""
+        column = schema.TABLE_COLUMNS[table_name][index]
+        if self.sort == (column, False):
+            self.sort = (column, True)
+        elif self.sort == (column, True):
+            self.sort = None
+        else:
+            self.sort = (column, False)
+
+        for i, text in enumerate(self.headings[:len(schema.TABLE_COLUMNS[table_name])]):
+            mark = ""
+            if self.sort and schema.TABLE_COLUMNS[table_name][i] == self.sort[0]:
+                mark = " ▼" if self.sort[1] else " ▲"
+            self.tree.heading(text, text=text + mark)
+
+        self.reload_view(table_name)
+
+    def load_pager(self, pager, error_text, view=None):
+        """Заполнение таблицы первой страницей нового источника данных"""
+        # Результаты прежнего источника больше не нужны
+        self.worker.cancel("view")
+        self.pager = None
+        self.page_loading = False
+
+        self.worker.submit(lambda conn: self.fetch_page(conn, pager, pager.read_first, PAGE_SIZE + PREFETCH_ROWS),
+                           on_done=lambda page: self.show_first_page(pager, page, view),
+                           on_error=lambda e: messagebox.showerror("Ошибка", f"{error_text}: {e}"),
+                           tag="view")
+
+    def fetch_page(self, conn, pager, read, *args):
+        """Чтение страницы в фоновом потоке вместе с названиями для внешних ключей.
+
+        Возвращает (строки, новое положение источника); положение pager меняется
+        только в потоке Tk, когда страница показана.
+        """
+        rows, state = read(conn, *args)
+        self.lookups.resolve_rows(conn, pager.table_name, [row for _, row in rows])
+        return rows, state
+
+    def show_first_page(self, pager, page, view=None):
+        """Вывод первой страницы в таблицу"""
+        if not self.tree.winfo_exists():
             return
 
-        try:
-            # Очистка таблицы
-            for item in self.tree.get_children():
-                self.tree.delete(item)
+        rows, state = page
+        pager.apply(state)
+        self.pager = pager
+        self.shown_view = view
+        self.row_keys = {}
+        self.tree.delete(*self.tree.get_children())
+        self.insert_rows(rows)
+        self.tree.yview_moveto(0)
+
+    def export_current_view(self):
+        """Экспорт текущей таблицы или результата поиска в файл"""
+        if self.pager is None:
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Колоночный файл", "*.scol")])
+        if not path:
+            return
+
+        pager = self.pager
+        self.file_worker.submit(lambda conn: exporter.export_pager(conn, pager, path),
+                                on_done=lambda count: messagebox.showinfo("Экспорт", f"Выгружено строк: {count}"),
+                                on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось выгрузить данные: {e}"),
+                                tag="export")
+
+    def format_row(self, table_name, row):
+        """Подготовка строки к выводу: пароли скрыты, у внешних ключей - названия"""
+        row = list(row)
+        if table_name == "users":
+            row[3] = "********"
+
+        columns = schema.TABLE_COLUMNS[table_name]
+        for col, ref_table in schema.FOREIGN_KEYS.get(table_name, {}).items():
+            index = columns.index(col)
+            name = self.lookups.name(ref_table, row[index])
+            if name is not None:
+                row[index] = f"{row[index]} - {name}"
+        return row
+
+    def item_id(self, table_name, row):
+        """Идентификатор строки Treeview - первичный ключ записи"""
+        return ":".join(str(value) for value in row[:len(schema.key_columns(table_name))])
+
+    def insert_rows(self, rows, index=tk.END):
+        """Добавление строк страницы в таблицу"""
+        table_name = self.pager.table_name
+        position = 0 if index == 0 else tk.END
+        for key, row in (reversed(rows) if index == 0 else rows):
+            item = self.item_id(table_name, row)
+            if self.tree.exists(item):
+                # Строка, изменённая на месте (apply_update), могла сменить значение сортировки
+                # или релевантность и снова прийти со страницей - переносим её на новое место
+                self.tree.move(item, '', position)
+                self.tree.item(item, values=self.format_row(table_name, row))
+            else:
+                self.tree.insert('', position, iid=item, values=self.format_row(table_name, row))
+            self.row_keys[item] = key
 
-            # Создание условий поиска
-            conditions = " OR ".join([f"{col} LIKE ?" for col in search_columns])
-            params = [f"%{search_term}%"] * len(search_columns)
+    def shows_table(self, table_name):
+        """Открыт ли сейчас экран таблицы table_name"""
+        return (self.pager is not None and self.pager.table_name == table_name
+                and self.tree is not None and self.tree.winfo_exists())
 
-            # Выполнение поиска
-            query = f"SELECT * FROM {table_name} WHERE {conditions}"
-            self.cursor.execute(query, params)
-            rows = self.cursor.fetchall()
+    def apply_insert(self, table_name, row):
+        """Показ добавленной записи без перезагрузки таблицы.
 
-            # Заполнение результатов
-            for row in rows:
-                self.tree.insert('', tk.END, values=row)
-        except sqlite3.Error as e:
-            messagebox.showerror("Ошибка", f"Ошибка поиска: {e}")
+        Строка вставляется на своё место по ключу, если это место попадает
+        в загруженное окно (обычно - в конец); иначе она появится при прокрутке.
+        """
+        if not self.shows_table(table_name) or row is None or not self.pager.unfiltered:
+            return
+        item = self.item_id(table_name, row)
+        if self.tree.exists(item):
+            self.tree.item(item, values=self.format_row(table_name, row))
+            return
+
+        key = tuple(row[:len(self.pager.key_columns)])
+        keys = [self.row_keys[i] for i in self.tree.get_children()]
+        if keys and ((key < keys[0] and not self.pager.at_start) or (key > keys[-1] and not self.pager.at_end)):
+            return
+
+        position = bisect.bisect(keys, key)
+        self.tree.insert('', position, iid=item, values=self.format_row(table_name, row))
+        self.row_keys[item] = key
+        if position == 0:
+            self.pager.first_key = key
+        if position == len(keys):
+            self.pager.last_key = key
+
+    def apply_update(self, table_name, row):
+        """Перерисовка одной изменённой строки"""
+        if not self.shows_table(table_name) or row is None:
+            return
+        item = self.item_id(table_name, row)
+        if self.tree.exists(item):
+            self.tree.item(item, values=self.format_row(table_name, row))
+
+    def apply_delete(self, table_name, item):
+        """Удаление одной строки из таблицы"""
+        if self.shows_table(table_name) and self.tree.exists(item):
+            self.tree.delete(item)
+            self.row_keys.pop(item, None)
+
+    def on_tree_scroll(self, scrollbar, first, last):
+        """Обновление полосы прокрутки и подгрузка соседних страниц"""
+        scrollbar.set(first, last)
+        if self.pager is None or self.page_loading:
+            return
+
+        # Ключ границы окна передаётся заданию: фоновый поток не читает и не меняет pager
+        pager = self.pager
+        if float(last) >= 0.9 and not pager.at_end and pager.last_key is not None:
+            self.page_loading = True
+            key = pager.last_key
+            self.worker.submit(lambda conn: self.fetch_page(conn, pager, pager.read_next, key),
+                               on_done=lambda page: self.append_page(pager, page),
+                               on_error=self.page_load_failed, tag="view")
+        elif float(first) <= 0.1 and not pager.at_start and pager.first_key is not None:
+            self.page_loading = True
+            key = pager.first_key
+            self.worker.submit(lambda conn: self.fetch_page(conn, pager, pager.read_prev, key),
+                               on_done=lambda page: self.prepend_page(pager, page),
+                               on_error=self.page_load_failed, tag="view")
+
+    def page_load_failed(self, error):
+        self.page_loading = False
+        messagebox.showerror("Ошибка", f"Не удалось загрузить данные: {error}")
+
+    def append_page(self, pager, page):
+        """Добавление страницы в конец таблицы и выгрузка лишних строк сверху"""
+        self.page_loading = False
+        if pager is not self.pager:
+            return
+        rows, state = page
+        pager.apply(state)
+        if not rows:
+            return
+        self.insert_rows(rows)
+
+        items = self.tree.get_children()
+        excess = len(items) - MAX_LOADED_ROWS
+        if excess > 0:
+            top = round(self.tree.yview()[0] * len(items))
+            self.tree.delete(*items[:excess])
+            for item in items[:excess]:
+                del self.row_keys[item]
+            pager.trim_front(self.row_keys[items[excess]])
+            self.tree.yview_moveto(max(top - excess, 0) / MAX_LOADED_ROWS)
+
+    def prepend_page(self, pager, page):
+        """Добавление страницы в начало таблицы и выгрузка лишних строк снизу"""
+        self.page_loading = False
+        if pager is not self.pager:
+            return
+        rows, state = page
+        pager.apply(state)
+        if not rows:
+            return
+        top = round(self.tree.yview()[0] * len(self.tree.get_children()))
+        self.insert_rows(rows, 0)
+
+        items = self.tree.get_children()
+        excess = len(items) - MAX_LOADED_ROWS
+        if excess > 0:
+            self.tree.delete(*items[-excess:])
+            for item in items[-excess:]:
+                del self.row_keys[item]
+            pager.trim_back(self.row_keys[items[-excess - 1]])
+        self.tree.yview_moveto((top + len(rows)) / len(self.tree.get_children()))
 
     def show_add_form(self, table_name, columns, id_column):
         """Форма для добавления записи"""
@@ -282,24 +1011,7 @@ class OnlineStoreApp:
         self.current_id_column = id_column
 
         # Определяем, какие поля нужно показывать
-        fields_to_show = []
-        if table_name == "users":
-            fields_to_show = ["username", "email", "password_hash", "first_name", "last_name", "phone", "is_active"]
-        elif table_name == "categories":
-            fields_to_show = ["name", "description"]
-        elif table_name == "products":
-            fields_to_show = ["category_id", "name", "description", "price", "stock_quantity", "is_active"]
-        elif table_name == "orders":
-            fields_to_show = ["user_id", "status", "total_amount", "shipping_address", "payment_method",
-                              "payment_status"]
-        elif table_name == "order_items":
-            fields_to_show = ["order_id", "product_id", "quantity", "unit_price"]
-        elif table_name == "tags":
-            fields_to_show = ["name", "description"]
-        elif table_name == "product_tags":
-            fields_to_show = ["product_id", "tag_id"]
-        elif table_name == "product_reviews":
-            fields_to_show = ["product_id", "user_id", "rating", "review_text"]
+        fields_to_show = schema.FORM_FIELDS.get(table_name, [])
 
         # Создание полей формы
         self.form_entries = {}
@@ -307,20 +1019,21 @@ class OnlineStoreApp:
             tk.Label(form, text=f"{col}:").grid(row=i, column=0, padx=10, pady=5, sticky=tk.E)
 
             # Специальные обработчики для разных типов полей
-            if table_name == "products" and col == "category_id":
-                # Выпадающий список для категорий
-                self.cursor.execute("SELECT category_id, name FROM categories")
-                categories = self.cursor.fetchall()
-                category_names = [f"{cat[0]} - {cat[1]}" for cat in categories]
+            if col in CATEGORY_FIELDS:
+                # Выпадающий список для категорий (заполняется после загрузки)
                 category_var = tk.StringVar(form)
-                dropdown = ttk.Combobox(form, textvariable=category_var, values=category_names)
+                dropdown = ttk.Combobox(form, textvariable=category_var)
                 dropdown.grid(row=i, column=1, padx=10, pady=5, sticky=tk.W)
                 self.form_entries[col] = dropdown
+                self.worker.submit(lambda conn: self.lookups.choices(conn, "categories"),
+                                   on_done=lambda categories, d=dropdown, c=col: self.fill_category_dropdown(
+                                       d, categories, allow_empty=c == "parent_category_id"),
+                                   tag="form")
             elif table_name == "orders" and col == "status":
                 # Выпадающий список для статуса заказа
                 status_var = tk.StringVar(form)
                 dropdown = ttk.Combobox(form, textvariable=status_var,
-                                        values=["pending", "processing", "shipped", "delivered", "cancelled"])
+                                        values=schema.ORDER_STATUSES)
                 dropdown.grid(row=i, column=1, padx=10, pady=5, sticky=tk.W)
                 self.form_entries[col] = dropdown
             elif col == "is_active":
@@ -351,6 +1064,10 @@ class OnlineStoreApp:
         cancel_btn = tk.Button(button_frame, text="Отмена", command=form.destroy)
         cancel_btn.pack(side=tk.LEFT, padx=5)
 
+    def selected_key(self, table_name, item):
+        """Первичный ключ строки таблицы (из идентификатора строки, см. item_id)"""
+        return tuple(item.split(":"))
+
     def show_edit_form(self, table_name, columns, id_column):
         """Форма для редактирования записи"""
         selected = self.tree.selection()
@@ -358,8 +1075,27 @@ class OnlineStoreApp:
             messagebox.showwarning("Предупреждение", "Выберите запись для редактирования")
             return
 
-        record_id = self.tree.item(selected[0])['values'][0]
+        record_id = self.selected_key(table_name, selected[0])
 
+        def load_record(conn):
+            # Получение данных записи
+            store = Store(conn)
+            record = store[table_name].get(*record_id)
+            if record is None:
+                raise sqlite3.DataError("запись не найдена")
+
+            categories = self.lookups.choices(conn, "categories") if table_name in ("products", "categories") else []
+            # Словарь для удобного доступа к значениям полей
+            return record._asdict(), categories
+
+        self.worker.submit(load_record,
+                           on_done=lambda result: self.build_edit_form(table_name, columns, id_column,
+                                                                       record_id, *result),
+                           on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось загрузить запись: {e}"),
+                           tag="form")
+
+    def build_edit_form(self, table_name, columns, id_column, record_id, record_dict, categories):
+        """Построение формы редактирования по загруженной записи"""
         form = tk.Toplevel(self.root)
         form.title(f"Редактировать запись в {table_name}")
         form.geometry("500x600")
@@ -371,31 +1107,7 @@ class OnlineStoreApp:
         self.current_record_id = record_id
 
         # Определяем, какие поля нужно показывать (аналогично show_add_form)
-        fields_to_show = []
-        if table_name == "users":
-            fields_to_show = ["username", "email", "password_hash", "first_name", "last_name", "phone", "is_active"]
-        elif table_name == "categories":
-            fields_to_show = ["name", "description", "parent_category_id"]
-        elif table_name == "products":
-            fields_to_show = ["category_id", "name", "description", "price", "stock_quantity", "is_active"]
-        elif table_name == "orders":
-            fields_to_show = ["user_id", "status", "total_amount", "shipping_address", "payment_method",
-                              "payment_status"]
-        elif table_name == "order_items":
-            fields_to_show = ["order_id", "product_id", "quantity", "unit_price"]
-        elif table_name == "tags":
-            fields_to_show = ["name", "description"]
-        elif table_name == "product_tags":
-            fields_to_show = ["product_id", "tag_id"]
-        elif table_name == "product_reviews":
-            fields_to_show = ["product_id", "user_id", "rating", "review_text"]
-
-        # Получение данных записи
-        self.cursor.execute(f"SELECT * FROM {table_name} WHERE {id_column} = ?", (record_id,))
-        record = self.cursor.fetchone()
-
-        # Создаем словарь для удобного доступа к значениям полей
-        record_dict = dict(zip([col[0] for col in self.cursor.description], record))
+        fields_to_show = schema.EDIT_FIELDS.get(table_name, [])
 
         # Создание полей формы
         self.form_entries = {}
@@ -410,18 +1122,18 @@ class OnlineStoreApp:
                 current_value = "********"
 
             # Специальные обработчики для разных типов полей
-            if table_name == "products" and col == "category_id":
-                # Выпадающий список для категорий
-                self.cursor.execute("SELECT category_id, name FROM categories")
-                categories = self.cursor.fetchall()
+            if col in CATEGORY_FIELDS:
+                # Выпадающий список для категорий (родителя можно не указывать)
                 category_names = [f"{cat[0]} - {cat[1]}" for cat in categories]
+                if col == "parent_category_id":
+                    category_names.insert(0, "")
                 category_var = tk.StringVar(form)
 
                 # Установка текущего значения
                 current_cat_id = current_value
-                self.cursor.execute("SELECT name FROM categories WHERE category_id = ?", (current_cat_id,))
-                current_cat_name = self.cursor.fetchone()[0]
-                category_var.set(f"{current_cat_id} - {current_cat_name}")
+                if current_cat_id is not None:
+                    current_cat_name = dict(categories).get(current_cat_id, "")
+                    category_var.set(f"{current_cat_id} - {current_cat_name}")
 
                 dropdown = ttk.Combobox(form, textvariable=category_var, values=category_names)
                 dropdown.grid(row=i, column=1, padx=10, pady=5, sticky=tk.W)
@@ -430,7 +1142,7 @@ class OnlineStoreApp:
                 # Выпадающий список для статуса заказа
                 status_var = tk.StringVar(form, value=current_value)
                 dropdown = ttk.Combobox(form, textvariable=status_var,
-                                        values=["pending", "processing", "shipped", "delivered", "cancelled"])
+                                        values=schema.ORDER_STATUSES)
                 dropdown.grid(row=i, column=1, padx=10, pady=5, sticky=tk.W)
                 self.form_entries[col] = dropdown
             elif col == "is_active":
@@ -462,247 +1174,439 @@ class OnlineStoreApp:
         cancel_btn = tk.Button(button_frame, text="Отмена", command=form.destroy)
         cancel_btn.pack(side=tk.LEFT, padx=5)
 
+    def fill_category_dropdown(self, dropdown, categories, allow_empty=False):
+        """Заполнение выпадающего списка категорий"""
+        if dropdown.winfo_exists():
+            dropdown['values'] = [""] * allow_empty + [f"{cat[0]} - {cat[1]}" for cat in categories]
+
     def save_record(self, fields_to_show):
         """Сохранение новой записи"""
-        try:
-            columns = []
-            placeholders = []
-            values = []
-
-            for col in fields_to_show:
-                widget = self.form_entries[col]
-
-                if isinstance(widget, ttk.Combobox):
-                    value = widget.get()
-                    if col == "category_id":
-                        value = value.split(" - ")[0]
-                elif isinstance(widget, tk.BooleanVar):
-                    value = 1 if widget.get() else 0
-                else:
-                    value = widget.get()
-
-                # Хеширование пароля, если это поле password_hash
-                if col == "password_hash":
-                    value = self.hash_password(value)
-
-                # Проверка обязательных полей
-                if (self.current_table == "users" and col in ["username", "email", "password_hash"] and not value):
-                    messagebox.showerror("Ошибка", f"Поле {col} обязательно для заполнения")
-                    return
-                if (self.current_table == "products" and col in ["name", "price", "category_id"] and not value):
-                    messagebox.showerror("Ошибка", f"Поле {col} обязательно для заполнения")
-                    return
-
-                columns.append(col)
-                placeholders.append("?")
-                values.append(value)
-
-            # Создание SQL запроса
-            query = f"INSERT INTO {self.current_table} ({', '.join(columns)}) VALUES ({', '.join(placeholders)})"
-
-            self.cursor.execute(query, values)
-            self.conn.commit()
+        record = {}
+        for col in fields_to_show:
+            widget = self.form_entries[col]
+
+            if isinstance(widget, ttk.Combobox):
+                value = widget.get()
+                if col in CATEGORY_FIELDS:
+                    value = value.split(" - ")[0] or None
+            elif isinstance(widget, tk.BooleanVar):
+                value = 1 if widget.get() else 0
+            else:
+                value = widget.get()
+
+            # Проверка обязательных полей
+            error = schema.check_required(self.current_table, col, value)
+            if error:
+                messagebox.showerror("Ошибка", error)
+                return
+
+            record[col] = value
+
+        form = self.current_form
+        table_name = self.current_table
+
+        def insert(conn):
+            # Хеширование пароля занимает сотни миллисекунд - в фоновом потоке, а не в окне
+            if "password_hash" in record:
+                record["password_hash"] = credentials.hash_password(record["password_hash"])
+            repository = Store(conn)[table_name]
+            row_id = repository.insert(record)
+            conn.commit()
+            self.lookups.invalidate(table_name, row_id)
+
+            # У таблиц с составным ключом lastrowid - это rowid, а не первичный ключ
+            if len(repository.key_columns) > 1:
+                row = repository.view_row(*[record[col] for col in repository.key_columns])
+            else:
+                row = repository.view_row(row_id)
+            self.tag_index.on_write(table_name, None, row)
+            return self.lookups.resolve_rows(conn, table_name, [row])[0] if row else None
 
+        def done(row):
+            self.data_changed(table_name)
             messagebox.showinfo("Успех", "Запись успешно добавлена")
-            self.current_form.destroy()
+            form.destroy()
+
+            # Добавляем в таблицу только новую строку
+            self.apply_insert(table_name, row)
 
-            # Обновляем отображение таблицы
-            if hasattr(self, 'tree'):
-                self.display_table(self.current_table, self.current_columns, self.current_id_column)
-        except sqlite3.Error as e:
+        def failed(e):
             messagebox.showerror("Ошибка", f"Не удалось добавить запись: {e}")
             print(f"Ошибка SQL: {e}")
 
-    def hash_password(self, password):
-        """Хеширование пароля с использованием SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        self.worker.submit(insert, on_done=done, on_error=failed)
 
     def update_record(self, fields_to_show):
         """Обновление существующей записи"""
-        try:
-            updates = []
-            values = []
-
-            for col in fields_to_show:
-                widget = self.form_entries[col]
-
-                if isinstance(widget, ttk.Combobox):
-                    value = widget.get()
-                    if col == "category_id":
-                        value = value.split(" - ")[0]
-                elif isinstance(widget, tk.BooleanVar):
-                    value = 1 if widget.get() else 0
-                else:
-                    value = widget.get()
+        record = {}
+        for col in fields_to_show:
+            widget = self.form_entries[col]
+
+            if isinstance(widget, ttk.Combobox):
+                value = widget.get()
+                if col in CATEGORY_FIELDS:
+                    value = value.split(" - ")[0] or None
+            elif isinstance(widget, tk.BooleanVar):
+                value = 1 if widget.get() else 0
+            else:
+                value = widget.get()
 
-                # Хеширование пароля, если это поле password_hash и оно было изменено
-                if col == "password_hash" and value != "********":
-                    value = self.hash_password(value)
+            # Пароль меняется, только если поле password_hash было изменено
+            if col == "password_hash":
+                if value == "********":
+                    continue
 
-                updates.append(f"{col} = ?")
-                values.append(value)
+            record[col] = value
 
-            # Добавляем ID записи в конец для WHERE
-            values.append(self.current_record_id)
+        form = self.current_form
+        record_id = self.current_record_id
+        table_name = self.current_table
 
-            # Создание SQL запроса
-            updates_str = ", ".join(updates)
-            query = f"UPDATE {self.current_table} SET {updates_str} WHERE {self.current_id_column} = ?"
+        def update(conn):
+            if "password_hash" in record:
+                record["password_hash"] = credentials.hash_password(record["password_hash"])
+            repository = Store(conn)[table_name]
+            repository.update(record_id, record)
+            conn.commit()
+            self.lookups.invalidate(table_name, int(record_id[0]))
 
-            self.cursor.execute(query, values)
-            self.conn.commit()
+            row = repository.view_row(*record_id)
+            self.tag_index.on_write(table_name, record_id, row)
+            return self.lookups.resolve_rows(conn, table_name, [row])[0] if row else None
 
+        def done(row):
+            self.data_changed(table_name)
             messagebox.showinfo("Успех", "Запись успешно обновлена")
-            self.current_form.destroy()
+            form.destroy()
 
-            # Обновляем отображение таблицы
-            if hasattr(self, 'tree'):
-                self.display_table(self.current_table, self.current_columns, self.current_id_column)
-        except sqlite3.Error as e:
-            messagebox.showerror("Ошибка", f"Не удалось обновить запись: {e}")
+            # Перерисовываем только изменённую строку
+            self.apply_update(table_name, row)
+
+        self.worker.submit(update, on_done=done,
+                           on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось обновить запись: {e}"))
 
     def delete_record(self, table_name, id_column):
-        """Удаление записи"""
+        """Удаление записи (нескольких выбранных записей - одним запросом)"""
         selected = self.tree.selection()
         if not selected:
             messagebox.showwarning("Предупреждение", "Выберите запись для удаления")
             return
 
-        record_id = self.tree.item(selected[0])['values'][0]
+        if len(selected) > 1:
+            keys = [self.selected_key(table_name, item) for item in selected]
+            if messagebox.askyesno("Подтверждение", f"Удалить выбранные записи ({len(keys)})?"):
+                self.run_bulk_action(table_name, None, None, keys, None)
+            return
 
-        if messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить эту запись?"):
-            try:
-                self.cursor.execute(f"DELETE FROM {table_name} WHERE {id_column} = ?", (record_id,))
-                self.conn.commit()
+        item = selected[0]
+        record_id = self.selected_key(table_name, item)
 
+        if messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить эту запись?"):
+            def delete(conn):
+                Store(conn)[table_name].delete(*record_id)
+                conn.commit()
+                self.lookups.invalidate(table_name, int(record_id[0]))
+                self.tag_index.on_write(table_name, record_id, None)
+
+            def done(_):
+                self.data_changed(table_name)
                 messagebox.showinfo("Успех", "Запись успешно удалена")
-                self.display_table(table_name, self.current_columns, id_column)
-            except sqlite3.Error as e:
-                messagebox.showerror("Ошибка", f"Не удалось удалить запись: {e}")
+                self.apply_delete(table_name, item)
 
-    # Методы для отображения конкретных таблиц
-    def show_users(self):
-        """Отображение таблицы пользователей с фиктивным паролем"""
-        # Указываем только нужные столбцы для отображения
-        display_columns = (
-        "ID пользователя", "Ник", "email", "Пароль", "Имя", "Фамилия", "Телефон", "Дата регистрации", "Активен")
-        db_columns = ["user_id", "username", "email", "password_hash", "first_name", "last_name", "phone", "registration_date",
-                      "is_active"]
+            self.worker.submit(delete, on_done=done,
+                               on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось удалить запись: {e}"))
 
-        # Очищаем текущее отображение
-        self.clear_window()
+    def show_bulk_dialog(self, table_name):
+        """Массовое удаление или изменение поля у выбранных строк либо у всех строк,
+        подходящих под текущий поиск и фильтры"""
+        if self.pager is None:
+            return
+        keys = [self.selected_key(table_name, item) for item in self.tree.selection()]
+        pager = self.pager
+        fields = schema.BULK_FIELDS.get(table_name, {})
+        # Массовые операции меняют только оперативную таблицу, архивные строки остаются как есть
+        with_archive = pager.source != pager.table_name
+        archive_note = " (кроме архивных)" if with_archive else ""
 
-        # Заголовок
-        tk.Label(self.root, text="Пользователи", font=("Arial", 16, "bold"),
-                 fg=self.text_color).pack(pady=10)
+        form = tk.Toplevel(self.root)
+        form.title("Массовые действия")
+        form.geometry("500x260" if with_archive else "500x230")
+
+        scope = tk.StringVar(value="selected" if keys else "all")
+        tk.Radiobutton(form, text=f"Выбранные строки ({len(keys)}){archive_note}", variable=scope, value="selected",
+                       state=tk.NORMAL if keys else tk.DISABLED).grid(row=0, column=0, columnspan=2,
+                                                                      padx=10, pady=2, sticky=tk.W)
+        tk.Radiobutton(form, text=f"Все строки, подходящие под поиск и фильтры{archive_note}", variable=scope,
+                       value="all").grid(row=1, column=0, columnspan=2, padx=10, pady=2, sticky=tk.W)
+
+        actions = ["Удалить"] + [f"Изменить {col}" for col in fields]
+        tk.Label(form, text="Действие:").grid(row=2, column=0, padx=10, pady=5, sticky=tk.E)
+        action = ttk.Combobox(form, values=actions, state="readonly", width=30)
+        action.current(0)
+        action.grid(row=2, column=1, padx=10, pady=5, sticky=tk.W)
+
+        value_label = tk.Label(form, text="Значение:")
+        value_label.grid(row=3, column=0, padx=10, pady=5, sticky=tk.E)
+        value = ttk.Combobox(form, width=30, state=tk.DISABLED)
+        value.grid(row=3, column=1, padx=10, pady=5, sticky=tk.W)
+
+        def selected_column():
+            index = action.current()
+            return list(fields)[index - 1] if index > 0 else None
+
+        def action_changed(event=None):
+            kind = fields.get(selected_column())
+            value.set("")
+            value_label.config(text="Изменение, %:" if kind == "percent" else "Значение:")
+            if kind in schema.FILTER_CHOICES:
+                value.config(values=schema.FILTER_CHOICES[kind], state="readonly")
+            elif kind == "category":
+                value.config(values=[], state="readonly")
+                self.worker.submit(lambda conn: self.lookups.choices(conn, "categories"),
+                                   on_done=lambda categories: self.fill_category_dropdown(value, categories),
+                                   tag="form")
+            else:
+                value.config(values=[], state=tk.NORMAL if kind else tk.DISABLED)
 
-        # Таблица с данными
-        table_frame = tk.Frame(self.root)
-        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        action.bind("<<ComboboxSelected>>", action_changed)
 
-        scroll_y = tk.Scrollbar(table_frame)
-        scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        def submit():
+            chosen = keys if scope.get() == "selected" else None
+            target = f"выбранных записей ({len(keys)})" if chosen else "всех записей, подходящих под поиск и фильтры"
+            if with_archive:
+                target += ". Архивные заказы не изменяются"
+            if not messagebox.askyesno("Подтверждение", f"{action.get()} для {target}?", parent=form):
+                return
+            self.run_bulk_action(table_name, selected_column(), value.get(), chosen,
+                                 None if chosen else pager, form)
 
-        self.tree = ttk.Treeview(table_frame, columns=display_columns, show='headings',
-                                 yscrollcommand=scroll_y.set)
-        self.tree.pack(fill=tk.BOTH, expand=True)
+        if with_archive:
+            tk.Label(form, text="Показаны и архивные записи - действие затронет только оперативные.",
+                     fg="#B71C1C").grid(row=5, column=0, columnspan=2, padx=10, sticky=tk.W)
 
-        scroll_y.config(command=self.tree.yview)
+        button_frame = tk.Frame(form)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=15)
+        tk.Button(button_frame, text="Выполнить", command=submit,
+                  bg=self.button_color, fg="white").pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Отмена", command=form.destroy).pack(side=tk.LEFT, padx=5)
+
+    def run_bulk_action(self, table_name, column, value, keys, pager, form=None):
+        """Удаление (column=None) или изменение записей одним запросом в одной транзакции"""
+        def apply(conn):
+            repository = Store(conn)[table_name]
+            # При ошибке транзакцию откатывает QueryWorker
+            if column is None:
+                count = repository.bulk_delete(keys, pager)
+            else:
+                count = repository.bulk_update(column, value, keys, pager)
+            conn.commit()
+
+            if column is None:
+                self.lookups.invalidate(table_name)
+                if table_name in ("products", "tags", "product_tags"):
+                    # Удалённые записи неизвестны поштучно - индекс тегов перестраивается при обращении
+                    self.tag_index.invalidate()
+            return count
+
+        def done(count):
+            self.data_changed(table_name)
+            if form is not None:
+                form.destroy()
+            messagebox.showinfo("Успех", f"Затронуто записей: {count}")
+            if self.shows_table(table_name):
+                self.reload_view(table_name)
+
+        self.worker.submit(apply, on_done=done,
+                           on_error=lambda e: messagebox.showerror("Ошибка", f"Действие не выполнено: {e}"))
 
-        # Настраиваем заголовки столбцов
-        for col in display_columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100, anchor=tk.CENTER)
+    # Методы для отображения конкретных таблиц
+    def show_users(self):
+        """Отображение таблицы пользователей (пароль заменяется звездочками в format_row)"""
+        columns = (
+        "ID пользователя", "Ник", "email", "Пароль", "Имя", "Фамилия", "Телефон", "Дата регистрации", "Активен")
+        self.show_table_view("Пользователи", "users", columns, "user_id", schema.SEARCH_COLUMNS["users"])
 
-        # Получаем данные из БД
-        self.cursor.execute(f"SELECT {', '.join(db_columns)} FROM users")
-        rows = self.cursor.fetchall()
+    def show_categories(self):
+        """Отображение таблицы категорий"""
+        columns = ("ID Категории", "Название", "Описание", "Родительская категория")
+        self.show_table_view("Категории", "categories", columns, "category_id", schema.SEARCH_COLUMNS["categories"])
 
-        # Заполняем таблицу данными, добавляя фиктивный пароль
-        for row in rows:
-            # Добавляем звездочки вместо пароля (4-я позиция)
-            row_with_password = row[:2] + ("********",) + row[2:]
-            self.tree.insert('', tk.END, values=row_with_password)
+    def show_products(self):
+        """Отображение таблицы товаров"""
+        columns = (
+        "ID Продукта", "ID Категории", "Название", "Описание", "Цена", "В наличии", "Дата добавления", "Продается",
+        "Рейтинг", "Отзывов")
+        self.show_table_view("Товары", "products", columns, "product_id", schema.SEARCH_COLUMNS["products"],
+                             extra_buttons=[("Подбор по тегам", self.show_tag_facets)])
+
+    def show_tag_facets(self):
+        """Подбор товаров по нескольким тегам (все выбранные теги или любой из них).
+
+        Отбор и число товаров у каждого тега считаются по битовым картам
+        TagIndex; из базы читается только страница найденных товаров.
+        """
+        screen = self.open_screen("tag_facets")
+        if screen is None:
+            return
 
-        # Остальной код (поиск, кнопки) остается без изменений
-        search_frame = tk.Frame(self.root, bg=self.bg_color)
-        search_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(screen, text="Подбор товаров по тегам", font=("Arial", 16, "bold"),
+                 fg=self.text_color).pack(pady=10)
 
-        self.search_entry = tk.Entry(search_frame, font=("Arial", 12))
-        self.search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        control_frame = tk.Frame(screen, bg=self.bg_color)
+        control_frame.pack(fill=tk.X, padx=10, pady=5)
+        match_all = tk.BooleanVar(value=True)
+        tk.Radiobutton(control_frame, text="Все выбранные теги (И)", variable=match_all, value=True,
+                       bg=self.bg_color, command=lambda: refresh()).pack(side=tk.LEFT, padx=5)
+        tk.Radiobutton(control_frame, text="Любой из тегов (ИЛИ)", variable=match_all, value=False,
+                       bg=self.bg_color, command=lambda: refresh()).pack(side=tk.LEFT, padx=5)
+        count_label = tk.Label(control_frame, text="", bg=self.bg_color)
+        count_label.pack(side=tk.LEFT, padx=20)
 
-        search_btn = tk.Button(search_frame, text="Поиск",
-                               command=lambda: self.search_users(),
-                               bg=self.button_color, fg="white")
-        search_btn.pack(side=tk.LEFT, padx=5)
+        body_frame = tk.Frame(screen)
+        body_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
-        reset_btn = tk.Button(search_frame, text="Сброс",
-                              command=lambda: self.show_users(),
-                              bg=self.button_color_alt, fg="white")
-        reset_btn.pack(side=tk.LEFT, padx=5)
+        tag_list = tk.Listbox(body_frame, selectmode=tk.MULTIPLE, exportselection=False, width=35)
+        tag_list.pack(side=tk.LEFT, fill=tk.Y)
 
-        # Кнопки управления
-        button_frame = tk.Frame(self.root, bg=self.bg_color)
+        columns = ("ID Продукта", "Название", "Цена", "В наличии")
+        self.tree = ttk.Treeview(body_frame, columns=columns, show='headings')
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=120, anchor=tk.CENTER)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0))
+
+        tags = []
+        state = {"selection": 0, "last_id": 0}
+
+        def selected_tags():
+            return [tags[i][0] for i in tag_list.curselection()]
+
+        def load_tags(conn):
+            self.tag_index.ensure_loaded(conn)
+            return self.lookups.choices(conn, "tags")
+
+        def show_tags(choices):
+            if not tag_list.winfo_exists():
+                return
+            tags[:] = sorted(choices, key=lambda tag: tag[1])
+            tag_list.delete(0, tk.END)
+            for _ in tags:
+                tag_list.insert(tk.END, "")
+            refresh()
+
+        def fetch(conn, tag_ids, all_tags, after):
+            # Индекс мог быть сброшен после записи другим процессом
+            self.tag_index.ensure_loaded(conn)
+            selection = self.tag_index.select(tag_ids, all_tags) if tag_ids else None
+            counts = self.tag_index.facet_counts(selection)
+            ids = product_ids(selection, after, FACET_PAGE_SIZE) if tag_ids else []
+            return selection, counts, Store(conn).products.get_many(ids)
+
+        def show(result, append=False):
+            if not tag_list.winfo_exists():
+                return
+            selection, counts, rows = result
+            state["selection"] = selection
+            if not append:
+                chosen = tag_list.curselection()
+                for i, (tag_id, name) in enumerate(tags):
+                    tag_list.delete(i)
+                    tag_list.insert(i, f"{name} ({counts.get(tag_id, 0)})")
+                for i in chosen:
+                    tag_list.selection_set(i)
+                self.tree.delete(*self.tree.get_children())
+                total = selection.bit_count() if selection is not None else 0
+                count_label.config(text=f"Найдено товаров: {total}")
+            for row in rows:
+                self.tree.insert("", tk.END, values=(row.product_id, row.name, row.price, row.stock_quantity))
+            if rows:
+                state["last_id"] = rows[-1].product_id
+
+        def refresh():
+            tag_ids, all_tags = selected_tags(), match_all.get()
+            self.worker.submit(lambda conn: fetch(conn, tag_ids, all_tags, 0), on_done=show,
+                               on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось подобрать товары: {e}"),
+                               tag="view")
+
+        def load_more():
+            tag_ids, all_tags, after = selected_tags(), match_all.get(), state["last_id"]
+            if not tag_ids:
+                return
+            self.worker.submit(lambda conn: fetch(conn, tag_ids, all_tags, after),
+                               on_done=lambda result: show(result, append=True),
+                               on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось подобрать товары: {e}"),
+                               tag="view")
+
+        tag_list.bind("<<ListboxSelect>>", lambda event: refresh())
+
+        button_frame = tk.Frame(screen, bg=self.bg_color)
         button_frame.pack(fill=tk.X, padx=10, pady=10)
-
-        tk.Button(button_frame, text="Добавить",
-                  command=lambda: self.show_add_form("users", db_columns, "user_id"),
+        tk.Button(button_frame, text="Показать ещё", command=load_more,
                   bg=self.button_color, fg="white").pack(side=tk.LEFT, padx=5)
-
-        tk.Button(button_frame, text="Изменить",
-                  command=lambda: self.show_edit_form("users", db_columns, "user_id"),
-                  bg=self.button_color_alt, fg="white").pack(side=tk.LEFT, padx=5)
-
-        tk.Button(button_frame, text="Удалить", command=lambda: self.delete_record("users", "user_id"),
-                  bg="#f44336", fg="white").pack(side=tk.LEFT, padx=5)
-
-        tk.Button(button_frame, text="Назад", command=self.show_main_menu,
+        tk.Button(button_frame, text="Назад", command=self.show_products,
                   bg="#607d8b", fg="white").pack(side=tk.RIGHT, padx=5)
 
-    def search_users(self):
-        """Поиск пользователей"""
-        search_term = self.search_entry.get()
-        if not search_term:
-            self.show_users()
-            return
-
-        try:
-            # Очистка таблицы
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-
-            # Поиск по username, email, first_name и last_name
-            query = """
-            SELECT user_id, username, email, first_name, last_name, phone, registration_date, is_active 
-            FROM users 
-            WHERE username LIKE ? OR email LIKE ? OR first_name LIKE ? OR last_name LIKE ?
-            """
-            params = [f"%{search_term}%"] * 4
-
-            self.cursor.execute(query, params)
-            rows = self.cursor.fetchall()
-
-            # Заполнение результатов
-            for row in rows:
-                self.tree.insert('', tk.END, values=row)
-        except sqlite3.Error as e:
-            messagebox.showerror("Ошибка", f"Ошибка поиска: {e}")
-
-    def show_categories(self):
-        """Отображение таблицы категорий"""
-        columns = ("ID Категории", "Название", "Описание")
-        self.show_table_view("Категории", "categories", columns, "category_id", ["name"])
+        def reload():
+            self.worker.submit(load_tags, on_done=show_tags,
+                               on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось загрузить теги: {e}"),
+                               tag="view")
 
-    def show_products(self):
-        """Отображение таблицы товаров"""
-        columns = (
-        "ID Продукта", "ID Категории", "Название", "Описание", "Цена", "В наличии", "Дата добавления", "Продается")
-        self.show_table_view("Товары", "products", columns, "product_id", ["name", "description"])
+        self.set_screen_refresh(reload)
 
     def show_orders(self):
         """Отображение таблицы заказов"""
         columns = ("ID Заказа", "ID Пользователя", "Дата", "Статус", "Всего к оплате", "Адрес отправления", "Способ оплаты")
-        self.show_table_view("Заказы", "orders", columns, "order_id", ["status"])
+        self.show_table_view("Заказы", "orders", columns, "order_id", schema.SEARCH_COLUMNS["orders"],
+                             extra_buttons=[("Оформить заказ", self.show_order_form)])
+
+    def show_order_form(self):
+        """Оформление заказа с позициями: сумма считается по ценам товаров, остатки списываются"""
+        form = tk.Toplevel(self.root)
+        form.title("Оформить заказ")
+        form.geometry("500x450")
+
+        entries = {}
+        for i, col in enumerate(["user_id", "shipping_address", "payment_method"]):
+            tk.Label(form, text=f"{col}:").grid(row=i, column=0, padx=10, pady=5, sticky=tk.E)
+            entries[col] = tk.Entry(form, width=40)
+            entries[col].grid(row=i, column=1, padx=10, pady=5, sticky=tk.W)
+
+        tk.Label(form, text="Позиции\n(product_id количество\nпо одной в строке):").grid(
+            row=3, column=0, padx=10, pady=5, sticky=tk.NE)
+        items_text = tk.Text(form, width=30, height=12)
+        items_text.grid(row=3, column=1, padx=10, pady=5, sticky=tk.W)
+
+        def submit():
+            try:
+                items = [tuple(line.split()) for line in items_text.get("1.0", tk.END).splitlines() if line.strip()]
+                if any(len(item) != 2 for item in items):
+                    raise order_service.OrderError("Позиция задаётся как: product_id количество")
+                order = {col: entry.get() or None for col, entry in entries.items()}
+                order["items"] = order_service.normalize_items(items)
+            except order_service.OrderError as e:
+                messagebox.showerror("Ошибка", str(e), parent=form)
+                return
+            if not order["user_id"] or not order["shipping_address"]:
+                messagebox.showerror("Ошибка", "Поля user_id и shipping_address обязательны", parent=form)
+                return
+
+            def place(conn):
+                order_id = order_service.place_order(conn, order)
+                row = Store(conn).orders.view_row(order_id)
+                return self.lookups.resolve_rows(conn, "orders", [row])[0]
+
+            def done(row):
+                self.data_changed("orders")
+                messagebox.showinfo("Успех", f"Заказ {row[0]} оформлен, сумма {row[4]}")
+                form.destroy()
+                self.apply_insert("orders", row)
+
+            self.worker.submit(place, on_done=done,
+                               on_error=lambda e: messagebox.showerror("Ошибка", f"Заказ не оформлен: {e}",
+                                                                       parent=form))
+
+        tk.Button(form, text="Оформить", command=submit,
+                  bg=self.button_color, fg="white").grid(row=4, column=0, columnspan=2, pady=10)
 
     def show_order_items(self):
         """Отображение таблицы элементов заказов"""
@@ -712,7 +1616,7 @@ class OnlineStoreApp:
     def show_tags(self):
         """Отображение таблицы тегов"""
         columns = ("ID Тега", "Название", "Описание")
-        self.show_table_view("Теги", "tags", columns, "tag_id", ["name"])
+        self.show_table_view("Теги", "tags", columns, "tag_id", schema.SEARCH_COLUMNS["tags"])
 
     def show_product_tags(self):
         """Отображение таблицы тегов товаров"""
@@ -722,11 +1626,29 @@ class OnlineStoreApp:
     def show_reviews(self):
         """Отображение таблицы отзывов"""
         columns = ("ID Отзыва", "ID Продукта", "ID Пользователя", "Рейтинг", "Текст", "Дата написания")
-        self.show_table_view("Отзывы", "product_reviews", columns, "review_id", ["review_text"])
+        self.show_table_view("Отзывы", "product_reviews", columns, "review_id",
+                             schema.SEARCH_COLUMNS["product_reviews"])
 
 
 # Запуск приложения
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Администрирование интернет-магазина")
+    parser.add_argument("--config", default=db.CONFIG_PATH, help="ini-файл с секцией [database]")
+    parser.add_argument("--db", help="файл базы данных")
+    parser.add_argument("--profile", choices=sorted(db.PROFILES), help="профиль настроек SQLite")
+    args = parser.parse_args()
+
+    # Аргументы командной строки важнее конфигурационного файла
+    db.configure(**db.load_config(args.config))
+    db.configure(path=args.db, profile=args.profile)
+    query_profiler.configure(**query_profiler.load_config(args.config))
+    credentials.configure(**credentials.load_config(args.config))
+    backup.configure(**backup.load_config(args.config))
+    archive.configure(**archive.load_config(args.config))
+
     root = tk.Tk()
     app = OnlineStoreApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.worker.close()
+    app.file_worker.close()
+    app.backups.stop()
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""Команды обслуживания магазина без графического интерфейса"""
+import argparse
+import asyncio
+import csv
+import sys
+
+import analytics
+import api_server
+import archive
+import backup
+import category_tree
+import credentials
+import db
+import exporter
+import importer
+import query_profiler
+import rating_stats
+import schema
+import search_index
+from paging import KeysetPager
+
+
+def open_database(args):
+    """Соединение с базой по аргументам --config/--db/--profile"""
+    db.configure(**db.load_config(args.config))
+    db.configure(path=args.db, profile=args.profile)
+    query_profiler.configure(**query_profiler.load_config(args.config))
+    credentials.configure(**credentials.load_config(args.config))
+    backup.configure(**backup.load_config(args.config))
+    archive.configure(**archive.load_config(args.config))
+    conn = db.connect()
+    schema.ensure_schema(conn)
+    return conn
+
+
+def cmd_import(args):
+    conn = open_database(args)
+
+    rejects_file = open(args.rejects, "w", encoding="utf-8", newline="") if args.rejects else None
+    rejects = csv.writer(rejects_file or sys.stderr)
+
+    def on_reject(line_no, row, reason):
+        rejects.writerow([line_no, reason, row])
+
+    def progress(result):
+        print(f"\r{args.table}: {result}", end="", file=sys.stderr, flush=True)
+
+    pool = credentials.process_pool() if args.hash_passwords else None
+    try:
+        result = importer.import_file(conn, args.table, args.file, args.format, args.batch_size,
+                                      progress, on_reject, args.hash_passwords, pool)
+    finally:
+        if pool:
+            pool.shutdown()
+        if rejects_file:
+            rejects_file.close()
+    print(f"\r{args.table}: {result}", file=sys.stderr)
+    return 1 if result.rejected else 0
+
+
+def cmd_export(args):
+    conn = open_database(args)
+    key_columns = schema.key_columns(args.table)
+    if args.search:
+        pager = search_index.search_pager(args.table, key_columns, schema.SEARCH_COLUMNS.get(args.table, []),
+                                          args.search, search_index.fts_table_exists(conn, args.table))
+    else:
+        pager = KeysetPager(args.table, key_columns)
+
+    count = exporter.export_pager(conn, pager, args.file, args.format)
+    print(f"{args.table}: выгружено строк {count}", file=sys.stderr)
+    return 0
+
+
+def cmd_rebuild_ratings(args):
+    conn = open_database(args)
+    count = rating_stats.rebuild(conn)
+    print(f"product_rating_stats: пересчитано товаров {count}", file=sys.stderr)
+    return 0
+
+
+def cmd_rebuild_categories(args):
+    conn = open_database(args)
+    count = category_tree.rebuild(conn)
+    print(f"category_closure: пар предок-потомок {count}", file=sys.stderr)
+    return 0
+
+
+def cmd_refresh_analytics(args):
+    conn = open_database(args)
+    new_orders, new_items = analytics.rebuild(conn) if args.rebuild else analytics.refresh(conn)
+    print(f"сводки продаж: учтено заказов {new_orders}, позиций {new_items}", file=sys.stderr)
+    return 0
+
+
+def cmd_bench_passwords(args):
+    params, elapsed = credentials.benchmark(args.target_ms, args.algorithm)
+    print(f"один хеш: {elapsed:.0f} мс; параметры для секции [credentials] в store.ini:", file=sys.stderr)
+    for name, value in params.items():
+        print(f"{name} = {value}")
+    return 0
+
+
+def cmd_archive_orders(args):
+    conn = open_database(args)
+    archive.configure(path=args.archive)
+
+    def progress(orders, items):
+        print(f"\rв архиве: заказов {orders}, позиций {items}", end="", file=sys.stderr, flush=True)
+
+    orders, items = archive.archive_orders(conn, args.days, args.batch_size, progress)
+    print(f"\rперенесено в {archive.settings['path']}: заказов {orders}, позиций {items}", file=sys.stderr)
+    return 0
+
+
+def cmd_backup(args):
+    open_database(args).close()
+    result = backup.create_snapshot(directory=args.dir, pages=args.pages)
+    print(result, file=sys.stderr)
+    for path in backup.rotate(args.dir, args.keep):
+        print(f"удалён старый снимок {path}", file=sys.stderr)
+    return 0
+
+
+def cmd_verify_backup(args):
+    ok, problems, warnings, counts = backup.verify(args.file)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    for warning in warnings:
+        print(f"предупреждение: {warning}", file=sys.stderr)
+    for table, count in counts.items():
+        print(f"{table}: {count}", file=sys.stderr)
+    print(f"{args.file}: {'исправен' if ok else 'повреждён'}", file=sys.stderr)
+    return 0 if ok else 1
+
+
+def cmd_restore_backup(args):
+    open_database(args).close()
+    result = backup.restore(args.file)
+    for warning in result.warnings:
+        print(f"предупреждение: {warning}", file=sys.stderr)
+    print(f"восстановлено из {args.file}: {result}", file=sys.stderr)
+    return 0
+
+
+def cmd_serve(args):
+    conn = open_database(args)
+    api_server.configure(**api_server.load_config(args.config))
+    api_server.configure(host=args.host, port=args.port, readers=args.readers)
+    use_fts = schema.ensure_schema(conn)
+    conn.close()
+
+    def ready(addresses):
+        for host, port, *_ in addresses:
+            print(f"API доступен на http://{host}:{port}/api/", file=sys.stderr)
+
+    try:
+        asyncio.run(api_server.serve(use_fts=use_fts, on_ready=ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Обслуживание базы интернет-магазина")
+    parser.add_argument("--config", default=db.CONFIG_PATH, help="ini-файл с секцией [database]")
+    parser.add_argument("--db", help="файл базы данных")
+    parser.add_argument("--profile", choices=sorted(db.PROFILES), help="профиль настроек SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import", help="импорт строк из CSV или JSON Lines")
+    p.add_argument("table", choices=sorted(schema.TABLE_COLUMNS))
+    p.add_argument("file")
+    p.add_argument("--format", choices=["csv", "jsonl"], help="по умолчанию - по расширению файла")
+    p.add_argument("--batch-size", type=int, default=importer.BATCH_SIZE)
+    p.add_argument("--rejects", help="CSV-файл для отклонённых строк (по умолчанию stderr)")
+    p.add_argument("--hash-passwords", action="store_true",
+                   help="столбец password_hash содержит пароли в открытом виде - захешировать их")
+    p.set_defaults(handler=cmd_import)
+
+    p = commands.add_parser("export", help="выгрузка таблицы или результата поиска")
+    p.add_argument("table", choices=sorted(schema.TABLE_COLUMNS))
+    p.add_argument("file")
+    p.add_argument("--format", choices=sorted(exporter.WRITERS), help="по умолчанию - по расширению файла")
+    p.add_argument("--search", help="выгрузить только результат поиска")
+    p.set_defaults(handler=cmd_export)
+
+    p = commands.add_parser("rebuild-ratings", help="пересчёт сводки оценок товаров по всем отзывам")
+    p.set_defaults(handler=cmd_rebuild_ratings)
+
+    p = commands.add_parser("rebuild-categories", help="пересчёт таблицы замыкания дерева категорий")
+    p.set_defaults(handler=cmd_rebuild_categories)
+
+    p = commands.add_parser("refresh-analytics", help="дополнение сводок продаж новыми заказами")
+    p.add_argument("--rebuild", action="store_true", help="пересчитать сводки по всей истории")
+    p.set_defaults(handler=cmd_refresh_analytics)
+
+    p = commands.add_parser("archive-orders", help="перенос старых доставленных и отменённых заказов в архив")
+    p.add_argument("--days", type=int, help="возраст заказа в днях (по умолчанию 365)")
+    p.add_argument("--batch-size", type=int, help="заказов в одной транзакции")
+    p.add_argument("--archive", help="файл базы архива")
+    p.set_defaults(handler=cmd_archive_orders)
+
+    p = commands.add_parser("backup", help="сжатый снимок базы без остановки приложения")
+    p.add_argument("--dir", help="каталог снимков (по умолчанию из секции [backup] или backups)")
+    p.add_argument("--keep", type=int, help="сколько последних снимков хранить")
+    p.add_argument("--pages", type=int, help="страниц базы за одну порцию копирования")
+    p.set_defaults(handler=cmd_backup)
+
+    p = commands.add_parser("verify-backup", help="проверка целостности снимка")
+    p.add_argument("file")
+    p.set_defaults(handler=cmd_verify_backup)
+
+    p = commands.add_parser("restore-backup", help="восстановление базы из проверенного снимка")
+    p.add_argument("file")
+    p.set_defaults(handler=cmd_restore_backup)
+
+    p = commands.add_parser("serve", help="HTTP/JSON API данных магазина")
+    p.add_argument("--host", help="адрес (по умолчанию из секции [api] или 127.0.0.1)")
+    p.add_argument("--port", type=int, help="порт (по умолчанию 8080)")
+    p.add_argument("--readers", type=int, help="соединений для чтения")
+    p.set_defaults(handler=cmd_serve)
+
+    p = commands.add_parser("bench-passwords", help="подбор рабочего фактора хеширования паролей")
+    p.add_argument("--target-ms", type=float, default=250.0, help="желаемое время одного хеша")
+    p.add_argument("--algorithm", choices=credentials.ALGORITHMS, default="pbkdf2_sha256")
+    p.set_defaults(handler=cmd_bench_passwords)
+
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    sys.exit(arguments.handler(arguments))
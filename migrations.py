@@ -0,0 +1,214 @@
+"""Версионные миграции схемы (номер версии хранится в PRAGMA user_version)"""
+import search_index
+
+# Каждая миграция - (версия, описание, SQL-скрипт или функция от соединения).
+# Миграции только добавляются в конец списка, уже выпущенные не меняются.
+MIGRATIONS = [
+    (1, "индексы для внешних ключей и выборок по заказам", """
+        CREATE INDEX IF NOT EXISTS idx_categories_parent ON categories(parent_category_id);
+        CREATE INDEX IF NOT EXISTS idx_products_category ON products(category_id);
+        CREATE INDEX IF NOT EXISTS idx_orders_user_date ON orders(user_id, order_date);
+        CREATE INDEX IF NOT EXISTS idx_order_items_order
+            ON order_items(order_id, product_id, quantity, unit_price);
+        CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id);
+        CREATE INDEX IF NOT EXISTS idx_product_tags_tag ON product_tags(tag_id, product_id);
+        CREATE INDEX IF NOT EXISTS idx_reviews_product ON product_reviews(product_id, rating);
+        CREATE INDEX IF NOT EXISTS idx_reviews_user ON product_reviews(user_id);
+        ANALYZE;
+    """),
+    (2, "индексы для сортировки и фильтров экранов таблиц", """
+        CREATE INDEX IF NOT EXISTS idx_products_price ON products(price);
+        CREATE INDEX IF NOT EXISTS idx_products_created ON products(created_at);
+        CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(order_date);
+        CREATE INDEX IF NOT EXISTS idx_orders_total ON orders(total_amount);
+        CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders(status, order_date);
+        CREATE INDEX IF NOT EXISTS idx_reviews_rating ON product_reviews(rating);
+        CREATE INDEX IF NOT EXISTS idx_reviews_created ON product_reviews(created_at);
+        CREATE INDEX IF NOT EXISTS idx_users_registration ON users(registration_date);
+        ANALYZE;
+    """),
+    (3, "сводка оценок товаров, обновляемая триггерами отзывов", """
+        CREATE TABLE IF NOT EXISTS product_rating_stats (
+            product_id INTEGER PRIMARY KEY,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            stars_1 INTEGER NOT NULL DEFAULT 0,
+            stars_2 INTEGER NOT NULL DEFAULT 0,
+            stars_3 INTEGER NOT NULL DEFAULT 0,
+            stars_4 INTEGER NOT NULL DEFAULT 0,
+            stars_5 INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+        );
+
+        CREATE TRIGGER IF NOT EXISTS product_reviews_stats_ai AFTER INSERT ON product_reviews BEGIN
+            INSERT OR IGNORE INTO product_rating_stats (product_id) VALUES (new.product_id);
+            UPDATE product_rating_stats SET
+                review_count = review_count + 1, rating_sum = rating_sum + new.rating,
+                stars_1 = stars_1 + (new.rating = 1), stars_2 = stars_2 + (new.rating = 2),
+                stars_3 = stars_3 + (new.rating = 3), stars_4 = stars_4 + (new.rating = 4),
+                stars_5 = stars_5 + (new.rating = 5)
+            WHERE product_id = new.product_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS product_reviews_stats_ad AFTER DELETE ON product_reviews BEGIN
+            UPDATE product_rating_stats SET
+                review_count = review_count - 1, rating_sum = rating_sum - old.rating,
+                stars_1 = stars_1 - (old.rating = 1), stars_2 = stars_2 - (old.rating = 2),
+                stars_3 = stars_3 - (old.rating = 3), stars_4 = stars_4 - (old.rating = 4),
+                stars_5 = stars_5 - (old.rating = 5)
+            WHERE product_id = old.product_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS product_reviews_stats_au AFTER UPDATE OF product_id, rating ON product_reviews
+        BEGIN
+            UPDATE product_rating_stats SET
+                review_count = review_count - 1, rating_sum = rating_sum - old.rating,
+                stars_1 = stars_1 - (old.rating = 1), stars_2 = stars_2 - (old.rating = 2),
+                stars_3 = stars_3 - (old.rating = 3), stars_4 = stars_4 - (old.rating = 4),
+                stars_5 = stars_5 - (old.rating = 5)
+            WHERE product_id = old.product_id;
+            INSERT OR IGNORE INTO product_rating_stats (product_id) VALUES (new.product_id);
+            UPDATE product_rating_stats SET
+                review_count = review_count + 1, rating_sum = rating_sum + new.rating,
+                stars_1 = stars_1 + (new.rating = 1), stars_2 = stars_2 + (new.rating = 2),
+                stars_3 = stars_3 + (new.rating = 3), stars_4 = stars_4 + (new.rating = 4),
+                stars_5 = stars_5 + (new.rating = 5)
+            WHERE product_id = new.product_id;
+        END;
+
+        DELETE FROM product_rating_stats;
+        INSERT INTO product_rating_stats
+        SELECT product_id, COUNT(*), SUM(rating), SUM(rating = 1), SUM(rating = 2), SUM(rating = 3),
+               SUM(rating = 4), SUM(rating = 5)
+        FROM product_reviews GROUP BY product_id;
+    """),
+    (4, "дневные сводки продаж для экрана аналитики", """
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            day TEXT PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            items_sold INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS sales_daily_category (
+            day TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            items_sold INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, category_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS sales_daily_product (
+            day TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            items_sold INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        );
+
+        -- Последние учтённые order_id и order_item_id
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO rollup_state (name) VALUES ('orders'), ('order_items');
+    """),
+    (5, "таблица замыкания дерева категорий", """
+        -- Все пары (предок, потомок) дерева категорий, включая (категория, категория)
+        CREATE TABLE IF NOT EXISTS category_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_category_closure_descendant ON category_closure(descendant_id, ancestor_id);
+
+        CREATE TRIGGER IF NOT EXISTS categories_closure_bi BEFORE INSERT ON categories
+        WHEN new.parent_category_id IS NOT NULL AND new.parent_category_id = new.category_id BEGIN
+            SELECT RAISE(ABORT, 'категория не может быть родителем самой себе');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS categories_closure_ai AFTER INSERT ON categories BEGIN
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth) VALUES (new.category_id, new.category_id, 0);
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, new.category_id, depth + 1 FROM category_closure
+            WHERE descendant_id = new.parent_category_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS categories_closure_bu BEFORE UPDATE OF parent_category_id ON categories
+        WHEN new.parent_category_id IS NOT NULL AND EXISTS (
+            SELECT 1 FROM category_closure
+            WHERE ancestor_id = new.category_id AND descendant_id = new.parent_category_id
+        ) BEGIN
+            SELECT RAISE(ABORT, 'родитель категории не может быть её потомком');
+        END;
+
+        -- Перенос поддерева: связи с прежними предками удаляются, с новыми - добавляются
+        CREATE TRIGGER IF NOT EXISTS categories_closure_au AFTER UPDATE OF parent_category_id ON categories
+        WHEN old.parent_category_id IS NOT new.parent_category_id BEGIN
+            DELETE FROM category_closure
+            WHERE descendant_id IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = new.category_id)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = new.category_id);
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth + 1
+            FROM category_closure up, category_closure down
+            WHERE up.descendant_id = new.parent_category_id AND down.ancestor_id = new.category_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS categories_closure_ad AFTER DELETE ON categories BEGIN
+            DELETE FROM category_closure WHERE descendant_id = old.category_id;
+            DELETE FROM category_closure WHERE ancestor_id = old.category_id;
+        END;
+
+        DELETE FROM category_closure;
+        INSERT OR IGNORE INTO category_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+            SELECT category_id, category_id, 0 FROM categories
+            UNION ALL
+            SELECT tree.ancestor_id, c.category_id, tree.depth + 1
+            FROM tree JOIN categories c ON c.parent_category_id = tree.descendant_id
+            WHERE tree.depth < 64
+        )
+        SELECT ancestor_id, descendant_id, MIN(depth) FROM tree GROUP BY ancestor_id, descendant_id;
+    """),
+    (6, "триггеры FTS5 только на изменение индексируемых столбцов", search_index.recreate_update_triggers),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Применение недостающих миграций к существующей базе.
+
+    Каждая миграция выполняется в своей транзакции вместе с записью нового
+    номера версии, поэтому прерванное обновление продолжится с той же миграции.
+    Возвращает список применённых версий.
+    """
+    version = schema_version(conn)
+    applied = []
+
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+
+        if conn.in_transaction:
+            conn.commit()
+        try:
+            if callable(step):
+                conn.execute("BEGIN")
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            else:
+                conn.executescript(f"BEGIN;\n{step}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        applied.append(number)
+
+    return applied
@@ -0,0 +1,113 @@
+"""Оформление заказов: заказ, его позиции и списание остатков в одной транзакции"""
+import sqlite3
+
+import db
+from repository import Store
+
+# Заказов в одной транзакции при пакетном оформлении
+BATCH_SIZE = 500
+
+
+class OrderError(ValueError):
+    """Заказ не может быть оформлен (нет товара, неверное количество и т.п.)"""
+
+
+class OutOfStock(OrderError):
+    """Товара на складе меньше, чем в заказе"""
+
+
+def normalize_items(items):
+    """Позиции заказа [(product_id, количество)] с проверкой значений"""
+    result = []
+    for product_id, quantity in items:
+        try:
+            product_id, quantity = int(product_id), int(quantity)
+        except (TypeError, ValueError):
+            raise OrderError(f"Неверная позиция заказа: {product_id} x {quantity}") from None
+        if quantity <= 0:
+            raise OrderError(f"Количество товара {product_id} должно быть больше нуля")
+        result.append((product_id, quantity))
+    if not result:
+        raise OrderError("В заказе нет позиций")
+    return result
+
+
+def insert_order(conn, order):
+    """Запись одного заказа внутри уже открытой транзакции; возвращает order_id.
+
+    order - словарь со столбцами orders (без total_amount) и ключом items:
+    [(product_id, количество)]. Цена позиции берётся из products.price,
+    сумма заказа считается как сумма unit_price * quantity. Остаток
+    уменьшается условным UPDATE, поэтому продать больше, чем есть, нельзя
+    даже при одновременной работе нескольких соединений.
+    """
+    items = normalize_items(order["items"])
+    product_ids = sorted({product_id for product_id, _ in items})
+    placeholders = ", ".join(["?"] * len(product_ids))
+    prices = dict(conn.execute(f"SELECT product_id, price FROM products "
+                               f"WHERE product_id IN ({placeholders}) AND is_active",
+                               product_ids).fetchall())
+
+    lines = []
+    for product_id, quantity in items:
+        if product_id not in prices:
+            raise OrderError(f"Товар {product_id} не найден или снят с продажи")
+        cursor = conn.execute("UPDATE products SET stock_quantity = stock_quantity - ? "
+                              "WHERE product_id = ? AND stock_quantity >= ?",
+                              (quantity, product_id, quantity))
+        if cursor.rowcount == 0:
+            raise OutOfStock(f"Недостаточно товара {product_id} на складе")
+        lines.append((product_id, quantity, prices[product_id]))
+
+    store = Store(conn)
+    values = {col: value for col, value in order.items() if col != "items"}
+    values["total_amount"] = round(sum(quantity * price for _, quantity, price in lines), 2)
+    order_id = store.orders.insert(values)
+    store.order_items.insert_many(("order_id", "product_id", "quantity", "unit_price"),
+                                  [(order_id,) + line for line in lines])
+    return order_id
+
+
+def place_order(conn, order):
+    """Оформление одного заказа в транзакции BEGIN IMMEDIATE; возвращает order_id"""
+    db.require_no_transaction(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        order_id = insert_order(conn, order)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return order_id
+
+
+def place_orders(conn, orders, batch_size=BATCH_SIZE, on_reject=None):
+    """Пакетное оформление заказов: одна транзакция (и один fsync) на пакет.
+
+    Каждый заказ выполняется в своей точке сохранения, поэтому заказ, который
+    нельзя оформить, откатывается один и передаётся в on_reject(номер, заказ,
+    причина), а остальные заказы пакета записываются. Возвращает список
+    order_id (None для отклонённых заказов).
+    """
+    db.require_no_transaction(conn)
+
+    order_ids = []
+    orders = list(orders)
+    for start in range(0, len(orders), batch_size):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for number, order in enumerate(orders[start:start + batch_size], start=start):
+                conn.execute("SAVEPOINT place_order")
+                try:
+                    order_ids.append(insert_order(conn, order))
+                except (OrderError, sqlite3.IntegrityError) as e:
+                    conn.execute("ROLLBACK TO place_order")
+                    order_ids.append(None)
+                    if on_reject:
+                        on_reject(number, order, str(e))
+                conn.execute("RELEASE place_order")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    return order_ids
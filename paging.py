@@ -0,0 +1,184 @@
+"""Постраничная выборка строк по ключу (keyset pagination) для Treeview"""
+
+# Размер страницы, подгружаемой при прокрутке, и запас строк сверх видимой области
+PAGE_SIZE = 100
+PREFETCH_ROWS = 100
+
+
+class KeysetPager:
+    """Источник данных, который читает таблицу окнами, двигаясь по ключу.
+
+    Вместо OFFSET запоминается ключ первой и последней загруженной строки,
+    поэтому стоимость следующей страницы не зависит от размера таблицы.
+    Каждая строка возвращается как пара (ключ, значения).
+
+    Для сортировки по столбцу ключом служит (столбец, первичный ключ),
+    descending=True упорядочивает по убыванию, nullable=True - если в столбце
+    сортировки бывают NULL.
+    """
+
+    def __init__(self, table_name, key_columns, columns="*", where="", params=(), page_size=100, joins="",
+                 descending=False, nullable=False):
+        self.table_name = table_name
+        self.joins = joins
+        self.key_columns = tuple(key_columns)
+        self.columns = columns
+        self.where = where
+        self.params = tuple(params)
+        self.page_size = page_size
+        self.descending = descending
+        self.nullable = nullable
+
+        # Источник - вся таблица в порядке первичного ключа
+        self.unfiltered = not where and not joins and not descending
+
+        # Выражение FROM (например, представление с псевдонимом таблицы) и функция от
+        # соединения, подготавливающая его перед запросом (например, ATTACH архива)
+        self.source = table_name
+        self.prepare = None
+
+        self.first_key = None
+        self.last_key = None
+        self.at_start = True
+        self.at_end = False
+
+    def build_query(self, key=None, forward=True, limit=None, extra=None):
+        """Построение запроса для страницы после (или до) ключа key"""
+        keys = ", ".join(self.key_columns)
+        conditions = []
+        params = list(self.params)
+
+        if self.where:
+            conditions.append(f"({self.where})")
+        if extra:
+            conditions.append(extra)
+        if key is not None:
+            condition, key_params = self.key_condition(key, greater=forward != self.descending)
+            conditions.append(condition)
+            params.extend(key_params)
+
+        direction = "ASC" if forward != self.descending else "DESC"
+        order = ", ".join(f"{col} {direction}" for col in self.key_columns)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        query = f"SELECT {keys}, {self.columns} FROM {self.source}{self.joins}{where} ORDER BY {order} LIMIT ?"
+        params.append(limit or self.page_size)
+        return query, params
+
+    def key_condition(self, key, greater):
+        """Условие "ключ строки больше (меньше) key".
+
+        NULL считается меньше любого значения, как в ORDER BY. Пустым может
+        быть только первый столбец ключа (столбец сортировки), остальные -
+        первичный ключ. Без NULL в key используется сравнение кортежей, которое
+        SQLite выполняет поиском по индексу (строки с NULL оно не выбирает, их
+        дочитывает _fetch); иначе условие раскрывается по столбцам.
+        """
+        if None not in key:
+            placeholders = ", ".join(["?"] * len(key))
+            return f"({', '.join(self.key_columns)}) {'>' if greater else '<'} ({placeholders})", list(key)
+
+        parts, params = [], []
+        prefix, prefix_params = [], []
+        for col, value in zip(self.key_columns, key):
+            if value is None:
+                part, part_params = (f"{col} IS NOT NULL", []) if greater else (None, [])
+            elif greater:
+                part, part_params = f"{col} > ?", [value]
+            else:
+                part, part_params = f"({col} < ? OR {col} IS NULL)", [value]
+            if part:
+                parts.append(" AND ".join(prefix + [part]))
+                params.extend(prefix_params + part_params)
+            prefix.append(f"{col} IS ?")
+            prefix_params.append(value)
+        return (f"({' OR '.join(parts)})" if parts else "0"), params
+
+    def full_query(self):
+        """Запрос всех строк источника (без ключей и LIMIT) - для экспорта"""
+        where = f" WHERE {self.where}" if self.where else ""
+        direction = " DESC" if self.descending else ""
+        order = ", ".join(f"{col}{direction}" for col in self.key_columns)
+        query = f"SELECT {self.columns} FROM {self.source}{self.joins}{where} ORDER BY {order}"
+        return query, list(self.params)
+
+    def _fetch(self, conn, key, forward, limit):
+        if self.prepare:
+            self.prepare(conn)
+        rows = conn.execute(*self.build_query(key, forward, limit)).fetchall()
+
+        # При движении по убыванию строки с NULL в столбце сортировки идут последними
+        if (self.nullable and key is not None and None not in key and forward == self.descending
+                and len(rows) < limit):
+            rows += conn.execute(*self.build_query(None, forward, limit - len(rows),
+                                                   f"{self.key_columns[0]} IS NULL")).fetchall()
+
+        size = len(self.key_columns)
+        return [(tuple(row[:size]), tuple(row[size:])) for row in rows]
+
+    # Методы read_* только читают страницу и возвращают (строки, новое положение):
+    # так страницу можно прочитать в фоновом потоке, а положение источника
+    # изменить через apply() в потоке, который им пользуется
+
+    def read_first(self, conn, limit=None):
+        """Первая страница и положение после неё"""
+        limit = limit or self.page_size
+        rows = self._fetch(conn, None, True, limit)
+        return rows, {"at_start": True, "at_end": len(rows) < limit,
+                      "first_key": rows[0][0] if rows else None, "last_key": rows[-1][0] if rows else None}
+
+    def read_next(self, conn, key, limit=None):
+        """Страница после ключа key и положение конца окна после неё"""
+        limit = limit or self.page_size
+        rows = self._fetch(conn, key, True, limit)
+        state = {"at_end": len(rows) < limit}
+        if rows:
+            state["last_key"] = rows[-1][0]
+        return rows, state
+
+    def read_prev(self, conn, key, limit=None):
+        """Страница перед ключом key и положение начала окна после неё"""
+        limit = limit or self.page_size
+        rows = self._fetch(conn, key, False, limit)
+        rows.reverse()
+        state = {"at_start": len(rows) < limit}
+        if rows:
+            state["first_key"] = rows[0][0]
+        return rows, state
+
+    def apply(self, state):
+        """Применение положения, возвращённого read_*"""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def fetch_first(self, conn, limit=None):
+        """Первая страница (сбрасывает текущее положение)"""
+        rows, state = self.read_first(conn, limit)
+        self.apply(state)
+        return rows
+
+    def fetch_next(self, conn, limit=None):
+        """Следующая страница после последней загруженной строки"""
+        if self.at_end or self.last_key is None:
+            return []
+        rows, state = self.read_next(conn, self.last_key, limit)
+        self.apply(state)
+        return rows
+
+    def fetch_prev(self, conn, limit=None):
+        """Предыдущая страница перед первой загруженной строкой"""
+        if self.at_start or self.first_key is None:
+            return []
+        rows, state = self.read_prev(conn, self.first_key, limit)
+        self.apply(state)
+        return rows
+
+    def trim_front(self, key):
+        """Строки до ключа key выгружены из окна"""
+        self.first_key = key
+        self.at_start = False
+
+    def trim_back(self, key):
+        """Строки после ключа key выгружены из окна"""
+        self.last_key = key
+        self.at_end = False
@@ -0,0 +1,314 @@
+"""Профилирование запросов: время, число строк и экран для каждого выполненного SQL.
+
+Соединения, открытые db.connect() при включённом профилировании, создаются
+классом ProfiledConnection: его курсоры засекают время execute и чтения
+строк. По каждому тексту запроса копятся длительности для p50/p95, медленные
+запросы пишутся в журнал (по желанию - вместе с EXPLAIN QUERY PLAN).
+
+Профилирование замедляет чтение строк в несколько раз, поэтому по
+умолчанию выключено и включается в store.ini на время поиска медленных мест.
+"""
+import configparser
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+CONFIG_PATH = "store.ini"
+
+# Последних выполнений одного запроса, по которым считаются процентили
+SAMPLES_PER_STATEMENT = 1000
+# Последних медленных запросов, показываемых на панели
+RECENT_SLOW = 200
+
+settings = {
+    "enabled": False,
+    "slow_ms": 100.0,
+    # Порог для EXPLAIN QUERY PLAN; None - план не снимается
+    "explain_ms": None,
+    "log": "slow_queries.log",
+}
+
+slow_log = logging.getLogger("store.slow_queries")
+slow_log.propagate = False
+
+_screen = threading.local()
+
+
+def load_config(config_path=CONFIG_PATH):
+    """Чтение секции [profiling] из ini-файла: enabled, slow_ms, explain_ms, log"""
+    parser = configparser.ConfigParser()
+    if not parser.read(config_path, encoding="utf-8") or not parser.has_section("profiling"):
+        return {}
+    section = parser["profiling"]
+    config = {}
+    if "enabled" in section:
+        config["enabled"] = section.getboolean("enabled")
+    for name in ("slow_ms", "explain_ms"):
+        if name in section:
+            config[name] = section.getfloat(name)
+    if "log" in section:
+        config["log"] = section["log"]
+    return config
+
+
+def configure(enabled=None, slow_ms=None, explain_ms=None, log=None):
+    """Изменение настроек профилирования и открытие журнала медленных запросов"""
+    for name, value in (("enabled", enabled), ("slow_ms", slow_ms), ("explain_ms", explain_ms), ("log", log)):
+        if value is not None:
+            settings[name] = value
+
+    for handler in list(slow_log.handlers):
+        slow_log.removeHandler(handler)
+        handler.close()
+    if settings["enabled"] and settings["log"]:
+        handler = logging.FileHandler(settings["log"], encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.INFO)
+
+
+def set_screen(name):
+    """Экран, от имени которого текущий поток выполняет запросы"""
+    _screen.name = name
+
+
+def current_screen():
+    return getattr(_screen, "name", None)
+
+
+def params_shape(params, many=False):
+    """Форма параметров без значений: (int, str, None) или 100 x (int, str)"""
+    def shape(values):
+        if isinstance(values, dict):
+            return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in values.items()) + "}"
+        return "(" + ", ".join("None" if value is None else type(value).__name__ for value in values) + ")"
+
+    if many:
+        if not isinstance(params, (list, tuple)):
+            return "[...]"
+        return f"{len(params)} x {shape(params[0])}" if params else "0 x ()"
+    return shape(params or ())
+
+
+class QueryRecord:
+    """Одно выполнение запроса; время и строки дополняются при чтении результата"""
+    __slots__ = ("sql", "text", "shape", "screen", "started", "duration", "rows", "error", "plan", "logged",
+                 "explained")
+
+    def __init__(self, text, shape):
+        self.sql = re.sub(r"\s+", " ", text).strip()
+        self.text = text
+        self.shape = shape
+        self.screen = current_screen()
+        self.started = time.time()
+        self.duration = 0.0
+        self.rows = 0
+        self.error = None
+        self.plan = None
+        self.logged = False
+        self.explained = False
+
+    def __str__(self):
+        text = (f"{self.duration * 1000:.1f} мс, строк {self.rows}, экран {self.screen or '-'}, "
+                f"параметры {self.shape}: {self.sql}")
+        if self.error:
+            text += f" [ошибка: {self.error}]"
+        if self.plan:
+            text += " | план: " + "; ".join(self.plan)
+        return text
+
+
+class StatementStats:
+    """Выполнения одного текста запроса"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.records = deque(maxlen=SAMPLES_PER_STATEMENT)
+        self.screens = set()
+
+
+class Profiler:
+    """Статистика запросов всех соединений процесса"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = {}
+        self.recent_slow = deque(maxlen=RECENT_SLOW)
+
+    def add(self, record):
+        with self.lock:
+            stats = self.statements.get(record.sql)
+            if stats is None:
+                stats = self.statements[record.sql] = StatementStats()
+            stats.calls += 1
+            stats.errors += record.error is not None
+            stats.screens.add(record.screen or "-")
+            stats.records.append(record)
+
+    def check_slow(self, conn, record, params=None):
+        """Запись в журнал, когда выполнение превысило slow_ms, и ещё раз - с планом,
+        когда оно (например, при дочитывании строк) превысило explain_ms"""
+        duration_ms = record.duration * 1000
+        if duration_ms < settings["slow_ms"]:
+            return
+        explain_ms = settings["explain_ms"]
+        need_plan = (explain_ms is not None and duration_ms >= explain_ms and not record.explained
+                     and record.error is None)
+        if record.logged and not need_plan:
+            return
+        if need_plan:
+            record.explained = True
+            record.plan = explain(conn, record.text, params)
+        if not record.logged:
+            record.logged = True
+            with self.lock:
+                self.recent_slow.append(record)
+        slow_log.info("%s", record)
+
+    def report(self):
+        """Сводка: [(sql, экраны, вызовов, ошибок, p50 мс, p95 мс, max мс, строк в среднем)],
+        самые затратные по суммарному времени - первыми"""
+        with self.lock:
+            items = [(sql, stats.screens.copy(), stats.calls, stats.errors, list(stats.records))
+                     for sql, stats in self.statements.items()]
+        report = []
+        for sql, screens, calls, errors, records in items:
+            durations = sorted(record.duration for record in records)
+            rows = sum(record.rows for record in records) / len(records)
+            report.append((sql, ", ".join(sorted(screens)), calls, errors, percentile(durations, 50) * 1000,
+                           percentile(durations, 95) * 1000, durations[-1] * 1000, rows, sum(durations)))
+        report.sort(key=lambda row: row[-1], reverse=True)
+        return [row[:-1] for row in report]
+
+    def slow_queries(self):
+        with self.lock:
+            return list(self.recent_slow)
+
+    def reset(self):
+        with self.lock:
+            self.statements.clear()
+            self.recent_slow.clear()
+
+
+profiler = Profiler()
+
+
+def percentile(sorted_values, p):
+    """Процентиль p отсортированного списка (метод ближайшего ранга)"""
+    rank = -(-p * len(sorted_values) // 100)
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def explain(conn, text, params):
+    """Строки EXPLAIN QUERY PLAN; None, если план снять нельзя"""
+    if not re.match(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", text, re.IGNORECASE):
+        return None
+    try:
+        # Базовый execute - сам EXPLAIN в статистику не попадает
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + text, params or ()).fetchall()
+    except sqlite3.Error:
+        return None
+    return [row[-1] for row in rows]
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор, засекающий время выполнения и чтения строк"""
+    record = None
+    # Параметры текущего запроса - только для EXPLAIN QUERY PLAN; в статистике не хранятся
+    params = None
+
+    def _run(self, method, text, params, shape):
+        record = QueryRecord(text, shape)
+        self.record = record
+        self.params = params if settings["explain_ms"] is not None else None
+        start = time.perf_counter()
+        try:
+            return method()
+        except Exception as e:
+            record.error = str(e)
+            raise
+        finally:
+            record.duration += time.perf_counter() - start
+            if record.error is None and self.description is None and self.rowcount > 0:
+                record.rows = self.rowcount
+            profiler.add(record)
+            profiler.check_slow(self.connection, record, self.params)
+
+    def execute(self, sql, parameters=()):
+        return self._run(lambda: super(ProfiledCursor, self).execute(sql, parameters), sql, parameters,
+                         params_shape(parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(lambda: super(ProfiledCursor, self).executemany(sql, seq_of_parameters), sql, None,
+                         params_shape(seq_of_parameters, many=True))
+
+    def executescript(self, sql_script):
+        return self._run(lambda: super(ProfiledCursor, self).executescript(sql_script), sql_script, None, "()")
+
+    def _fetched(self, start, rows):
+        record = self.record
+        if record is not None:
+            record.duration += time.perf_counter() - start
+            record.rows += rows
+            profiler.check_slow(self.connection, record, self.params)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0)
+            raise
+        self._fetched(start, 1)
+        return row
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Соединение, все запросы которого проходят через ProfiledCursor"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        # Время фиксации (fsync) учитывается как запрос COMMIT
+        if not self.in_transaction:
+            return super().commit()
+        record = QueryRecord("COMMIT", "()")
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            record.duration = time.perf_counter() - start
+            profiler.add(record)
+            profiler.check_slow(self, record)
@@ -0,0 +1,144 @@
+"""Фоновое выполнение запросов к SQLite, чтобы окно Tk не зависало"""
+import queue
+import sqlite3
+import threading
+import traceback
+
+import query_profiler
+
+
+class QueryWorker:
+    """Поток с собственным соединением, выполняющий задания по очереди.
+
+    connect - функция без аргументов, открывающая соединение для потока.
+
+    Задание - функция, принимающая соединение. Результат возвращается в поток
+    Tk через опрос очереди в root.after. Задания помечаются тегом (например,
+    "view" для данных текущего экрана); cancel(tag) отбрасывает все ещё не
+    доставленные результаты с этим тегом и прерывает выполняющийся запрос.
+
+    on_external_write() вызывается в потоке перед заданием, если с прошлого
+    задания базу изменило другое соединение (PRAGMA data_version), - чтобы
+    сбросить кэши, которые обновляются только записями самого приложения.
+    """
+
+    def __init__(self, root, connect, poll_interval=30, on_external_write=None):
+        self.root = root
+        self.connect = connect
+        self.poll_interval = poll_interval
+        self.on_external_write = on_external_write
+        self.data_version = None
+
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generations = {}
+        # Поставленные, но ещё не доставленные задания по тегам
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.conn = None
+        self.current_tag = None
+
+        self.thread = threading.Thread(target=self.run, name="query-worker", daemon=True)
+        self.thread.start()
+        self.poll_job = self.root.after(self.poll_interval, self.poll)
+
+    def submit(self, job, on_done=None, on_error=None, tag=None):
+        """Постановка задания в очередь"""
+        with self.lock:
+            generation = self.generations.get(tag, 0)
+            self.pending[tag] = self.pending.get(tag, 0) + 1
+        # Запросы задания относятся к экрану, с которого оно поставлено
+        self.jobs.put((job, on_done, on_error, tag, generation, query_profiler.current_screen()))
+
+    def cancel(self, tag):
+        """Отмена всех заданий с тегом tag, поставленных до этого вызова"""
+        with self.lock:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+            if tag is not None and self.current_tag == tag and self.conn is not None:
+                self.conn.interrupt()
+
+    def is_stale(self, tag, generation):
+        with self.lock:
+            return self.generations.get(tag, 0) != generation
+
+    def busy(self, tag):
+        """Есть ли задания с тегом tag, результат которых ещё не доставлен"""
+        with self.lock:
+            return self.pending.get(tag, 0) > 0
+
+    def finished(self, tag):
+        with self.lock:
+            self.pending[tag] -= 1
+
+    def run(self):
+        """Основной цикл потока"""
+        # Соединение создаётся в самом потоке и используется только им
+        self.conn = self.connect()
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                break
+
+            job, on_done, on_error, tag, generation, screen = item
+            with self.lock:
+                if self.generations.get(tag, 0) != generation:
+                    self.pending[tag] -= 1
+                    continue
+                self.current_tag = tag
+            query_profiler.set_screen(screen)
+
+            result, error = None, None
+            try:
+                self.check_external_write()
+                result = job(self.conn)
+            except Exception as e:
+                error = e
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+            finally:
+                with self.lock:
+                    self.current_tag = None
+
+            self.results.put((on_done, on_error, tag, generation, result, error))
+        self.conn.close()
+
+    def check_external_write(self):
+        if self.on_external_write is None:
+            return
+        # Базовый execute - проверка перед каждым заданием не попадает в статистику профилировщика
+        version = sqlite3.Connection.execute(self.conn, "PRAGMA data_version").fetchone()[0]
+        if self.data_version is not None and version != self.data_version:
+            self.on_external_write()
+        self.data_version = version
+
+    def poll(self):
+        """Доставка готовых результатов в потоке Tk"""
+        try:
+            while True:
+                try:
+                    on_done, on_error, tag, generation, result, error = self.results.get_nowait()
+                except queue.Empty:
+                    break
+
+                self.finished(tag)
+                if self.is_stale(tag, generation):
+                    continue
+                # Ошибка в обработчике одного результата не должна останавливать доставку остальных
+                try:
+                    if error is not None:
+                        if on_error:
+                            on_error(error)
+                        else:
+                            print(f"Ошибка SQL: {error}")
+                    elif on_done:
+                        on_done(result)
+                except Exception:
+                    traceback.print_exc()
+        finally:
+            self.poll_job = self.root.after(self.poll_interval, self.poll)
+
+    def close(self):
+        """Остановка потока после выполнения уже поставленных заданий"""
+        self.root.after_cancel(self.poll_job)
+        self.jobs.put(None)
+        self.thread.join()
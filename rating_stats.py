@@ -0,0 +1,39 @@
+"""Сводка оценок товаров (product_rating_stats): число отзывов, сумма и гистограмма оценок.
+
+Таблица создаётся миграцией 3 и обновляется триггерами product_reviews,
+поэтому средняя оценка товара читается одной строкой без GROUP BY по отзывам.
+"""
+import db
+
+REBUILD_SQL = """
+    INSERT INTO product_rating_stats
+    SELECT product_id, COUNT(*), SUM(rating), SUM(rating = 1), SUM(rating = 2), SUM(rating = 3),
+           SUM(rating = 4), SUM(rating = 5)
+    FROM product_reviews GROUP BY product_id
+"""
+
+
+def rebuild(conn):
+    """Пересчёт сводки по всем отзывам (после массовых правок в обход триггеров).
+
+    Возвращает число товаров с отзывами.
+    """
+    db.require_no_transaction(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM product_rating_stats")
+        count = conn.execute(REBUILD_SQL).rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return count
+
+
+def product_stats(conn, product_id):
+    """Сводка по товару: (число отзывов, средняя оценка, [число оценок 1..5])"""
+    row = conn.execute("SELECT review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5 "
+                       "FROM product_rating_stats WHERE product_id = ?", (product_id,)).fetchone()
+    if row is None or row[0] == 0:
+        return 0, None, [0] * 5
+    return row[0], row[1] / row[0], list(row[2:])
@@ -0,0 +1,369 @@
+"""Доступ к данным магазина без графического интерфейса (по репозиторию на таблицу)"""
+import datetime
+import json
+from collections import namedtuple
+
+import archive
+import category_tree
+import schema
+import search_index
+from paging import KeysetPager
+
+# Строки таблиц - именованные кортежи с полями в порядке столбцов
+User = namedtuple("User", schema.TABLE_COLUMNS["users"])
+Category = namedtuple("Category", schema.TABLE_COLUMNS["categories"])
+Product = namedtuple("Product", schema.TABLE_COLUMNS["products"])
+Order = namedtuple("Order", schema.TABLE_COLUMNS["orders"])
+OrderItem = namedtuple("OrderItem", schema.TABLE_COLUMNS["order_items"])
+Tag = namedtuple("Tag", schema.TABLE_COLUMNS["tags"])
+ProductTag = namedtuple("ProductTag", schema.TABLE_COLUMNS["product_tags"])
+ProductReview = namedtuple("ProductReview", schema.TABLE_COLUMNS["product_reviews"])
+
+
+class Repository:
+    """Операции над одной таблицей.
+
+    Тексты запросов строятся один раз и берутся из кэша класса, поэтому
+    одинаковые операции отправляют в SQLite один и тот же SQL и попадают в кэш
+    подготовленных выражений соединения (sqlite3.connect(cached_statements=...)).
+    """
+    table_name = None
+    row_type = None
+
+    # Дополнительные столбцы строк экрана таблицы (после столбцов таблицы) и их JOIN
+    view_columns = ""
+    view_joins = ""
+
+    _sql_cache = {}
+    _names_cache = {}
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.key_columns = schema.key_columns(self.table_name)
+
+    def sql(self, operation, columns=()):
+        """Текст запроса для операции над столбцами columns"""
+        cache_key = (self.table_name, operation, tuple(columns))
+        query = self._sql_cache.get(cache_key)
+        if query is None:
+            query = self._sql_cache[cache_key] = self.build_sql(operation, columns)
+        return query
+
+    def build_sql(self, operation, columns):
+        key_condition = " AND ".join(f"{col} = ?" for col in self.key_columns)
+        if operation == "get":
+            return f"SELECT * FROM {self.table_name} WHERE {key_condition}"
+        if operation == "view_row":
+            key_condition = " AND ".join(f"{self.table_name}.{col} = ?" for col in self.key_columns)
+            return (f"SELECT {self.table_name}.*{self.view_columns} FROM {self.table_name}{self.view_joins} "
+                    f"WHERE {key_condition}")
+        if operation == "insert":
+            return (f"INSERT INTO {self.table_name} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join(['?'] * len(columns))})")
+        if operation == "update":
+            updates = ", ".join(f"{col} = ?" for col in columns)
+            return f"UPDATE {self.table_name} SET {updates} WHERE {key_condition}"
+        if operation == "delete":
+            return f"DELETE FROM {self.table_name} WHERE {key_condition}"
+        raise ValueError(f"Неизвестная операция {operation}")
+
+    def make_row(self, cursor, row):
+        return self.row_type._make(row)
+
+    def get(self, *key):
+        """Запись по первичному ключу или None"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = self.make_row
+        return cursor.execute(self.sql("get"), key).fetchone()
+
+    def get_many(self, keys):
+        """Записи по списку значений первичного ключа (одним запросом IN), по возрастанию ключа"""
+        if not keys:
+            return []
+        id_column = self.key_columns[0]
+        cursor = self.conn.cursor()
+        cursor.row_factory = self.make_row
+        return cursor.execute(f"SELECT * FROM {self.table_name} WHERE {id_column} IN ({', '.join(['?'] * len(keys))}) "
+                              f"ORDER BY {id_column}", list(keys)).fetchall()
+
+    def view_row(self, *key):
+        """Строка для экрана таблицы (с дополнительными столбцами) или None"""
+        return self.conn.execute(self.sql("view_row"), key).fetchone()
+
+    def view_names(self):
+        """Названия столбцов строк экрана таблицы (view_row и источников view_pager)"""
+        names = self._names_cache.get(self.table_name)
+        if names is None:
+            cursor = self.conn.execute(f"SELECT {self.table_name}.*{self.view_columns} "
+                                       f"FROM {self.table_name}{self.view_joins} LIMIT 0")
+            names = self._names_cache[self.table_name] = tuple(col[0] for col in cursor.description)
+        return names
+
+    def insert(self, values):
+        """Добавление записи из словаря {столбец: значение}; возвращает rowid"""
+        columns = list(values)
+        return self.conn.execute(self.sql("insert", columns), [values[col] for col in columns]).lastrowid
+
+    def insert_many(self, columns, rows):
+        """Добавление многих строк одним executemany"""
+        return self.conn.executemany(self.sql("insert", columns), rows).rowcount
+
+    def update(self, key, values):
+        """Изменение записи; key - значение ключа или кортеж для составного ключа"""
+        key = key if isinstance(key, tuple) else (key,)
+        columns = list(values)
+        return self.conn.execute(self.sql("update", columns), [values[col] for col in columns] + list(key)).rowcount
+
+    def delete(self, *key):
+        return self.conn.execute(self.sql("delete"), key).rowcount
+
+    def selection_condition(self, keys=None, pager=None):
+        """Условие WHERE для массовой операции: записи с ключами keys или все строки источника pager.
+
+        Условие относится только к самой таблице: если источник pager читает
+        и архив (pager.source - представление), архивные строки не затрагиваются.
+        """
+        table = self.table_name
+        target = ", ".join(f"{table}.{col}" for col in self.key_columns)
+        if len(self.key_columns) > 1:
+            target = f"({target})"
+        if pager is not None:
+            where = f" WHERE {pager.where}" if pager.where else ""
+            columns = ", ".join(f"{table}.{col}" for col in self.key_columns)
+            return f"{target} IN (SELECT {columns} FROM {table}{pager.joins}{where})", list(pager.params)
+
+        # Ключи передаются одним параметром JSON, поэтому их число не ограничено числом параметров запроса
+        if len(self.key_columns) > 1:
+            values = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(self.key_columns)))
+        else:
+            values = "value"
+            keys = [key[0] if isinstance(key, (tuple, list)) else key for key in keys]
+        return f"{target} IN (SELECT {values} FROM json_each(?))", [json.dumps(list(keys))]
+
+    def bulk_update(self, column, value, keys=None, pager=None):
+        """Изменение столбца у многих записей одним запросом UPDATE; возвращает число изменённых записей.
+
+        Записи задаются списком ключей keys или источником pager (все строки,
+        подходящие под его поиск и фильтры). Для вида percent значение -
+        изменение текущего значения в процентах.
+        """
+        kind = schema.BULK_FIELDS.get(self.table_name, {}).get(column)
+        if kind is None:
+            raise ValueError(f"Столбец {column} таблицы {self.table_name} нельзя изменить массово")
+        value = parse_bulk_value(kind, column, value)
+        if kind == "percent":
+            assignment = f"{column} = ROUND({column} * (100 + ?) / 100, 2)"
+        else:
+            assignment = f"{column} = ?"
+        condition, params = self.selection_condition(keys, pager)
+        return self.conn.execute(f"UPDATE {self.table_name} SET {assignment} WHERE {condition}",
+                                 [value] + params).rowcount
+
+    def bulk_delete(self, keys=None, pager=None):
+        """Удаление многих записей одним запросом DELETE; возвращает число удалённых записей"""
+        condition, params = self.selection_condition(keys, pager)
+        return self.conn.execute(f"DELETE FROM {self.table_name} WHERE {condition}", params).rowcount
+
+    def pager(self, page_size=100):
+        """Постраничный источник всех строк таблицы"""
+        pager = KeysetPager(self.table_name, [f"{self.table_name}.{col}" for col in self.key_columns],
+                            columns=f"{self.table_name}.*{self.view_columns}", page_size=page_size,
+                            joins=self.view_joins)
+        # Дополнительный LEFT JOIN строк не отбирает
+        pager.unfiltered = True
+        return pager
+
+    def search_pager(self, search_term, use_fts=True, page_size=100):
+        """Постраничный источник результатов поиска"""
+        return self.view_pager(search_term, use_fts, page_size=page_size)
+
+    def view_pager(self, search_term="", use_fts=True, filters=None, sort=None, page_size=100, within=None,
+                   include_archive=False):
+        """Источник данных экрана таблицы: поиск, фильтры и сортировка выполняются в SQL.
+
+        filters - {столбец: (от, до)} для диапазонов или {столбец: значение},
+        sort - (столбец, по убыванию) или None (порядок первичного ключа, а при
+        полнотекстовом поиске - релевантности), within - значения первичного
+        ключа, среди которых ищутся строки, include_archive - читать и архивные
+        строки (представление archive.ARCHIVED_TABLES). Неверное значение
+        фильтра - ValueError.
+        """
+        include_archive = include_archive and self.table_name in archive.ARCHIVED_TABLES
+        if not search_term and not filters and not sort and within is None and not include_archive:
+            return self.pager(page_size)
+
+        table = self.table_name
+        joins, conditions, params, rank = "", [], [], None
+        if include_archive:
+            # Индекс FTS5 есть только у оперативной таблицы
+            use_fts = False
+        if search_term:
+            joins, where, params, rank = search_index.search_condition(
+                table, schema.SEARCH_COLUMNS.get(table, []), search_term, use_fts)
+            conditions.append(f"({where})")
+        for column, value in (filters or {}).items():
+            condition, values = self.filter_condition(column, value)
+            if condition:
+                conditions.append(condition)
+                params += values
+        if within is not None:
+            conditions.append(f"{table}.{self.key_columns[0]} IN ({', '.join(['?'] * len(within)) or 'NULL'})")
+            params += list(within)
+
+        key_columns = tuple(f"{table}.{col}" for col in self.key_columns)
+        if sort:
+            column, descending = sort
+            if column not in schema.TABLE_COLUMNS[table]:
+                raise ValueError(f"Неизвестный столбец {column}")
+            key_columns = (f"{table}.{column}",) + key_columns
+        elif rank:
+            key_columns = (rank,) + key_columns
+            descending = False
+        else:
+            descending = False
+
+        pager = KeysetPager(table, key_columns, columns=f"{table}.*{self.view_columns}",
+                            where=" AND ".join(conditions), params=params, page_size=page_size,
+                            joins=self.view_joins + joins, descending=descending,
+                            nullable=bool(sort))
+        # Порядок строк отличается от первичного ключа - новые записи не вставляются по месту
+        pager.unfiltered = False
+        if include_archive:
+            pager.source = f"{archive.ARCHIVED_TABLES[table]} AS {table}"
+            pager.prepare = archive.attach
+        return pager
+
+    def filter_condition(self, column, value):
+        """Условие WHERE и параметры для одного фильтра; пустой фильтр - ("", [])"""
+        kind = schema.FILTERS[self.table_name][column]
+        name = f"{self.table_name}.{column}"
+        if kind == "category":
+            if value in (None, ""):
+                return "", []
+            return category_tree.SUBTREE_CONDITION.format(column=name), [int(str(value).split(" - ")[0])]
+        if kind not in schema.RANGE_FILTERS:
+            if value in (None, ""):
+                return "", []
+            return f"{name} = ?", [value]
+
+        parts, params = [], []
+        low, high = value
+        if low not in (None, ""):
+            parts.append(f"{name} >= ?")
+            params.append(parse_filter_value(kind, column, low))
+        if high not in (None, ""):
+            # Верхняя граница даты включает весь день
+            parts.append(f"{name} < date(?, '+1 day')" if kind == "date" else f"{name} <= ?")
+            params.append(parse_filter_value(kind, column, high))
+        return " AND ".join(parts), params
+
+
+def parse_filter_value(kind, column, text):
+    """Значение границы диапазона: число или дата ГГГГ-ММ-ДД"""
+    try:
+        if kind == "date":
+            return datetime.date.fromisoformat(text.strip()).isoformat()
+        return float(text)
+    except ValueError:
+        expected = "дата ГГГГ-ММ-ДД" if kind == "date" else "число"
+        raise ValueError(f"Фильтр {column}: ожидается {expected}, получено '{text}'") from None
+
+
+def parse_bulk_value(kind, column, text):
+    """Новое значение массового изменения по виду поля из schema.BULK_FIELDS"""
+    text = "" if text is None else str(text).strip()
+    if kind in schema.FILTER_CHOICES:
+        if text not in schema.FILTER_CHOICES[kind]:
+            raise ValueError(f"{column}: допустимые значения - {', '.join(schema.FILTER_CHOICES[kind])}")
+        return int(text) if kind == "flag" else text
+
+    try:
+        if kind == "category":
+            return int(text.split(" - ")[0])
+        if kind == "count" and int(text) >= 0:
+            return int(text)
+        # Снижение больше чем на 100% сделало бы значение отрицательным
+        if kind == "percent" and float(text) > -100:
+            return float(text)
+    except ValueError:
+        pass
+    expected = {"category": "категория", "count": "целое число не меньше 0",
+                "percent": "процент больше -100"}[kind]
+    raise ValueError(f"{column}: ожидается {expected}, получено '{text}'")
+
+
+class UserRepository(Repository):
+    table_name = "users"
+    row_type = User
+
+
+class CategoryRepository(Repository):
+    table_name = "categories"
+    row_type = Category
+
+    def choices(self):
+        """Пары (category_id, name) для выпадающих списков"""
+        return self.conn.execute("SELECT category_id, name FROM categories ORDER BY category_id").fetchall()
+
+
+class ProductRepository(Repository):
+    table_name = "products"
+    row_type = Product
+
+    # Средняя оценка и число отзывов из сводки product_rating_stats
+    view_columns = (", ROUND(1.0 * product_rating_stats.rating_sum"
+                    " / NULLIF(product_rating_stats.review_count, 0), 2) AS avg_rating"
+                    ", product_rating_stats.review_count AS review_count")
+    view_joins = " LEFT JOIN product_rating_stats ON product_rating_stats.product_id = products.product_id"
+
+
+class OrderRepository(Repository):
+    table_name = "orders"
+    row_type = Order
+
+
+class OrderItemRepository(Repository):
+    table_name = "order_items"
+    row_type = OrderItem
+
+    def for_order(self, order_id):
+        """Позиции заказа (по покрывающему индексу idx_order_items_order)"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = self.make_row
+        return cursor.execute("SELECT * FROM order_items WHERE order_id = ?", (order_id,)).fetchall()
+
+
+class TagRepository(Repository):
+    table_name = "tags"
+    row_type = Tag
+
+
+class ProductTagRepository(Repository):
+    table_name = "product_tags"
+    row_type = ProductTag
+
+
+class ProductReviewRepository(Repository):
+    table_name = "product_reviews"
+    row_type = ProductReview
+
+
+class Store:
+    """Все репозитории для одного соединения: Store(conn).products.get(1)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.users = UserRepository(conn)
+        self.categories = CategoryRepository(conn)
+        self.products = ProductRepository(conn)
+        self.orders = OrderRepository(conn)
+        self.order_items = OrderItemRepository(conn)
+        self.tags = TagRepository(conn)
+        self.product_tags = ProductTagRepository(conn)
+        self.product_reviews = ProductReviewRepository(conn)
+
+    def __getitem__(self, table_name):
+        return getattr(self, table_name)
+
+    def commit(self):
+        self.conn.commit()
@@ -0,0 +1,225 @@
+"""Описание таблиц магазина: схема, столбцы, поля форм и обязательные поля"""
+import migrations
+import search_index
+
+# Исходная схема базы; дальнейшие изменения - в migrations.py
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        email TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        first_name TEXT,
+        last_name TEXT,
+        phone TEXT,
+        registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT TRUE
+    );
+
+    CREATE TABLE IF NOT EXISTS categories (
+        category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        parent_category_id INTEGER,
+        FOREIGN KEY (parent_category_id) REFERENCES categories(category_id) ON DELETE SET NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS products (
+        product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        price REAL NOT NULL,
+        stock_quantity INTEGER NOT NULL DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT TRUE,
+        FOREIGN KEY (category_id) REFERENCES categories(category_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS orders (
+        order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        order_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'pending',
+        total_amount REAL NOT NULL,
+        shipping_address TEXT NOT NULL,
+        payment_method TEXT,
+        payment_status TEXT DEFAULT 'pending',
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS order_items (
+        order_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price REAL NOT NULL,
+        FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE,
+        FOREIGN KEY (product_id) REFERENCES products(product_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS tags (
+        tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS product_tags (
+        product_id INTEGER NOT NULL,
+        tag_id INTEGER NOT NULL,
+        PRIMARY KEY (product_id, tag_id),
+        FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE,
+        FOREIGN KEY (tag_id) REFERENCES tags(tag_id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS product_reviews (
+        review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 5),
+        review_text TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    );
+"""
+
+# Все столбцы таблиц в порядке объявления
+TABLE_COLUMNS = {
+    "users": ("user_id", "username", "email", "password_hash", "first_name", "last_name", "phone",
+              "registration_date", "is_active"),
+    "categories": ("category_id", "name", "description", "parent_category_id"),
+    "products": ("product_id", "category_id", "name", "description", "price", "stock_quantity",
+                 "created_at", "is_active"),
+    "orders": ("order_id", "user_id", "order_date", "status", "total_amount", "shipping_address",
+               "payment_method", "payment_status"),
+    "order_items": ("order_item_id", "order_id", "product_id", "quantity", "unit_price"),
+    "tags": ("tag_id", "name", "description"),
+    "product_tags": ("product_id", "tag_id"),
+    "product_reviews": ("review_id", "product_id", "user_id", "rating", "review_text", "created_at"),
+}
+
+# Таблицы, у которых первичный ключ состоит из нескольких столбцов
+KEY_COLUMNS = {
+    "product_tags": ("product_id", "tag_id"),
+}
+
+# Столбцы, по которым ищет строка поиска экрана таблицы
+SEARCH_COLUMNS = {
+    "users": ["username", "email", "first_name", "last_name"],
+    "categories": ["name"],
+    "products": ["name", "description"],
+    "orders": ["status"],
+    "tags": ["name"],
+    "product_reviews": ["review_text"],
+}
+
+# Внешние ключи, для которых в таблицах показываются названия
+FOREIGN_KEYS = {
+    "categories": {"parent_category_id": "categories"},
+    "products": {"category_id": "categories"},
+    "orders": {"user_id": "users"},
+    "order_items": {"product_id": "products"},
+    "product_tags": {"product_id": "products", "tag_id": "tags"},
+    "product_reviews": {"product_id": "products", "user_id": "users"},
+}
+
+# Столбцы, которые не выводятся за пределы базы (экспорт, API)
+SECRET_COLUMNS = {
+    "users": ("password_hash",),
+}
+
+# Столбец с названием записи справочной таблицы
+NAME_COLUMNS = {
+    "categories": "name",
+    "tags": "name",
+    "users": "username",
+    "products": "name",
+}
+
+# Поля формы добавления записи
+FORM_FIELDS = {
+    "users": ["username", "email", "password_hash", "first_name", "last_name", "phone", "is_active"],
+    "categories": ["name", "description", "parent_category_id"],
+    "products": ["category_id", "name", "description", "price", "stock_quantity", "is_active"],
+    "orders": ["user_id", "status", "total_amount", "shipping_address", "payment_method", "payment_status"],
+    "order_items": ["order_id", "product_id", "quantity", "unit_price"],
+    "tags": ["name", "description"],
+    "product_tags": ["product_id", "tag_id"],
+    "product_reviews": ["product_id", "user_id", "rating", "review_text"],
+}
+
+# Поля формы редактирования (сейчас совпадают с полями добавления)
+EDIT_FIELDS = dict(FORM_FIELDS)
+
+# Поля, без которых запись не сохраняется
+REQUIRED_FIELDS = {
+    "users": ("username", "email", "password_hash"),
+    "products": ("name", "price", "category_id"),
+}
+
+ORDER_STATUSES = ["pending", "processing", "shipped", "delivered", "cancelled"]
+
+# Фильтры экрана таблицы: столбец -> вид фильтра. Для number и date задаётся
+# диапазон (от/до), для category - категория вместе с подкатегориями, для
+# остальных видов - одно значение из FILTER_CHOICES
+FILTERS = {
+    "users": {"registration_date": "date", "is_active": "flag"},
+    "products": {"category_id": "category", "price": "number", "created_at": "date", "is_active": "flag"},
+    "orders": {"order_date": "date", "total_amount": "number", "status": "status"},
+    "product_reviews": {"rating": "number", "created_at": "date"},
+}
+
+RANGE_FILTERS = ("number", "date")
+
+FILTER_CHOICES = {
+    "flag": ["1", "0"],
+    "status": ORDER_STATUSES,
+}
+
+# Поля массового изменения: столбец -> вид значения. flag и status выбираются
+# из FILTER_CHOICES, category - из списка категорий, count - целое число не
+# меньше нуля, percent - изменение текущего значения на заданный процент
+BULK_FIELDS = {
+    "users": {"is_active": "flag"},
+    "products": {"is_active": "flag", "price": "percent", "stock_quantity": "count", "category_id": "category"},
+    "orders": {"status": "status"},
+}
+
+
+def key_columns(table_name):
+    """Столбцы первичного ключа таблицы"""
+    return KEY_COLUMNS.get(table_name, TABLE_COLUMNS[table_name][:1])
+
+
+def check_required(table_name, col, value):
+    """Текст ошибки, если обязательное поле не заполнено, иначе None.
+
+    Пустым считается NULL и строка из пробелов; число 0 - заполненное значение.
+    """
+    empty = value is None or (isinstance(value, str) and not value.strip())
+    if col in REQUIRED_FIELDS.get(table_name, ()) and empty:
+        return f"Поле {col} обязательно для заполнения"
+    return None
+
+
+def ensure_schema(conn, use_fts=True):
+    """Создание таблиц, применение миграций и построение индексов FTS5.
+
+    Возвращает True, если полнотекстовый поиск доступен.
+    """
+    # База на последней версии схемы уже содержит все таблицы, индексы и триггеры -
+    # при запуске DDL не выполняется
+    if migrations.schema_version(conn) < migrations.LATEST_VERSION:
+        conn.executescript(SCHEMA_SQL)
+        conn.commit()
+
+        # Обновление схемы существующей базы (индексы и т.п.)
+        migrations.migrate(conn)
+
+    if not use_fts:
+        return False
+    if all(search_index.fts_table_exists(conn, table_name) for table_name in search_index.FTS_TABLES):
+        return True
+    # Индексы полнотекстового поиска строятся один раз и дальше обновляются триггерами
+    return search_index.ensure_fts(conn)
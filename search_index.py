@@ -0,0 +1,128 @@
+"""Полнотекстовый поиск (FTS5) по товарам, отзывам и пользователям"""
+import re
+import sqlite3
+
+from paging import KeysetPager
+
+# Таблица -> (первичный ключ, индексируемые столбцы)
+FTS_TABLES = {
+    "products": ("product_id", ("name", "description")),
+    "product_reviews": ("review_id", ("review_text",)),
+    "users": ("user_id", ("username", "email", "first_name", "last_name")),
+}
+
+
+def fts5_available(conn):
+    """Проверка, что SQLite собран с модулем FTS5"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def fts_table_exists(conn, table_name):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                       (f"{table_name}_fts",)).fetchone()
+    return row is not None
+
+
+def update_trigger_sql(table_name):
+    """Триггер, переписывающий строку индекса при изменении индексируемых столбцов.
+
+    Список столбцов в UPDATE OF не даёт триггеру срабатывать на изменения
+    остатков, цен, флагов и хешей паролей, которые в индекс не входят.
+    """
+    id_column, columns = FTS_TABLES[table_name]
+    fts = f"{table_name}_fts"
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{col}" for col in columns)
+    old_values = ", ".join(f"old.{col}" for col in columns)
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table_name}_fts_au AFTER UPDATE OF {id_column}, {cols} ON {table_name} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{id_column}, {old_values});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.{id_column}, {new_values});
+        END;
+    """
+
+
+def recreate_update_triggers(conn):
+    """Замена триггеров обновления у уже построенных индексов (в открытой транзакции)"""
+    for table_name in FTS_TABLES:
+        if fts_table_exists(conn, table_name):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table_name}_fts_au")
+            conn.execute(update_trigger_sql(table_name))
+
+
+def ensure_fts(conn):
+    """Создание индексов FTS5 и триггеров синхронизации.
+
+    Индексы используют внешнее содержимое (content=...), поэтому текст не
+    дублируется. Новый индекс сразу заполняется командой 'rebuild'.
+    Возвращает False, если FTS5 недоступен.
+    """
+    if not fts5_available(conn):
+        return False
+
+    for table_name, (id_column, columns) in FTS_TABLES.items():
+        if fts_table_exists(conn, table_name):
+            continue
+
+        fts = f"{table_name}_fts"
+        cols = ", ".join(columns)
+        new_values = ", ".join(f"new.{col}" for col in columns)
+        old_values = ", ".join(f"old.{col}" for col in columns)
+
+        conn.executescript(f"""
+            CREATE VIRTUAL TABLE {fts} USING fts5(
+                {cols}, content='{table_name}', content_rowid='{id_column}', tokenize='unicode61'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS {table_name}_fts_ai AFTER INSERT ON {table_name} BEGIN
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.{id_column}, {new_values});
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS {table_name}_fts_ad AFTER DELETE ON {table_name} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{id_column}, {old_values});
+            END;
+
+            {update_trigger_sql(table_name)}
+
+            INSERT INTO {fts}({fts}) VALUES ('rebuild');
+        """)
+    conn.commit()
+    return True
+
+
+def match_expression(search_term):
+    """Запрос MATCH: каждое слово ищется как префикс, все слова обязательны"""
+    words = re.findall(r"\w+", search_term)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_condition(table_name, search_columns, search_term, use_fts=True):
+    """Условие поиска: (JOIN, WHERE, параметры, столбец релевантности или None).
+
+    Если для таблицы есть индекс FTS5, строки ищутся через MATCH и могут быть
+    упорядочены по релевантности (bm25), иначе используется LIKE по столбцам
+    search_columns.
+    """
+    expression = match_expression(search_term)
+    if use_fts and table_name in FTS_TABLES and expression:
+        fts = f"{table_name}_fts"
+        id_column = FTS_TABLES[table_name][0]
+        return (f" JOIN {fts} ON {fts}.rowid = {table_name}.{id_column}", f"{fts} MATCH ?", [expression],
+                f"{fts}.rank")
+
+    conditions = " OR ".join([f"{table_name}.{col} LIKE ?" for col in search_columns])
+    return "", conditions, [f"%{search_term}%"] * len(search_columns), None
+
+
+def search_pager(table_name, key_columns, search_columns, search_term, use_fts=True, page_size=100):
+    """Источник данных для результатов поиска (по релевантности, если есть FTS5)"""
+    joins, where, params, rank = search_condition(table_name, search_columns, search_term, use_fts)
+    if rank:
+        key_columns = (rank, f"{table_name}.{FTS_TABLES[table_name][0]}")
+    return KeysetPager(table_name, key_columns, columns=f"{table_name}.*", where=where, params=params,
+                       page_size=page_size, joins=joins)
@@ -0,0 +1,138 @@
+"""Инвертированный индекс тегов товаров для фасетного подбора.
+
+Для каждого тега хранится битовая карта товаров: целое число Python, в
+котором бит product_id установлен, если у товара есть тег. Пересечение и
+объединение тегов - это & и |, число товаров - int.bit_count(), поэтому
+подбор и подсчёт фасетов не обращаются к product_tags.
+"""
+import re
+import threading
+
+
+class TagIndex:
+    """Битовые карты товаров по тегам.
+
+    Индекс строится из product_tags при первом обращении (в фоновом потоке)
+    и дальше обновляется вызовами on_write() после записей через приложение.
+    После массовых изменений (импорт) вызывается invalidate(), и индекс
+    перестраивается при следующем обращении; так же индекс сбрасывается
+    после записи в базу другим процессом (QueryWorker.on_external_write).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bitmaps = None
+
+    def ensure_loaded(self, conn):
+        with self.lock:
+            loaded = self.bitmaps is not None
+        if not loaded:
+            self.build(conn)
+
+    def build(self, conn):
+        """Построение индекса по покрывающему индексу idx_product_tags_tag"""
+        max_id = conn.execute("SELECT IFNULL(MAX(product_id), 0) FROM product_tags").fetchone()[0]
+        tag_ids = [row[0] for row in conn.execute("SELECT tag_id FROM tags")]
+
+        bitmaps = {}
+        current_tag, bits = None, None
+        for tag_id, product_id in conn.execute("SELECT tag_id, product_id FROM product_tags ORDER BY tag_id"):
+            if tag_id != current_tag:
+                if current_tag is not None:
+                    bitmaps[current_tag] = int.from_bytes(bits, "little")
+                current_tag, bits = tag_id, bytearray(max_id // 8 + 1)
+            bits[product_id >> 3] |= 1 << (product_id & 7)
+        if current_tag is not None:
+            bitmaps[current_tag] = int.from_bytes(bits, "little")
+
+        for tag_id in tag_ids:
+            bitmaps.setdefault(tag_id, 0)
+        with self.lock:
+            self.bitmaps = bitmaps
+
+    def invalidate(self):
+        with self.lock:
+            self.bitmaps = None
+
+    def select(self, tag_ids, match_all=True):
+        """Битовая карта товаров с тегами tag_ids (все теги или хотя бы один)"""
+        with self.lock:
+            bitmaps = [self.bitmaps.get(tag_id, 0) for tag_id in tag_ids]
+        if not bitmaps:
+            return 0
+        result = bitmaps[0]
+        for bits in bitmaps[1:]:
+            result = result & bits if match_all else result | bits
+        return result
+
+    def facet_counts(self, selection=None):
+        """Число товаров каждого тега среди selection (None - среди всех товаров)"""
+        with self.lock:
+            items = list(self.bitmaps.items())
+        if selection is None:
+            return {tag_id: bits.bit_count() for tag_id, bits in items}
+        return {tag_id: (bits & selection).bit_count() for tag_id, bits in items}
+
+    def add(self, product_id, tag_id):
+        with self.lock:
+            if self.bitmaps is not None:
+                self.bitmaps[tag_id] = self.bitmaps.get(tag_id, 0) | (1 << product_id)
+
+    def remove(self, product_id, tag_id):
+        with self.lock:
+            if self.bitmaps is not None and tag_id in self.bitmaps:
+                self.bitmaps[tag_id] &= ~(1 << product_id)
+
+    def on_write(self, table_name, old_key=None, new_row=None):
+        """Обновление индекса после записи в таблицу table_name.
+
+        old_key - первичный ключ изменённой или удалённой записи, new_row -
+        добавленная или изменённая строка (None при удалении).
+        """
+        with self.lock:
+            if self.bitmaps is None:
+                return
+            if table_name == "product_tags":
+                if old_key is not None:
+                    product_id, tag_id = map(int, old_key)
+                    if tag_id in self.bitmaps:
+                        self.bitmaps[tag_id] &= ~(1 << product_id)
+                if new_row is not None:
+                    product_id, tag_id = int(new_row[0]), int(new_row[1])
+                    self.bitmaps[tag_id] = self.bitmaps.get(tag_id, 0) | (1 << product_id)
+            elif table_name == "products" and old_key is not None and new_row is None:
+                # Удаление товара каскадно удаляет его теги
+                mask = ~(1 << int(old_key[0]))
+                for tag_id in self.bitmaps:
+                    self.bitmaps[tag_id] &= mask
+            elif table_name == "tags":
+                if old_key is not None and new_row is None:
+                    self.bitmaps.pop(int(old_key[0]), None)
+                elif new_row is not None:
+                    self.bitmaps.setdefault(int(new_row[0]), 0)
+
+
+# Ненулевой байт битовой карты
+NONZERO_BYTE = re.compile(rb"[^\x00]")
+
+
+def product_ids(bitmap, after=0, limit=None):
+    """Возрастающие product_id из битовой карты, большие after (не более limit).
+
+    Часть карты начиная с байта after переводится в байты один раз, нулевые
+    байты пропускаются поиском регулярного выражения (на уровне C), и биты
+    разбираются только в ненулевых байтах.
+    """
+    result = []
+    start = (after + 1) >> 3
+    rest = bitmap >> (start << 3)
+    data = rest.to_bytes((rest.bit_length() + 7) >> 3, "little")
+    for match in NONZERO_BYTE.finditer(data):
+        byte = data[match.start()]
+        base = (start + match.start()) << 3
+        for bit in range(8):
+            if byte >> bit & 1 and base + bit > after:
+                if limit is not None and len(result) >= limit:
+                    return result
+                result.append(base + bit)
+    return result
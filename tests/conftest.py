@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# Модули приложения лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import schema  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Новая база магазина с актуальной схемой"""
+    connection = db.connect(str(tmp_path / "store.db"))
+    schema.ensure_schema(connection)
+    yield connection
+    connection.close()
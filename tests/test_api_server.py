@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+import pytest
+
+import api_server
+import db
+
+
+@pytest.fixture
+def api(conn, monkeypatch):
+    """Сервер API (без сокета) над базой conn с одной категорией"""
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'c')")
+    conn.commit()
+    monkeypatch.setitem(db.settings, "path", conn.execute("PRAGMA database_list").fetchone()[2])
+    server = api_server.ApiServer(readers=1, use_fts=False)
+    yield server
+    server.close()
+
+
+def request(api, method, target, body=None, headers=None):
+    data = None if body is None else json.dumps(body).encode("utf-8")
+    status, response_headers, response = asyncio.run(api.dispatch(method, target, headers or {}, data))
+    return status, response_headers, json.loads(response) if response else None
+
+
+def test_zero_price_is_accepted(api):
+    status, headers, row = request(api, "POST", "/api/products",
+                                   {"category_id": 1, "name": "бесплатный", "price": 0, "stock_quantity": 0})
+    assert status == 201
+    assert (row["price"], row["stock_quantity"]) == (0, 0)
+
+    status, _, row = request(api, "PATCH", headers["Location"], {"price": 0, "stock_quantity": 5},
+                             {"if-match": headers["ETag"]})
+    assert status == 200
+    assert (row["price"], row["stock_quantity"]) == (0, 5)
+
+
+@pytest.mark.parametrize("body", [{"category_id": 1, "name": "a", "price": None},
+                                  {"category_id": 1, "name": " ", "price": 1},
+                                  {"category_id": 1, "name": "a"}])
+def test_empty_required_field_is_rejected(api, body):
+    status, _, response = request(api, "POST", "/api/products", body)
+    assert status == 400
+    assert "обязательно" in response["error"]
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+
+import pytest
+
+import backup
+
+
+@pytest.fixture
+def store_path(conn, tmp_path):
+    """База с нарушенным внешним ключом, как в online_store.db"""
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'c')")
+    conn.execute("INSERT INTO products (product_id, category_id, name, price) VALUES (1, 1, 'a', 1)")
+    conn.execute("INSERT INTO products (product_id, category_id, name, price) VALUES (2, 99, 'b', 2)")
+    conn.commit()
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def test_foreign_key_violations_are_warnings(store_path, tmp_path):
+    result = backup.create_snapshot(store_path, str(tmp_path / "snapshots"))
+
+    ok, problems, warnings, counts = backup.verify(result.path)
+
+    assert ok
+    assert problems == []
+    assert warnings == ["нарушен внешний ключ: products rowid 2 -> categories"]
+    assert counts["products"] == 2
+
+
+def test_restore_with_foreign_key_violations(conn, store_path, tmp_path):
+    result = backup.create_snapshot(store_path, str(tmp_path / "snapshots"))
+    conn.execute("DELETE FROM products")
+    conn.commit()
+
+    restored = backup.restore(result.path, store_path)
+
+    assert len(restored.warnings) == 1
+    assert conn.execute("SELECT COUNT(*) FROM products").fetchone() == (2,)
+
+
+def test_corrupted_snapshot_is_rejected(store_path, tmp_path):
+    result = backup.create_snapshot(store_path, str(tmp_path / "snapshots"))
+    with open(result.path, "r+b") as f:
+        f.seek(20)
+        f.write(b"\xff" * 64)
+
+    ok, problems, _, _ = backup.verify(result.path)
+
+    assert not ok and problems
+    assert backup.list_snapshots(str(tmp_path / "snapshots")) == [result.path]
+    assert sorted(p.name for p in (tmp_path / "snapshots").iterdir()) == [os.path.basename(result.path)]
+    with pytest.raises(sqlite3.DatabaseError):
+        backup.restore(result.path, store_path)
+
+
+def test_snapshots_in_the_same_second_do_not_overwrite(store_path, tmp_path, monkeypatch):
+    # Второй снимок сначала получает имя первого и должен выбрать другое
+    names = iter(["store-20260102-030405-000006.db.gz"] * 2 + ["store-20260102-030405-000007.db.gz"])
+    monkeypatch.setattr(backup, "snapshot_name", lambda: next(names))
+    directory = str(tmp_path / "snapshots")
+
+    first = backup.create_snapshot(store_path, directory)
+    second = backup.create_snapshot(store_path, directory)
+
+    assert backup.list_snapshots(directory) == [first.path, second.path]
+    assert backup.verify(first.path)[0] and backup.verify(second.path)[0]
@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+
+import analytics
+import category_tree
+import db
+import importer
+import rating_stats
+
+
+def test_require_no_transaction(conn):
+    db.require_no_transaction(conn)
+    conn.execute("INSERT INTO tags (name) VALUES ('t')")
+    with pytest.raises(sqlite3.ProgrammingError):
+        db.require_no_transaction(conn)
+
+
+@pytest.mark.parametrize("rebuild", [lambda conn: importer.import_rows(conn, "tags", iter([{"name": "t"}])),
+                                     rating_stats.rebuild, category_tree.rebuild, analytics.refresh,
+                                     analytics.rebuild])
+def test_own_transactions_do_not_commit_caller_work(conn, rebuild):
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'c')")
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        rebuild(conn)
+
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM categories").fetchone() == (0,)
+    assert conn.execute("SELECT COUNT(*) FROM tags").fetchone() == (0,)
@@ -0,0 +1,78 @@
+import pytest
+
+import exporter
+from paging import KeysetPager
+
+ROWS = [
+    (1, 1.5, 10, "", None),
+    (2, None, 2.25, "Привет, мир", None),
+    (None, -3.0, None, "emoji \U0001f600", None),
+    (4, 0.0, 7, None, None),
+    (-(2 ** 62), 1e300, -1, "a\nb\x00c", None),
+    (6, 2.5, 3.5, "x" * 1000, None),
+    (7, None, None, "", None),
+]
+
+
+@pytest.fixture
+def mixed_conn(conn):
+    """Таблица со столбцами int, float, int/float, текст и только NULL"""
+    conn.execute("CREATE TABLE m (i INTEGER, f REAL, n NUMERIC, s TEXT, z)")
+    conn.executemany("INSERT INTO m VALUES (?, ?, ?, ?, ?)", ROWS)
+    conn.commit()
+    return conn
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_columnar_round_trip(mixed_conn, tmp_path, chunk_size):
+    path = str(tmp_path / "m.scol")
+    count = exporter.export_query(mixed_conn, "SELECT i, f, n, s, z FROM m ORDER BY rowid", (), path,
+                                  chunk_size=chunk_size)
+    assert count == len(ROWS)
+
+    columns, rows = exporter.read_columnar(path)
+    assert columns == ["i", "f", "n", "s", "z"]
+    rows = list(rows)
+    assert rows == ROWS
+    # В группе, где встречаются и int, и float, целые числа читаются как float
+    for start in range(0, len(ROWS), chunk_size):
+        values = [row[2] for row in rows[start:start + chunk_size] if row[2] is not None]
+        expected = [type(row[2]) for row in ROWS[start:start + chunk_size] if row[2] is not None]
+        if float in expected:
+            expected = [float] * len(expected)
+        assert [type(value) for value in values] == expected
+
+
+def test_columnar_empty_result(mixed_conn, tmp_path):
+    path = str(tmp_path / "empty.scol")
+    assert exporter.export_query(mixed_conn, "SELECT i, s FROM m WHERE 0", (), path) == 0
+    columns, rows = exporter.read_columnar(path)
+    assert columns == ["i", "s"]
+    assert list(rows) == []
+
+
+def test_read_columnar_rejects_other_files(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,2\n")
+    with pytest.raises(ValueError):
+        exporter.read_columnar(str(path))
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".jsonl", ".scol"])
+def test_users_export_omits_password_hash(conn, tmp_path, suffix):
+    conn.execute("INSERT INTO users (user_id, username, email, password_hash) VALUES (1, 'u', 'u@x', 'secret')")
+    conn.commit()
+    path = str(tmp_path / ("users" + suffix))
+
+    assert exporter.export_pager(conn, KeysetPager("users", ("users.user_id",)), path) == 1
+
+    if suffix == ".scol":
+        columns, rows = exporter.read_columnar(path)
+        assert "password_hash" not in columns
+        assert "secret" not in list(rows)[0]
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        assert "password_hash" not in text
+        assert "secret" not in text
+        assert "u@x" in text
@@ -0,0 +1,40 @@
+import json
+
+import importer
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows), encoding="utf-8")
+    return str(path)
+
+
+def test_zero_values_of_required_fields_are_imported(conn, tmp_path):
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'c')")
+    conn.commit()
+    path = write_jsonl(tmp_path / "products.jsonl", [
+        {"category_id": 1, "name": "бесплатный", "price": 0, "stock_quantity": 0},
+        {"category_id": 1, "name": "обычный", "price": 9.5, "stock_quantity": 3},
+    ])
+
+    result = importer.import_file(conn, "products", path)
+
+    assert (result.imported, result.rejected) == (2, 0)
+    assert conn.execute("SELECT name, price, stock_quantity FROM products ORDER BY product_id").fetchall() == \
+        [("бесплатный", 0, 0), ("обычный", 9.5, 3)]
+
+
+def test_empty_required_fields_are_rejected(conn, tmp_path):
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'c')")
+    conn.commit()
+    path = write_jsonl(tmp_path / "products.jsonl", [
+        {"category_id": 1, "name": "  ", "price": 1},
+        {"category_id": 1, "name": "a", "price": None},
+        {"category_id": 1, "name": "b", "price": 2},
+    ])
+    rejected = []
+
+    result = importer.import_file(conn, "products", path,
+                                  on_reject=lambda line_no, row, reason: rejected.append((line_no, reason)))
+
+    assert (result.imported, result.rejected) == (1, 2)
+    assert rejected == [(1, "Поле name обязательно для заполнения"), (2, "Поле price обязательно для заполнения")]
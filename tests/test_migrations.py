@@ -0,0 +1,67 @@
+import db
+import migrations
+import schema
+
+
+def make_v0_database(conn):
+    """База в исходной схеме (user_version 0) с категориями и отзывами"""
+    conn.executescript(schema.SCHEMA_SQL)
+    conn.executemany("INSERT INTO categories (category_id, name, parent_category_id) VALUES (?, ?, ?)",
+                     [(1, "Электроника", None), (2, "Телефоны", 1), (3, "Смартфоны", 2), (4, "Одежда", None)])
+    conn.execute("INSERT INTO users (user_id, username, email, password_hash) VALUES (1, 'u', 'u@x', 'h')")
+    conn.executemany("INSERT INTO products (product_id, category_id, name, price) VALUES (?, ?, ?, ?)",
+                     [(1, 3, "Телефон", 100), (2, 4, "Куртка", 50)])
+    conn.executemany("INSERT INTO product_reviews (product_id, user_id, rating) VALUES (?, 1, ?)",
+                     [(1, 5), (1, 3), (2, 4)])
+    conn.commit()
+
+
+def test_migrate_from_version_0_applies_all_migrations(tmp_path):
+    conn = db.connect(str(tmp_path / "old.db"))
+    make_v0_database(conn)
+    assert migrations.schema_version(conn) == 0
+
+    applied = migrations.migrate(conn)
+
+    assert applied == [number for number, _, _ in migrations.MIGRATIONS]
+    assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_products_category", "idx_orders_status_date", "idx_category_closure_descendant"} <= indexes
+
+    # Сводки, созданные миграциями, заполнены по уже существующим данным
+    stats = conn.execute("SELECT product_id, review_count, rating_sum FROM product_rating_stats "
+                         "ORDER BY product_id").fetchall()
+    assert stats == [(1, 2, 8), (2, 1, 4)]
+    ancestors = [row[0] for row in conn.execute(
+        "SELECT ancestor_id FROM category_closure WHERE descendant_id = 3 ORDER BY depth")]
+    assert ancestors == [3, 2, 1]
+    conn.close()
+
+
+def test_migrate_is_idempotent(conn):
+    assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+    assert migrations.migrate(conn) == []
+
+
+def test_triggers_keep_aggregates_after_migration(conn):
+    conn.execute("INSERT INTO categories (category_id, name, parent_category_id) VALUES (1, 'a', NULL)")
+    conn.execute("INSERT INTO categories (category_id, name, parent_category_id) VALUES (2, 'b', 1)")
+    conn.execute("INSERT INTO users (user_id, username, email, password_hash) VALUES (1, 'u', 'u@x', 'h')")
+    conn.execute("INSERT INTO products (product_id, category_id, name, price) VALUES (1, 2, 'p', 1)")
+    conn.execute("INSERT INTO product_reviews (product_id, user_id, rating) VALUES (1, 1, 2)")
+    conn.commit()
+
+    assert conn.execute("SELECT review_count, rating_sum FROM product_rating_stats").fetchone() == (1, 2)
+    assert conn.execute("SELECT depth FROM category_closure WHERE ancestor_id = 1 AND descendant_id = 2"
+                        ).fetchone() == (1,)
+
+
+def test_foreign_keys_cascade(conn):
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'a')")
+    conn.execute("INSERT INTO products (product_id, category_id, name, price) VALUES (1, 1, 'p', 1)")
+    conn.execute("INSERT INTO tags (tag_id, name) VALUES (1, 't')")
+    conn.execute("INSERT INTO product_tags (product_id, tag_id) VALUES (1, 1)")
+    conn.execute("DELETE FROM products WHERE product_id = 1")
+    conn.commit()
+
+    assert conn.execute("SELECT COUNT(*) FROM product_tags").fetchone() == (0,)
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+import order_service
+from order_service import OrderError, OutOfStock
+
+
+@pytest.fixture
+def shop(conn):
+    """Покупатель и три товара: в наличии, последний экземпляр и снятый с продажи"""
+    conn.execute("INSERT INTO users (user_id, username, email, password_hash) VALUES (1, 'u', 'u@x', 'h')")
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'c')")
+    conn.executemany("INSERT INTO products (product_id, category_id, name, price, stock_quantity, is_active) "
+                     "VALUES (?, 1, ?, ?, ?, ?)",
+                     [(1, "a", 10.5, 5, 1), (2, "b", 3.0, 1, 1), (3, "c", 1.0, 100, 0)])
+    conn.commit()
+    return conn
+
+
+def make_order(*items):
+    return {"user_id": 1, "shipping_address": "addr", "items": list(items)}
+
+
+def stock(conn):
+    return dict(conn.execute("SELECT product_id, stock_quantity FROM products"))
+
+
+def test_place_order_computes_total_and_decrements_stock(shop):
+    order_id = order_service.place_order(shop, make_order((1, 2), (2, 1)))
+
+    assert shop.execute("SELECT total_amount FROM orders WHERE order_id = ?", (order_id,)).fetchone() == (24.0,)
+    items = shop.execute("SELECT product_id, quantity, unit_price FROM order_items WHERE order_id = ? "
+                         "ORDER BY product_id", (order_id,)).fetchall()
+    assert items == [(1, 2, 10.5), (2, 1, 3.0)]
+    assert stock(shop) == {1: 3, 2: 0, 3: 100}
+    assert not shop.in_transaction
+
+
+def test_place_order_out_of_stock_changes_nothing(shop):
+    with pytest.raises(OutOfStock):
+        # Первая позиция списывается, вторая - нет: откатываются обе
+        order_service.place_order(shop, make_order((1, 2), (2, 2)))
+
+    assert stock(shop) == {1: 5, 2: 1, 3: 100}
+    assert shop.execute("SELECT COUNT(*) FROM orders").fetchone() == (0,)
+    assert shop.execute("SELECT COUNT(*) FROM order_items").fetchone() == (0,)
+
+
+@pytest.mark.parametrize("items", [[], [(1, 0)], [(1, "x")], [(3, 1)], [(99, 1)]])
+def test_place_order_rejects_invalid_items(shop, items):
+    with pytest.raises(OrderError):
+        order_service.place_order(shop, make_order(*items))
+    assert stock(shop) == {1: 5, 2: 1, 3: 100}
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 500])
+def test_place_orders_rolls_back_only_rejected(shop, batch_size):
+    rejected = []
+    orders = [
+        make_order((2, 1)),
+        make_order((2, 1)),          # последний экземпляр уже продан
+        make_order((1, 1), (2, 1)),  # частичное списание откатывается точкой сохранения
+        make_order((1, 4)),
+        make_order((1, 2)),          # остался один экземпляр
+    ]
+
+    order_ids = order_service.place_orders(shop, orders, batch_size=batch_size,
+                                           on_reject=lambda number, order, reason: rejected.append(number))
+
+    assert [order_id is not None for order_id in order_ids] == [True, False, False, True, False]
+    assert rejected == [1, 2, 4]
+    assert stock(shop) == {1: 1, 2: 0, 3: 100}
+    totals = shop.execute("SELECT total_amount FROM orders ORDER BY order_id").fetchall()
+    assert totals == [(3.0,), (42.0,)]
+    counts = shop.execute("SELECT order_id, COUNT(*) FROM order_items GROUP BY order_id ORDER BY order_id").fetchall()
+    assert counts == [(order_ids[0], 1), (order_ids[3], 1)]
+    assert not shop.in_transaction
+
+
+def test_open_transaction_of_caller_is_not_committed(shop):
+    shop.execute("UPDATE products SET price = 99 WHERE product_id = 1")
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        order_service.place_orders(shop, [make_order((2, 1))])
+    with pytest.raises(sqlite3.ProgrammingError):
+        order_service.place_order(shop, make_order((2, 1)))
+
+    shop.rollback()
+    assert shop.execute("SELECT price FROM products WHERE product_id = 1").fetchone() == (10.5,)
+    assert stock(shop) == {1: 5, 2: 1, 3: 100}
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from paging import KeysetPager
+
+
+@pytest.fixture
+def values_conn(conn):
+    """Таблица с повторяющимися значениями и NULL в столбце сортировки"""
+    rng = random.Random(7)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)")
+    conn.executemany("INSERT INTO t (id, v) VALUES (?, ?)",
+                     [(i, rng.choice([None, None, 1, 2, 3, 5, 8])) for i in range(1, 251)])
+    conn.commit()
+    return conn
+
+
+def expected_order(conn, descending):
+    rows = conn.execute("SELECT v, id FROM t").fetchall()
+    # NULL меньше любого значения, как в ORDER BY
+    rows.sort(key=lambda row: (row[0] is not None, row[0] or 0, row[1]), reverse=descending)
+    return [row[1] for row in rows]
+
+
+def make_pager(descending, page_size=17):
+    return KeysetPager("t", ("t.v", "t.id"), columns="t.id", page_size=page_size, descending=descending,
+                       nullable=True)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_forward_pages_cover_all_rows_once_in_order(values_conn, descending):
+    pager = make_pager(descending)
+    ids = [row[0] for _, row in pager.fetch_first(values_conn)]
+    while not pager.at_end:
+        ids += [row[0] for _, row in pager.fetch_next(values_conn)]
+
+    assert ids == expected_order(values_conn, descending)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_backward_pages_return_to_start(values_conn, descending):
+    pager = make_pager(descending)
+    pages = [pager.fetch_first(values_conn)]
+    while not pager.at_end:
+        pages.append(pager.fetch_next(values_conn))
+
+    # Окно сдвигается к последней странице, дальше листаем назад
+    pager.trim_front(pages[-1][0][0])
+    ids = [row[0] for _, row in pages[-1]]
+    while not pager.at_start:
+        ids = [row[0] for _, row in pager.fetch_prev(values_conn)] + ids
+
+    assert ids == expected_order(values_conn, descending)
+
+
+def test_key_condition_with_null_key_expands_per_column():
+    pager = make_pager(False)
+    condition, params = pager.key_condition((None, 5), greater=True)
+
+    assert "IS NOT NULL" in condition
+    assert params == [None, 5]
+
+
+def test_unfiltered_pager_follows_primary_key(conn):
+    conn.executemany("INSERT INTO tags (name) VALUES (?)", [(f"тег {i}",) for i in range(30)])
+    pager = KeysetPager("tags", ["tag_id"], page_size=10)
+
+    first = pager.fetch_first(conn)
+    second = pager.fetch_next(conn)
+
+    assert [key[0] for key, _ in first + second] == list(range(1, 21))
+    assert pager.unfiltered
+
+
+def test_read_pages_do_not_change_position(values_conn):
+    pager = make_pager(False)
+    rows, state = pager.read_first(values_conn)
+    assert (pager.first_key, pager.last_key) == (None, None)
+
+    pager.apply(state)
+    position = (pager.at_start, pager.at_end, pager.first_key, pager.last_key)
+    next_rows, next_state = pager.read_next(values_conn, pager.last_key)
+    assert (pager.at_start, pager.at_end, pager.first_key, pager.last_key) == position
+
+    # Применённое положение совпадает с тем, что даёт fetch_next
+    pager.apply(next_state)
+    expected = make_pager(False)
+    expected.fetch_first(values_conn)
+    assert expected.fetch_next(values_conn) == next_rows
+    assert (pager.at_end, pager.last_key) == (expected.at_end, expected.last_key)
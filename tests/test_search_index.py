@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+import migrations
+import search_index
+
+pytestmark = pytest.mark.skipif(not search_index.fts5_available(sqlite3.connect(":memory:")), reason="нет FTS5")
+
+
+def changes(conn, sql, params=()):
+    """Число строк, изменённых запросом вместе с триггерами"""
+    before = conn.total_changes
+    conn.execute(sql, params)
+    conn.commit()
+    return conn.total_changes - before
+
+
+def found(conn, term):
+    return [row[0] for row in conn.execute("SELECT rowid FROM products_fts WHERE products_fts MATCH ?", (term,))]
+
+
+def test_update_trigger_ignores_non_indexed_columns(conn):
+    assert search_index.ensure_fts(conn)
+    conn.execute("INSERT INTO categories (category_id, name) VALUES (1, 'c')")
+    conn.execute("INSERT INTO products (product_id, category_id, name, price, stock_quantity) "
+                 "VALUES (1, 1, 'красный чайник', 10, 5)")
+    conn.commit()
+
+    assert changes(conn, "UPDATE products SET stock_quantity = stock_quantity - 1, price = 9") == 1
+    assert changes(conn, "UPDATE products SET name = 'синий чайник'") > 1
+    assert found(conn, "синий") == [1]
+    assert found(conn, "красный") == []
+
+
+def test_migration_replaces_old_update_trigger(conn):
+    assert search_index.ensure_fts(conn)
+    # Триггер в прежнем виде - на любое изменение строки
+    conn.execute("DROP TRIGGER products_fts_au")
+    conn.execute("""
+        CREATE TRIGGER products_fts_au AFTER UPDATE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, description)
+            VALUES ('delete', old.product_id, old.name, old.description);
+            INSERT INTO products_fts(rowid, name, description) VALUES (new.product_id, new.name, new.description);
+        END
+    """)
+    conn.execute("PRAGMA user_version = 5")
+    conn.commit()
+
+    assert migrations.migrate(conn) == [6]
+
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'products_fts_au'").fetchone()[0]
+    assert "UPDATE OF product_id, name, description ON products" in sql